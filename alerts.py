@@ -0,0 +1,322 @@
+import os
+import re
+import logging
+import sqlite3
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime
+
+from chat_log_storage import PostgresChatLogStorage, SQLiteChatLogStorage, keep_inherited
+
+logger = logging.getLogger(__name__)
+
+# 알림 기준 값: 가격 또는 전일 종가 대비 등락률(%)
+METRIC_PRICE = 'price'
+METRIC_CHANGE = 'change'
+
+# 알림 방향: 기준 이상이 되면(above) / 기준 이하가 되면(below)
+ABOVE = 'above'
+BELOW = 'below'
+
+# 예: "/alert $AAPL > 200", "/alert $AAPL < 150.5", "/alert $TSLA -5%", "/alert $TSLA +3%"
+ALERT_COMMAND_PATTERN = re.compile(
+    r"^/alert\s+\$?(?P<ticker>[A-Za-z0-9.\-=^]+)\s*"
+    r"(?:(?P<op>[<>])\s*(?P<price>\d+(?:\.\d+)?)|(?P<change>[+-]\d+(?:\.\d+)?)\s*%)\s*$"
+)
+
+
+def parse_alert_command(text):
+    """알림 명령어를 (티커, 기준, 방향, 값)으로 변환합니다. 형식이 틀리면 None을 반환합니다."""
+    match = ALERT_COMMAND_PATTERN.match(text.strip())
+    if not match:
+        return None
+    ticker = match.group('ticker').upper()
+    if match.group('op'):
+        direction = ABOVE if match.group('op') == '>' else BELOW
+        return ticker, METRIC_PRICE, direction, float(match.group('price'))
+    change = float(match.group('change'))
+    if change == 0:
+        return None
+    return ticker, METRIC_CHANGE, ABOVE if change > 0 else BELOW, change
+
+
+def describe_alert(alert):
+    """알림 조건을 사람이 읽을 수 있는 문자열로 만듭니다."""
+    if alert['metric'] == METRIC_PRICE:
+        op = '>' if alert['direction'] == ABOVE else '<'
+        return f"${alert['ticker']} {op} {alert['threshold']:g}"
+    return f"${alert['ticker']} {alert['threshold']:+g}%"
+
+
+class ThresholdList:
+    """발동 시점이 목록 끝에 모이도록 정렬해 둔 기준값 목록입니다.
+
+    above 알림은 기준값의 부호를 바꿔 저장하므로, 두 방향 모두 '키 >= 현재값'인 꼬리 부분이
+    발동 대상이 됩니다. 확인은 이진 탐색, 발동분 제거는 꼬리 삭제라서 O(log n + 발동 수)입니다.
+    """
+
+    def __init__(self, direction):
+        self.sign = -1 if direction == ABOVE else 1
+        self.entries = []  # (키, 알림 ID) 오름차순
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, threshold, alert_id):
+        insort(self.entries, (self.sign * threshold, alert_id))
+
+    def remove(self, threshold, alert_id):
+        i = bisect_left(self.entries, (self.sign * threshold, alert_id))
+        if i < len(self.entries) and self.entries[i][1] == alert_id:
+            del self.entries[i]
+
+    def pop_triggered(self, value):
+        """현재값에 의해 발동된 알림 ID를 꺼내서 반환합니다."""
+        i = bisect_left(self.entries, (self.sign * value, float('-inf')))
+        if i == len(self.entries):
+            return []
+        fired = [alert_id for _, alert_id in self.entries[i:]]
+        del self.entries[i:]
+        return fired
+
+
+class AlertIndex:
+    """티커별, 기준별, 방향별로 정렬된 기준값 목록을 유지하는 알림 발동 인덱스입니다."""
+
+    def __init__(self):
+        self.alerts = {}  # 알림 ID -> 알림
+        self._lists = {}  # 티커 -> {(기준, 방향): ThresholdList}
+
+    def __len__(self):
+        return len(self.alerts)
+
+    def tickers(self):
+        """활성 알림이 있는 티커 목록을 반환합니다."""
+        return list(self._lists)
+
+    def add(self, alert):
+        self.alerts[alert['id']] = alert
+        lists = self._lists.setdefault(alert['ticker'], {})
+        key = (alert['metric'], alert['direction'])
+        if key not in lists:
+            lists[key] = ThresholdList(alert['direction'])
+        lists[key].add(alert['threshold'], alert['id'])
+
+    def remove(self, alert_id):
+        alert = self.alerts.pop(alert_id, None)
+        if alert is None:
+            return None
+        lists = self._lists[alert['ticker']]
+        lists[(alert['metric'], alert['direction'])].remove(alert['threshold'], alert_id)
+        self._cleanup(alert['ticker'])
+        return alert
+
+    def for_chat(self, chat_id):
+        """채팅방의 활성 알림 목록을 반환합니다."""
+        return [alert for alert in self.alerts.values() if alert['chat_id'] == chat_id]
+
+    def evaluate(self, ticker, price, change_percent):
+        """새 시세로 발동된 알림을 인덱스에서 제거하고 반환합니다."""
+        lists = self._lists.get(ticker)
+        if not lists:
+            return []
+        fired = []
+        for (metric, _), thresholds in lists.items():
+            value = price if metric == METRIC_PRICE else change_percent
+            fired.extend(thresholds.pop_triggered(value))
+        self._cleanup(ticker)
+        return [self.alerts.pop(alert_id) for alert_id in fired]
+
+    def _cleanup(self, ticker):
+        lists = self._lists[ticker]
+        for key in [key for key, thresholds in lists.items() if not thresholds]:
+            del lists[key]
+        if not lists:
+            del self._lists[ticker]
+
+
+class AlertStore:
+    """가격 알림 저장소 인터페이스입니다. 발동된 알림은 triggered_at을 기록해 비활성화합니다."""
+
+    def init(self):
+        raise NotImplementedError
+
+    def load_active(self):
+        """활성 알림 목록을 반환합니다."""
+        raise NotImplementedError
+
+    def add(self, chat_id, ticker, metric, direction, threshold):
+        """알림을 저장하고 ID가 채워진 알림을 반환합니다."""
+        raise NotImplementedError
+
+    def mark_triggered(self, alert_ids):
+        raise NotImplementedError
+
+    def delete(self, alert_id, chat_id):
+        """채팅방의 알림을 삭제합니다. 삭제되면 True를 반환합니다."""
+        raise NotImplementedError
+
+    def after_fork(self):
+        """fork된 자식 프로세스에서 부모의 연결을 버립니다. (채팅 로그 저장소의 after_fork 뒤에 호출)"""
+
+
+def make_alert(alert_id, chat_id, ticker, metric, direction, threshold, created_at):
+    return {
+        'id': alert_id,
+        'chat_id': chat_id,
+        'ticker': ticker,
+        'metric': metric,
+        'direction': direction,
+        'threshold': threshold,
+        'created_at': created_at,
+    }
+
+
+class PostgresAlertStore(AlertStore):
+    """채팅 로그와 같은 PostgreSQL DB의 price_alerts 테이블을 사용합니다."""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def init(self):
+        def create(cur):
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS price_alerts (
+                    id SERIAL PRIMARY KEY,
+                    chat_id BIGINT NOT NULL,
+                    ticker TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    direction TEXT NOT NULL,
+                    threshold DOUBLE PRECISION NOT NULL,
+                    created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                    triggered_at TIMESTAMP WITH TIME ZONE
+                )
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS price_alerts_active_idx
+                ON price_alerts (ticker) WHERE triggered_at IS NULL
+            """)
+        self.storage.execute(create)
+
+    def load_active(self):
+        def select(cur):
+            cur.execute("""
+                SELECT id, chat_id, ticker, metric, direction, threshold, created_at
+                FROM price_alerts WHERE triggered_at IS NULL
+            """)
+            return [make_alert(*row) for row in cur.fetchall()]
+        return self.storage.execute(select)
+
+    def add(self, chat_id, ticker, metric, direction, threshold):
+        created_at = datetime.now()
+
+        def insert(cur):
+            cur.execute("""
+                INSERT INTO price_alerts (chat_id, ticker, metric, direction, threshold, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s) RETURNING id
+            """, (chat_id, ticker, metric, direction, threshold, created_at))
+            return cur.fetchone()[0]
+        alert_id = self.storage.execute(insert)
+        return make_alert(alert_id, chat_id, ticker, metric, direction, threshold, created_at)
+
+    def mark_triggered(self, alert_ids):
+        def update(cur):
+            cur.execute("UPDATE price_alerts SET triggered_at = now() WHERE id = ANY(%s)", (list(alert_ids),))
+        self.storage.execute(update)
+
+    def delete(self, alert_id, chat_id):
+        def remove(cur):
+            cur.execute("""
+                DELETE FROM price_alerts WHERE id = %s AND chat_id = %s AND triggered_at IS NULL
+            """, (alert_id, chat_id))
+            return cur.rowcount > 0
+        return self.storage.execute(remove)
+
+
+class SQLiteAlertStore(AlertStore):
+    """SQLite의 price_alerts 테이블을 사용합니다. 채팅 로그 SQLite 연결이 있으면 함께 씁니다."""
+
+    def __init__(self, path=None, storage=None):
+        self.path = path
+        self.storage = storage
+        self.conn = None
+        self._lock = storage.lock if storage is not None else threading.Lock()
+
+    def after_fork(self):
+        if self.storage is None:
+            keep_inherited(self.conn)
+        self.conn = None
+        self._lock = self.storage.lock if self.storage is not None else threading.Lock()
+
+    def init(self):
+        if self.storage is not None:
+            self.conn = self.storage.conn
+        else:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        with self._lock:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS price_alerts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id INTEGER NOT NULL,
+                    ticker TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    direction TEXT NOT NULL,
+                    threshold REAL NOT NULL,
+                    created_at TEXT NOT NULL,
+                    triggered_at TEXT
+                )
+            """)
+            self.conn.execute("""
+                CREATE INDEX IF NOT EXISTS price_alerts_active_idx
+                ON price_alerts (ticker) WHERE triggered_at IS NULL
+            """)
+            self.conn.commit()
+
+    def load_active(self):
+        with self._lock:
+            rows = self.conn.execute("""
+                SELECT id, chat_id, ticker, metric, direction, threshold, created_at
+                FROM price_alerts WHERE triggered_at IS NULL
+            """).fetchall()
+        return [make_alert(*row[:6], datetime.fromisoformat(row[6])) for row in rows]
+
+    def add(self, chat_id, ticker, metric, direction, threshold):
+        created_at = datetime.now()
+        with self._lock:
+            cur = self.conn.execute("""
+                INSERT INTO price_alerts (chat_id, ticker, metric, direction, threshold, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (chat_id, ticker, metric, direction, threshold, created_at.isoformat()))
+            self.conn.commit()
+        return make_alert(cur.lastrowid, chat_id, ticker, metric, direction, threshold, created_at)
+
+    def mark_triggered(self, alert_ids):
+        now = datetime.now().isoformat()
+        with self._lock:
+            self.conn.executemany(
+                "UPDATE price_alerts SET triggered_at = ? WHERE id = ?",
+                [(now, alert_id) for alert_id in alert_ids]
+            )
+            self.conn.commit()
+
+    def delete(self, alert_id, chat_id):
+        with self._lock:
+            cur = self.conn.execute(
+                "DELETE FROM price_alerts WHERE id = ? AND chat_id = ? AND triggered_at IS NULL",
+                (alert_id, chat_id)
+            )
+            self.conn.commit()
+        return cur.rowcount > 0
+
+
+def create_alert_store(storage):
+    """채팅 로그 저장소와 같은 곳에 알림을 저장하는 저장소를 만듭니다.
+
+    파일 저장소는 테이블이 없으므로 별도의 SQLite 파일(ALERT_SQLITE_PATH)을 사용합니다.
+    """
+    if isinstance(storage, PostgresChatLogStorage):
+        return PostgresAlertStore(storage)
+    if isinstance(storage, SQLiteChatLogStorage):
+        return SQLiteAlertStore(storage=storage)
+    return SQLiteAlertStore(path=os.getenv('ALERT_SQLITE_PATH', 'alerts.db'))
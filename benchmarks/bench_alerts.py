@@ -0,0 +1,139 @@
+"""가격 알림 발동 확인 시뮬레이션: 정렬 인덱스(AlertIndex) vs 전체 선형 탐색
+
+기본값은 시드 고정 랜덤워크 가격 시계열을 사용합니다.
+--record로 실제 1분봉 종가를 저장한 뒤 --series로 재생할 수 있습니다.
+
+    python benchmarks/bench_alerts.py --alerts 10000
+    python benchmarks/bench_alerts.py --record AAPL MSFT NVDA TSLA --series prices.json
+    python benchmarks/bench_alerts.py --series prices.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from alerts import AlertIndex, METRIC_PRICE, METRIC_CHANGE, ABOVE, BELOW  # noqa: E402
+
+def random_walk_series(tickers, ticks, seed):
+    """티커별 (전일 종가, 가격 시계열)을 랜덤워크로 만듭니다."""
+    rng = random.Random(seed)
+    series = {}
+    for ticker in tickers:
+        previous_close = rng.uniform(20, 500)
+        price = previous_close
+        prices = []
+        for _ in range(ticks):
+            price *= 1 + rng.gauss(0, 0.002)
+            prices.append(price)
+        series[ticker] = {'previous_close': previous_close, 'prices': prices}
+    return series
+
+def record(tickers, path):
+    """yfinance로 최근 1분봉 종가를 받아 저장합니다. (네트워크 필요)"""
+    import yfinance as yf
+
+    series = {}
+    for ticker in tickers:
+        stock = yf.Ticker(ticker)
+        history = stock.history(period='1d', interval='1m')
+        meta = stock.get_history_metadata()
+        series[ticker] = {
+            'previous_close': meta.get('previousClose') or meta.get('chartPreviousClose'),
+            'prices': [float(price) for price in history['Close'].dropna()],
+        }
+    with open(path, 'w') as f:
+        json.dump(series, f)
+    print(f"{len(series)}개 티커 시계열 저장: {path}")
+
+def make_alerts(series, count, seed):
+    """현재가 주변에 기준값이 퍼지도록 가격/등락률 알림을 만듭니다."""
+    rng = random.Random(seed)
+    tickers = list(series)
+    alerts = []
+    for alert_id in range(1, count + 1):
+        ticker = rng.choice(tickers)
+        base = series[ticker]['previous_close']
+        if rng.random() < 0.7:
+            direction = rng.choice((ABOVE, BELOW))
+            offset = rng.uniform(0.001, 0.05)
+            threshold = base * (1 + offset if direction == ABOVE else 1 - offset)
+            metric = METRIC_PRICE
+        else:
+            threshold = rng.choice((-1, 1)) * rng.uniform(0.1, 5)
+            direction = ABOVE if threshold > 0 else BELOW
+            metric = METRIC_CHANGE
+        alerts.append({'id': alert_id, 'chat_id': alert_id % 100, 'ticker': ticker,
+                       'metric': metric, 'direction': direction, 'threshold': threshold})
+    return alerts
+
+def linear_fired(active, ticker, price, change_percent):
+    """모든 활성 알림을 하나씩 확인하는 기준 구현입니다."""
+    fired = []
+    for alert in list(active.values()):
+        if alert['ticker'] != ticker:
+            continue
+        value = price if alert['metric'] == METRIC_PRICE else change_percent
+        if (alert['direction'] == ABOVE and value >= alert['threshold']) or \
+           (alert['direction'] == BELOW and value <= alert['threshold']):
+            fired.append(alert)
+            del active[alert['id']]
+    return fired
+
+def simulate(series, alerts, check):
+    """틱마다 모든 티커 가격으로 check를 호출하고, 걸린 시간과 발동 알림 ID를 반환합니다."""
+    ticks = max(len(s['prices']) for s in series.values())
+    fired_ids = []
+    start = time.perf_counter()
+    for i in range(ticks):
+        for ticker, s in series.items():
+            if i >= len(s['prices']):
+                continue
+            price = s['prices'][i]
+            change_percent = (price - s['previous_close']) / s['previous_close'] * 100
+            fired_ids.extend(alert['id'] for alert in check(ticker, price, change_percent))
+    return time.perf_counter() - start, ticks, fired_ids
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--alerts', type=int, default=10000, help='알림 수')
+    parser.add_argument('--tickers', type=int, default=50, help='랜덤워크 티커 수')
+    parser.add_argument('--ticks', type=int, default=390, help='랜덤워크 틱 수 (기본: 정규장 1분봉)')
+    parser.add_argument('--series', help='가격 시계열 JSON 파일')
+    parser.add_argument('--record', nargs='+', metavar='TICKER', help='실제 시계열을 받아 --series 경로에 저장')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, args.series or 'prices.json')
+        return
+
+    if args.series:
+        with open(args.series) as f:
+            series = json.load(f)
+    else:
+        series = random_walk_series([f'T{i:03d}' for i in range(args.tickers)], args.ticks, args.seed)
+    alerts = make_alerts(series, args.alerts, args.seed)
+
+    index = AlertIndex()
+    build_start = time.perf_counter()
+    for alert in alerts:
+        index.add(dict(alert))
+    build_time = time.perf_counter() - build_start
+    index_time, ticks, index_fired = simulate(series, alerts, index.evaluate)
+
+    active = {alert['id']: dict(alert) for alert in alerts}
+    linear_time, _, linear_fired_ids = simulate(
+        series, alerts, lambda t, p, c: linear_fired(active, t, p, c))
+
+    assert sorted(index_fired) == sorted(linear_fired_ids), "두 방식의 발동 결과가 다릅니다"
+    updates = ticks * len(series)
+    print(f"알림 {len(alerts)}개, 티커 {len(series)}개, 틱 {ticks}개, 발동 {len(index_fired)}개")
+    print(f"{'index':<8} 총 {index_time * 1000:9.1f}ms  시세 1건당 {index_time / updates * 1e6:8.2f}us"
+          f"  (인덱스 구축 {build_time * 1000:.1f}ms)")
+    print(f"{'linear':<8} 총 {linear_time * 1000:9.1f}ms  시세 1건당 {linear_time / updates * 1e6:8.2f}us")
+
+if __name__ == '__main__':
+    main()
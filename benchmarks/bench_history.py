@@ -0,0 +1,73 @@
+"""/chart, /stats 반복 요청 비용: 매번 전체 일봉 다운로드 vs 일봉 저장소(메모리 맵) 읽기
+
+다운로드는 지연 시간을 준 가짜 yfinance DataFrame으로 대체합니다. (네트워크 불필요)
+
+    python benchmarks/bench_history.py --years 5 --requests 200 --latency 0.3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from price_history import PriceHistoryStore, frame_to_columns, compute_stats  # noqa: E402
+
+def fake_history(start, end, latency, seed=0):
+    """yfinance history(auto_adjust=False, actions=True)와 같은 모양의 랜덤워크 일봉입니다."""
+    time.sleep(latency)
+    index = pd.date_range(start, end, freq='B', inclusive='left', tz='America/New_York')
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, len(index))))
+    return pd.DataFrame({
+        'Open': close, 'High': close * 1.01, 'Low': close * 0.99, 'Close': close, 'Adj Close': close,
+        'Volume': rng.integers(1_000_000, 5_000_000, len(index)).astype(float),
+        'Dividends': 0.0, 'Stock Splits': 0.0,
+    }, index=index)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--years', type=int, default=5, help='요청 기간 (년)')
+    parser.add_argument('--requests', type=int, default=200, help='같은 티커 반복 요청 수')
+    parser.add_argument('--latency', type=float, default=0.3, help='가짜 다운로드 1회 지연 (초)')
+    args = parser.parse_args()
+
+    today = date.today()
+    start = today - timedelta(days=365 * args.years)
+    end = today + timedelta(days=1)
+
+    # 기존 방식: 요청마다 전체 기간을 받아 계산
+    began = time.perf_counter()
+    for _ in range(args.requests):
+        compute_stats(frame_to_columns(fake_history(start, end, args.latency)))
+    download = (time.perf_counter() - began) / args.requests * 1e3
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = PriceHistoryStore(directory, refresh_after=3600)
+        store.init()
+        began = time.perf_counter()
+        store.merge('BENCH', frame_to_columns(fake_history(start, end, args.latency)), start, end)
+        cold = (time.perf_counter() - began) * 1e3
+
+        # 저장소: 조회할 구간이 없으면 메모리 맵 읽기 + 계산만 수행
+        began = time.perf_counter()
+        for _ in range(args.requests):
+            assert not store.missing_ranges('BENCH', start, today)
+            data, _ = store.read('BENCH', start)
+            compute_stats(data)
+        warm = (time.perf_counter() - began) / args.requests * 1e3
+        rows = data.shape[1]
+
+    print(f"{args.years}년 일봉 {rows}행, 반복 요청 {args.requests}건, 다운로드 지연 {args.latency}초")
+    print(f"{'방식':<28}{'요청당 (ms)':>14}")
+    print(f"{'매번 전체 다운로드':<28}{download:>14.2f}")
+    print(f"{'저장소 첫 요청 (다운로드)':<28}{cold:>14.2f}")
+    print(f"{'저장소 반복 요청 (mmap)':<28}{warm:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""메시지 1건당 로깅 비용 비교: 기존 배너/print vs 구조화 로그(큐 출력 + 샘플링)
+
+이벤트 루프 스레드에서 로그 호출에 쓰는 시간만 잽니다. 출력은 기본적으로 /dev/null로 보냅니다.
+
+    python benchmarks/bench_logging.py --updates 20000 --sample 10
+    python benchmarks/bench_logging.py --output /tmp/bench.log  # 실제 파일 쓰기 포함
+"""
+import argparse
+import contextlib
+import logging
+import os
+import sys
+import time
+import traceback
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from log_config import setup_logging, stop_listener, log_event, LOG_FORMAT_JSON, TEXT_FORMAT  # noqa: E402
+
+logger = logging.getLogger('bot')
+
+
+def legacy_update(chat_id, user, text, ticker):
+    """기존 handle_message가 정상 조회 1건마다 남기던 로그를 그대로 재현합니다."""
+    timestamp = datetime.now()
+    logger.info(f"""
+=== 새로운 메시지 수신 ===
+시간: {timestamp}
+채팅 ID: {chat_id}
+사용자: {user}
+메시지: {text}
+======================""")
+    logger.info(f"""
+=== 메시지 수신 ===
+시간: {datetime.now()}
+채팅 ID: {chat_id}
+사용자: {user}
+메시지: {text}
+======================""")
+    print(f"{ticker} 정보 가져오는 중...")
+    print("응답 메시지 전송 중...")
+    print("응답 전송 완료")
+
+
+def legacy_error(ticker):
+    """기존 코드의 조회 실패 1건 로그(추적 정보 즉시 포맷)를 재현합니다."""
+    try:
+        raise RuntimeError('boom')
+    except Exception as e:
+        print(f"주식 데이터 가져오기 실패: {str(e)}")
+        print(traceback.format_exc())
+        logging.error(f"Error fetching stock info for {ticker}: {str(e)}")
+
+
+def structured_update(chat_id, user, text, ticker):
+    """현재 handle_message가 정상 조회 1건마다 남기는 로그입니다."""
+    log_event(
+        logger, logging.INFO, 'message_received',
+        "메시지 수신 (채팅 ID %s, 사용자 %s): %s", chat_id, user, text,
+        chat_id=chat_id, user=user, message=text,
+    )
+    log_event(logger, logging.DEBUG, 'quote_sent', "%s 응답 전송 완료", ticker, ticker=ticker, chat_id=chat_id)
+
+
+def structured_error(ticker):
+    """현재 코드의 조회 실패 1건 로그입니다. 추적 정보는 출력 스레드에서 포맷됩니다."""
+    try:
+        raise RuntimeError('boom')
+    except Exception:
+        logger.exception("주식 데이터 가져오기 실패: %s", ticker)
+
+
+def run(update, error, updates, error_every):
+    """업데이트 1건당 로그 호출 시간(마이크로초)을 반환합니다."""
+    start = time.perf_counter()
+    for i in range(updates):
+        ticker = f'T{i % 500:03d}'
+        update(1000 + i % 50, f'user{i % 50}', f'/p ${ticker}', ticker)
+        if error_every and i % error_every == 0:
+            error(ticker)
+    return (time.perf_counter() - start) / updates * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--updates', type=int, default=20000, help='처리할 메시지 수')
+    parser.add_argument('--sample', type=int, default=10, help='message_received를 N건 중 1건만 기록 (1이면 모두 기록)')
+    parser.add_argument('--error-every', type=int, default=100, help='N건마다 조회 실패 로그 1건 (0이면 없음)')
+    parser.add_argument('--output', default=os.devnull, help='로그 출력 파일')
+    args = parser.parse_args()
+
+    with open(args.output, 'w', encoding='utf-8') as out:
+        # 기존: 같은 스레드에서 바로 포맷하고 출력
+        root = logging.getLogger()
+        handler = logging.StreamHandler(out)
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+        with contextlib.redirect_stdout(out):
+            legacy = run(legacy_update, legacy_error, args.updates, args.error_every)
+        root.removeHandler(handler)
+
+        # 현재: JSON, 큐 출력, 샘플링 없음 / 있음
+        results = {}
+        for sample in sorted({1, args.sample}):
+            listener = setup_logging(LOG_FORMAT_JSON, logging.INFO, {'message_received': sample}, stream=out)
+            results[sample] = run(structured_update, structured_error, args.updates, args.error_every)
+            drain_start = time.perf_counter()
+            stop_listener(listener)
+            results[sample] = (results[sample], (time.perf_counter() - drain_start) / args.updates * 1e6)
+
+    print(f"메시지 {args.updates}건, 실패 로그 {args.error_every}건당 1건, 출력: {args.output}")
+    print(f"{'방식':<28}{'호출 스레드 (us/건)':>22}{'출력 스레드 잔여 (us/건)':>26}")
+    print(f"{'기존 배너 + print':<28}{legacy:>22.2f}{'-':>26}")
+    for sample, (emit, drain) in results.items():
+        label = 'JSON + 큐' + (f' + 샘플링 1/{sample}' if sample > 1 else '')
+        print(f"{label:<28}{emit:>22.2f}{drain:>26.2f}")
+
+
+if __name__ == '__main__':
+    main()
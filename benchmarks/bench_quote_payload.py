@@ -0,0 +1,181 @@
+"""시세 1건당 Yahoo 요청 수/전송량/처리 시간 비교: 봇의 차트 API 경량 조회 vs Ticker.info
+
+requests.Session을 대체하는 스텁으로 두 경로가 실제로 보내는 요청을 셉니다. (yfinance의 쿠키/crumb 요청과 재시도 포함)
+응답은 --record로 benchmarks/fixtures/recorded/ 에 저장한 실제 응답을 쓰고, 없으면 fixtures/sample/ 의 예시 응답을 씁니다.
+예시 응답은 봇이 읽는 필드 위주로 손으로 줄인 것이라 실제 크기와 다르므로, 전송량은 실제 응답을 저장했을 때만 출력합니다.
+
+    python benchmarks/bench_quote_payload.py
+    python benchmarks/bench_quote_payload.py --record AAPL   # 실제 응답을 저장 (네트워크 필요)
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# 봇 모듈을 불러오기 전에 로그 출력과 지표 서버를 끔
+os.environ.setdefault('LOG_LEVEL', 'CRITICAL')
+os.environ['METRICS_PORT'] = '0'
+
+import bot  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+RECORDED_DIR = os.path.join(FIXTURE_DIR, 'recorded')
+SAMPLE_DIR = os.path.join(FIXTURE_DIR, 'sample')
+
+# 요청 주소 -> 응답 종류 (앞의 네 가지만 시세 데이터이며 fixture로 저장)
+KINDS = (
+    ('/v8/finance/chart/', 'chart'),
+    ('/v10/finance/quoteSummary/', 'quote_summary'),
+    ('/v7/finance/quote', 'quote'),
+    ('/timeseries/', 'timeseries'),
+    ('fc.yahoo.com', 'cookie'),
+    ('/getcrumb', 'crumb'),
+    ('yahoo.com/consent', 'consent'),
+    ('collectConsent', 'consent'),
+    ('copyConsent', 'consent'),
+)
+DATA_KINDS = ('chart', 'quote_summary', 'quote', 'timeseries')
+FIELDS = ('regularMarketPrice', 'previousClose', 'dayHigh', 'dayLow', 'currency', 'longName')
+
+def request_kind(url):
+    for pattern, kind in KINDS:
+        if pattern in url:
+            return kind
+    return 'other'
+
+def fixture_dir(symbol):
+    """실제 응답이 모두 저장되어 있으면 그 디렉터리를, 아니면 예시 응답 디렉터리를 반환합니다."""
+    recorded = all(os.path.exists(os.path.join(RECORDED_DIR, f'{kind}_{symbol}.json')) for kind in DATA_KINDS)
+    return RECORDED_DIR if recorded else SAMPLE_DIR
+
+class YahooTransport:
+    """requests.Session.request 자리에 들어가 요청을 종류별로 세고 응답 본문 크기를 더합니다.
+
+    record가 True면 실제로 요청하고 시세 데이터 응답을 저장하며, 아니면 저장된 응답을 돌려줍니다.
+    symbol이 아닌 티커의 차트 요청은 Yahoo처럼 404로 응답합니다.
+    """
+
+    def __init__(self, symbol, directory, record=False):
+        self.symbol = symbol
+        self.directory = directory
+        self.record = record
+        self.requests = Counter()
+        self.bytes = 0
+        self._original = requests.Session.request
+
+    def install(self):
+        transport = self
+
+        def request(session, method, url, **kwargs):
+            return transport.handle(session, method, url, **kwargs)
+        requests.Session.request = request
+
+    def uninstall(self):
+        requests.Session.request = self._original
+
+    def handle(self, session, method, url, **kwargs):
+        kind = request_kind(url)
+        self.requests[kind] += 1
+        if self.record:
+            response = self._original(session, method, url, **kwargs)
+            if kind in DATA_KINDS and response.ok:
+                with open(os.path.join(self.directory, f'{kind}_{self.symbol}.json'), 'wb') as f:
+                    f.write(response.content)
+        else:
+            response = self._replay(kind, url)
+        self.bytes += len(response.content)
+        return response
+
+    def _replay(self, kind, url):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b''
+        if kind == 'cookie':
+            response.cookies = requests.cookies.cookiejar_from_dict({'A3': 'bench'})
+        elif kind == 'crumb':
+            response._content = b'bench-crumb'
+        elif kind == 'chart' and url.rsplit('/', 1)[-1] != self.symbol:
+            response.status_code = 404
+            response._content = b'{"chart":{"result":null,"error":{"code":"Not Found","description":"No data found, symbol may be delisted"}}}'
+        elif kind in DATA_KINDS:
+            with open(os.path.join(self.directory, f'{kind}_{self.symbol}.json'), 'rb') as f:
+                response._content = f.read()
+        elif kind != 'consent':
+            response.status_code = 404
+        return response
+
+def measure(transport, func, number):
+    """(첫 호출 요청 수, 반복 호출 1회당 요청 수, 1회당 본문 바이트, 1회당 처리 시간 ms, 결과)를 반환합니다."""
+    transport.requests.clear()
+    result = func()
+    cold = sum(transport.requests.values())
+    transport.requests.clear()
+    transport.bytes = 0
+    began = time.perf_counter()
+    for _ in range(number):
+        func()
+    elapsed = (time.perf_counter() - began) / number * 1e3
+    return cold, sum(transport.requests.values()) / number, transport.bytes / number, elapsed, result
+
+def ticker_info(symbol):
+    return bot.yf.Ticker(symbol).info
+
+def record(symbol):
+    """두 경로를 실제로 한 번씩 호출해서 시세 데이터 응답을 fixtures/recorded/에 저장합니다. (네트워크 필요)"""
+    os.makedirs(RECORDED_DIR, exist_ok=True)
+    transport = YahooTransport(symbol, RECORDED_DIR, record=True)
+    transport.install()
+    try:
+        bot.fetch_stock_info(symbol)
+        ticker_info(symbol)
+    finally:
+        transport.uninstall()
+    print(f"{symbol} 응답 저장 완료: {dict(transport.requests)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--symbol', default='AAPL')
+    parser.add_argument('--number', type=int, default=200, help='반복 호출 횟수')
+    parser.add_argument('--record', metavar='SYMBOL', help='실제 응답을 받아 fixture로 저장')
+    args = parser.parse_args()
+
+    # 다른 실행에서 저장한 yfinance 쿠키/시간대 캐시를 쓰지 않도록 임시 디렉터리 사용 (첫 호출 요청 수에 포함)
+    bot.yf.set_tz_cache_location(tempfile.mkdtemp(prefix='yf-cache-'))
+    if args.record:
+        record(args.record)
+        return
+
+    directory = fixture_dir(args.symbol)
+    recorded = directory == RECORDED_DIR
+    transport = YahooTransport(args.symbol, directory)
+    transport.install()
+    try:
+        rows = {
+            'chart': measure(transport, lambda: bot.fetch_stock_info(args.symbol), args.number),
+            'info': measure(transport, lambda: ticker_info(args.symbol), args.number),
+            'chart (404)': measure(transport, lambda: bot.fetch_stock_info(f'{args.symbol}XX'), args.number),
+        }
+    finally:
+        transport.uninstall()
+
+    chart_result, info_result = rows['chart'][-1], rows['info'][-1]
+    different = [key for key in FIELDS if chart_result.get(key) != info_result.get(key)]
+    if different:
+        print(f"두 경로의 값이 다름: {', '.join(different)}")
+
+    print(f"응답: {'실제 응답 (' + directory + ')' if recorded else '예시 응답 (전송량 생략, --record로 실제 응답 저장)'}")
+    print(f"{'path':<12} {'req(cold)':>9} {'req(warm)':>9} {'bytes':>8} {'time':>10}")
+    for name, (cold, warm, size, elapsed, _) in rows.items():
+        # 404 응답은 저장하지 않고 스텁이 만들므로 전송량 생략
+        size_text = f"{size:>8.0f}" if recorded and name != 'chart (404)' else f"{'-':>8}"
+        print(f"{name:<12} {cold:>9} {warm:>9.1f} {size_text} {elapsed:>8.2f}ms")
+    print("bytes는 압축 해제 후 본문 크기 (쿠키/crumb 응답 포함)")
+
+if __name__ == '__main__':
+    main()
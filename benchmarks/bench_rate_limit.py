@@ -0,0 +1,94 @@
+"""캐시 미스 조회 지연 시간 비교: 기존 랜덤 지연 vs 토큰 버킷 제한기
+
+Yahoo 응답은 고정 지연을 가진 스텁으로 대체합니다.
+
+    python benchmarks/bench_rate_limit.py --requests 30 --arrival 0.5
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import bot  # noqa: E402
+
+# 기존 동작의 랜덤 지연 범위 (초)
+LEGACY_MIN_DELAY = 2
+LEGACY_MAX_DELAY = 5
+
+def make_stub(latency):
+    """지정한 지연 후 고정된 정보를 돌려주는 Yahoo 스텁을 만듭니다."""
+    def fetch_stock_info(ticker, with_name=True):
+        time.sleep(latency)
+        return {
+            'regularMarketPrice': 101.0,
+            'previousClose': 100.0,
+            'dayHigh': 102.0,
+            'dayLow': 99.0,
+            'currency': 'USD',
+            'longName': f'{ticker} Inc.',
+        }
+    return fetch_stock_info
+
+async def legacy_get(ticker):
+    """기존 방식: 매 조회마다 2~5초 랜덤 지연 후 요청합니다."""
+    await asyncio.sleep(random.uniform(LEGACY_MIN_DELAY, LEGACY_MAX_DELAY))
+    return await bot.run_fetch(bot.fetch_stock_info, ticker)
+
+async def bucket_get(ticker):
+    """현재 방식: 토큰 버킷 한도를 넘을 때만 대기합니다."""
+    return await bot.get_stock_data(ticker)
+
+async def run(get, requests, arrival):
+    """포아송 도착으로 서로 다른 티커를 조회하고 지연 시간 목록을 반환합니다."""
+    latencies = []
+
+    async def one(i):
+        start = time.perf_counter()
+        await get(f'T{i:05d}')
+        latencies.append(time.perf_counter() - start)
+
+    tasks = []
+    for i in range(requests):
+        tasks.append(asyncio.create_task(one(i)))
+        await asyncio.sleep(random.expovariate(arrival))
+    await asyncio.gather(*tasks)
+    return latencies
+
+def percentile(values, p):
+    """p 분위수를 계산합니다."""
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+def report(name, latencies):
+    print(f"{name:<8} n={len(latencies):<4} "
+          f"p50={percentile(latencies, 50) * 1000:8.1f}ms "
+          f"p99={percentile(latencies, 99) * 1000:8.1f}ms "
+          f"mean={statistics.mean(latencies) * 1000:8.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=30, help='조회 요청 수')
+    parser.add_argument('--arrival', type=float, default=0.5, help='초당 평균 요청 도착 수')
+    parser.add_argument('--latency', type=float, default=0.2, help='Yahoo 스텁 응답 지연 (초)')
+    parser.add_argument('--rate', type=float, default=bot.YF_RATE, help='토큰 버킷 초당 요청 수')
+    parser.add_argument('--burst', type=int, default=bot.YF_BURST, help='토큰 버킷 용량')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    bot.fetch_stock_info = make_stub(args.latency)
+
+    random.seed(args.seed)
+    report('legacy', asyncio.run(run(legacy_get, args.requests, args.arrival)))
+
+    random.seed(args.seed)
+    bot.stock_cache.clear()
+    bot.yahoo_limiter = bot.TokenBucket(args.rate, args.burst)
+    report('bucket', asyncio.run(run(bucket_get, args.requests, args.arrival)))
+
+if __name__ == '__main__':
+    main()
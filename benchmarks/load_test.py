@@ -0,0 +1,397 @@
+"""오프라인 부하 테스트: 가짜 텔레그램/Yahoo/DB로 handle_message 처리량과 지연 시간을 측정합니다.
+
+텔레그램 Update 객체를 만들어 포아송 도착으로 handle_message에 넣고, 다음을 가짜로 대체합니다.
+- context.bot.send_message: 지정한 지연 후 성공
+- yf.Ticker / 묶음 quote API: 지정한 지연, 일정 비율의 429(YFRateLimitError) 응답, 없는 티커
+- 채팅 로그 저장소(psycopg2 풀 대신): 지정한 지연 후 성공
+
+    python benchmarks/load_test.py --rate 50 --messages 2000
+    python benchmarks/load_test.py --rate 200 --messages 5000 --yahoo-latency 0.3 --rate-limit-ratio 0.05
+    python benchmarks/load_test.py --json > result.json  # 회귀 비교용
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# 봇 모듈을 불러오기 전에 로그 출력을 끔 (LOG_LEVEL 환경 변수로 다시 켤 수 있음)
+os.environ.setdefault('LOG_LEVEL', 'CRITICAL')
+os.environ['METRICS_PORT'] = '0'
+
+import requests  # noqa: E402
+from telegram import Chat, Message, Update, User  # noqa: E402
+
+import bot  # noqa: E402
+from chat_log_storage import ChatLogStorage  # noqa: E402
+from routing import ChatAllowlist  # noqa: E402
+from metrics import STAGE_DURATION  # noqa: E402
+
+AUTHORIZED_CHAT_ID = -1000000000001
+
+
+class YFRateLimitError(Exception):
+    """yfinance의 요청 제한 에러와 이름이 같은 가짜 예외입니다. (bot.is_rate_limit_error가 이름으로 판별)"""
+
+    def __init__(self):
+        super().__init__('Too Many Requests. Rate limited. Try after a while.')
+
+
+class FakeYahoo:
+    """지연 시간과 429 응답을 흉내 내는 Yahoo 대체물입니다. 호출 횟수를 종류별로 셉니다."""
+
+    def __init__(self, latency, jitter, rate_limit_ratio, invalid_tickers, seed):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.invalid_tickers = set(invalid_tickers)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = Counter()
+
+    def _request(self, kind):
+        """요청 1건을 기록하고 지연시킨 뒤, 확률에 따라 429를 발생시킵니다."""
+        with self.lock:
+            self.calls[kind] += 1
+            delay = max(0.0, self.random.gauss(self.latency, self.jitter))
+            limited = self.random.random() < self.rate_limit_ratio
+        time.sleep(delay)
+        if limited:
+            with self.lock:
+                self.calls['rate_limited'] += 1
+            raise YFRateLimitError()
+
+    def quote(self, symbol):
+        """티커별로 항상 같은 가짜 시세를 만듭니다."""
+        base = 10 + (sum(map(ord, symbol)) % 990)
+        return {
+            'symbol': symbol,
+            'regularMarketPrice': base * 1.01,
+            'regularMarketPreviousClose': base,
+            'regularMarketDayHigh': base * 1.02,
+            'regularMarketDayLow': base * 0.99,
+            'currency': 'USD',
+            'longName': f'{symbol} Holdings Inc.',
+        }
+
+    def Ticker(self, symbol):
+        return FakeTicker(self, symbol.upper())
+
+    def YfData(self):
+        return FakeYfData(self)
+
+
+class FakeTicker:
+    def __init__(self, yahoo, symbol):
+        self.yahoo = yahoo
+        self.symbol = symbol
+
+    @property
+    def info(self):
+        self.yahoo._request('info')
+        return {}
+
+
+class FakeYfData:
+    def __init__(self, yahoo):
+        self.yahoo = yahoo
+
+    def get_raw_json(self, url, params=None):
+        self.yahoo._request('quote_batch')
+        symbols = [s.upper() for s in params['symbols'].split(',')]
+        return {'quoteResponse': {'result': [
+            self.yahoo.quote(s) for s in symbols if s not in self.yahoo.invalid_tickers
+        ]}}
+
+
+class FakeChartSession:
+    """봇의 차트 API 세션(chart_session) 대체물입니다."""
+
+    def __init__(self, yahoo):
+        self.yahoo = yahoo
+
+    def get(self, url, **kwargs):
+        self.yahoo._request('chart')
+        symbol = url.rsplit('/', 1)[-1].upper()
+        response = requests.Response()
+        if symbol in self.yahoo.invalid_tickers:
+            # Yahoo는 없는 티커에 404를 반환
+            response.status_code = 404
+            response._content = b'{"chart":{"result":null,"error":{"code":"Not Found"}}}'
+            return response
+        quote = self.yahoo.quote(symbol)
+        response.status_code = 200
+        response._content = json.dumps({'chart': {'result': [{'meta': {
+            'regularMarketPrice': quote['regularMarketPrice'],
+            'chartPreviousClose': quote['regularMarketPreviousClose'],
+            'regularMarketDayHigh': quote['regularMarketDayHigh'],
+            'regularMarketDayLow': quote['regularMarketDayLow'],
+            'currency': quote['currency'],
+            'longName': quote['longName'],
+        }}], 'error': None}}).encode()
+        return response
+
+
+class FakeTelegramBot:
+    """send_message만 지원하는 텔레그램 봇 대체물입니다."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.sent = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+
+
+class FakeChatLogStorage(ChatLogStorage):
+    """DB 대신 지연만 주고 건수를 세는 채팅 로그 저장소입니다."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.rows = 0
+        self.batches = 0
+
+    def init(self):
+        pass
+
+    def write(self, rows):
+        time.sleep(self.latency)
+        self.rows += len(rows)
+        self.batches += 1
+
+    def maintain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def make_update(update_id, chat_id, text):
+    """텍스트 메시지 하나를 담은 텔레그램 Update를 만듭니다."""
+    user = User(id=abs(chat_id) % 1000000, first_name='Load', is_bot=False, username=f'user{update_id % 100}')
+    chat = Chat(id=chat_id, type=Chat.SUPERGROUP if chat_id < 0 else Chat.PRIVATE)
+    message = Message(message_id=update_id, date=datetime.now(), chat=chat, from_user=user, text=text)
+    return Update(update_id=update_id, message=message)
+
+
+class Workload:
+    """티커 인기도가 지프 분포를 따르는 메시지 생성기입니다."""
+
+    def __init__(self, args):
+        self.random = random.Random(args.seed)
+        self.tickers = [f'T{i:04d}' for i in range(args.tickers)]
+        weights = [1 / (rank + 1) ** args.zipf for rank in range(args.tickers)]
+        total = sum(weights)
+        self.cumulative = []
+        acc = 0
+        for weight in weights:
+            acc += weight / total
+            self.cumulative.append(acc)
+        self.args = args
+
+    def ticker(self):
+        x = self.random.random()
+        lo, hi = 0, len(self.cumulative) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.cumulative[mid] < x:
+                lo = mid + 1
+            else:
+                hi = mid
+        return self.tickers[lo]
+
+    def message(self):
+        """(채팅 ID, 텍스트)를 반환합니다."""
+        r = self.random.random()
+        if r < self.args.unauthorized_ratio:
+            return -self.random.randint(1, self.args.unauthorized_chats), '/p $AAPL'
+        r -= self.args.unauthorized_ratio
+        if r < self.args.invalid_ratio:
+            return AUTHORIZED_CHAT_ID, f'/p $BAD{self.random.randint(0, 99)}'
+        r -= self.args.invalid_ratio
+        if r < self.args.multi_ratio:
+            count = self.random.randint(2, min(5, bot.MAX_TICKERS_PER_MESSAGE))
+            return AUTHORIZED_CHAT_ID, '/p ' + ' '.join(f'${self.ticker()}' for _ in range(count))
+        r -= self.args.multi_ratio
+        if r < self.args.chatter_ratio:
+            return AUTHORIZED_CHAT_ID, '오늘 장 어때요?'
+        return AUTHORIZED_CHAT_ID, f'/p ${self.ticker()}'
+
+
+def deep_sizeof(obj, seen=None):
+    """객체와 안에 든 컨테이너/값의 대략적인 메모리 크기(바이트)를 반환합니다."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+def cache_footprint():
+    return {
+        'entries': len(bot.stock_cache),
+        'bytes': deep_sizeof(bot.stock_cache._entries) + deep_sizeof(bot.company_names._entries),
+    }
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def run(args, yahoo, telegram_bot):
+    """메시지를 포아송 도착으로 넣고 처리 지연 시간 목록과 총 소요 시간을 반환합니다."""
+    workload = Workload(args)
+    context = SimpleNamespace(bot=telegram_bot)
+    # PTB 기본값처럼 한 번에 하나씩 처리하려면 --concurrency 1
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    arrival = random.Random(args.seed + 1)
+
+    async def one(update):
+        arrived = time.perf_counter()
+        async with semaphore:
+            await bot.handle_message(update, context)
+        latencies.append(time.perf_counter() - arrived)
+
+    start = time.perf_counter()
+    tasks = []
+    for i in range(args.messages):
+        chat_id, text = workload.message()
+        tasks.append(asyncio.create_task(one(make_update(i + 1, chat_id, text))))
+        await asyncio.sleep(arrival.expovariate(args.rate))
+    await asyncio.gather(*tasks)
+    return latencies, time.perf_counter() - start
+
+
+def stage_summary():
+    """단계별 처리 횟수와 평균 소요 시간(ms)을 반환합니다."""
+    summary = {}
+    for key, (_, total, count) in STAGE_DURATION._series.items():
+        stage = dict(key)['stage']
+        summary[stage] = {'count': count, 'mean_ms': round(total / count * 1000, 3) if count else 0}
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=2000, help='보낼 메시지 수')
+    parser.add_argument('--rate', type=float, default=50, help='초당 평균 메시지 수 (포아송 도착)')
+    parser.add_argument('--concurrency', type=int, default=64, help='동시에 처리할 최대 메시지 수 (PTB 기본값은 1)')
+    parser.add_argument('--tickers', type=int, default=300, help='티커 종류 수')
+    parser.add_argument('--zipf', type=float, default=1.1, help='티커 인기도 지프 지수')
+    parser.add_argument('--multi-ratio', type=float, default=0.1, help='여러 티커 조회 비율')
+    parser.add_argument('--invalid-ratio', type=float, default=0.02, help='없는 티커 조회 비율')
+    parser.add_argument('--unauthorized-ratio', type=float, default=0.05, help='미승인 채팅 비율')
+    parser.add_argument('--unauthorized-chats', type=int, default=20, help='미승인 메시지를 보내는 채팅 수 (반복 스팸 재현)')
+    parser.add_argument('--chatter-ratio', type=float, default=0.1, help='명령어가 아닌 메시지 비율')
+    parser.add_argument('--yahoo-latency', type=float, default=0.15, help='Yahoo 응답 평균 지연 (초)')
+    parser.add_argument('--yahoo-jitter', type=float, default=0.05, help='Yahoo 응답 지연 표준편차 (초)')
+    parser.add_argument('--rate-limit-ratio', type=float, default=0.01, help='Yahoo 429 응답 비율')
+    parser.add_argument('--telegram-latency', type=float, default=0.05, help='send_message 지연 (초)')
+    parser.add_argument('--yf-rate', type=float, help='Yahoo 요청 제한기 초당 요청 수 (기본: YF_RATE 설정)')
+    parser.add_argument('--yf-burst', type=int, help='Yahoo 요청 제한기 버스트 크기 (기본: YF_BURST 설정)')
+    parser.add_argument('--db-latency', type=float, default=0.005, help='채팅 로그 배치 저장 지연 (초)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='결과를 JSON으로 출력')
+    args = parser.parse_args()
+
+    yahoo = FakeYahoo(
+        args.yahoo_latency, args.yahoo_jitter, args.rate_limit_ratio,
+        [f'BAD{i}' for i in range(100)], args.seed,
+    )
+    telegram_bot = FakeTelegramBot(args.telegram_latency)
+    storage = FakeChatLogStorage(args.db_latency)
+
+    bot.yf = yahoo
+    bot.YfData = yahoo.YfData
+    bot.chart_session = FakeChartSession(yahoo)
+    bot.chat_log_storage = storage
+    bot.chat_allowlist = ChatAllowlist([AUTHORIZED_CHAT_ID])
+    # backoff 로거는 자체 레벨을 쓰므로 봇 로그 레벨에 맞춤
+    logging.getLogger('backoff').setLevel(logging.getLogger().level)
+    bot.chat_log_writer.start()
+    # 지표 게이지가 기존 제한기를 참조하므로 객체는 그대로 두고 설정만 바꿈
+    if args.yf_rate is not None:
+        bot.yahoo_limiter.rate = args.yf_rate
+    if args.yf_burst is not None:
+        bot.yahoo_limiter.capacity = bot.yahoo_limiter.tokens = args.yf_burst
+
+    cache_before = cache_footprint()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    latencies, elapsed = asyncio.run(run(args, yahoo, telegram_bot))
+    bot.chat_log_writer.close()
+    cache_after = cache_footprint()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    cache_stats = bot.stock_cache.stats()
+    result = {
+        'messages': args.messages,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_msgs_per_s': round(args.messages / elapsed, 1),
+        'latency_ms': {
+            'mean': round(statistics.mean(latencies) * 1000, 1),
+            'p50': round(percentile(latencies, 50) * 1000, 1),
+            'p95': round(percentile(latencies, 95) * 1000, 1),
+            'p99': round(percentile(latencies, 99) * 1000, 1),
+            'max': round(max(latencies) * 1000, 1),
+        },
+        'upstream_calls': dict(yahoo.calls),
+        'telegram_sent': telegram_bot.sent,
+        'chat_log_rows': storage.rows,
+        'chat_log_batches': storage.batches,
+        'unauthorized_suppressed': bot.unauthorized_limiter.suppressed,
+        'cache': {
+            'entries_before': cache_before['entries'],
+            'entries_after': cache_after['entries'],
+            'bytes_growth': cache_after['bytes'] - cache_before['bytes'],
+            **{key: cache_stats[key] for key in ('hits', 'stale_hits', 'negative_hits', 'misses', 'evictions')},
+        },
+        'max_rss_growth_kb': rss_after - rss_before,
+        'stages': stage_summary(),
+    }
+
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        return
+
+    latency = result['latency_ms']
+    cache = result['cache']
+    print(f"메시지 {args.messages}건, 목표 {args.rate}/s, 동시 처리 {args.concurrency}, "
+          f"Yahoo 제한 {bot.yahoo_limiter.rate}/s (버스트 {bot.yahoo_limiter.capacity})")
+    print(f"처리량: {result['throughput_msgs_per_s']}/s ({result['elapsed_s']}초)")
+    print(f"지연 시간 (ms): 평균 {latency['mean']}  p50 {latency['p50']}  p95 {latency['p95']}  "
+          f"p99 {latency['p99']}  최대 {latency['max']}")
+    print(f"Yahoo 호출: {result['upstream_calls']}")
+    print(f"텔레그램 전송: {result['telegram_sent']}건, 채팅 로그: {result['chat_log_rows']}건 "
+          f"({result['chat_log_batches']}회 저장), 응답 없이 버린 미승인 메시지: {result['unauthorized_suppressed']}건")
+    print(f"캐시: 항목 {cache['entries_before']} -> {cache['entries_after']}, 메모리 +{cache['bytes_growth'] / 1024:.1f}KB, "
+          f"적중 {cache['hits']} / 이전 값 {cache['stale_hits']} / 실패 캐시 {cache['negative_hits']} / "
+          f"미스 {cache['misses']} / 제거 {cache['evictions']}")
+    print(f"최대 RSS 증가: {result['max_rss_growth_kb']}KB")
+    print("단계별 평균 (ms):")
+    for stage, item in sorted(result['stages'].items()):
+        print(f"  {stage:<16}{item['mean_ms']:>10}  ({item['count']}회)")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,101 +3,122 @@ import logging
 import re
 from dotenv import load_dotenv
 import yfinance as yf
+from yfinance.data import YfData
+from yfinance.const import _QUERY1_URL_
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-import traceback
 import time
-from datetime import datetime, timedelta
+import json
+import tempfile
+from datetime import datetime, timedelta, time as dtime
+from zoneinfo import ZoneInfo
+from collections import OrderedDict
 from requests.exceptions import RequestException
-import random
 import asyncio
+import backoff
 import requests
 import threading
-import psycopg2
-from psycopg2 import pool
-
-# 로깅 설정
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+from concurrent.futures import ThreadPoolExecutor
+from chat_log import ChatLogWriter
+from chat_log_storage import create_chat_log_storage, FileChatLogStorage
+from alerts import AlertIndex, create_alert_store, parse_alert_command, describe_alert
+from routing import CommandRouter, ChatAllowlist, UnauthorizedLimiter, create_allowlist_store
+from price_history import (
+    PriceHistoryStore, parse_history_command, period_start, frame_to_columns, last_split_day,
+    compute_stats, render_chart,
+)
+from cluster import CacheServer, SharedCacheClient, ChatOrderedRunner, WorkerPool, shard_for, ignore_interrupt
+from log_config import setup_logging, parse_sample_rates, log_event, stop_listener
+from metrics import (
+    registry, Gauge, SamplingProfiler, UPSTREAM_ERRORS, STAGE_DURATION,
+    stage_timer, monitor_loop_lag, start_metrics_server,
 )
+
+# 환경 변수 로드 (저장소 설정 등에서 바로 사용)
+load_dotenv()
+
+# 로깅 설정 (출력은 별도 스레드에서 처리)
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')  # text 또는 json (이벤트당 한 줄)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_SAMPLE = os.environ.get('LOG_SAMPLE', '')  # 예: "message_received=10,fetch_coalesced=100" (N건 중 1건만 기록)
+log_listener = setup_logging(LOG_FORMAT, LOG_LEVEL, parse_sample_rates(LOG_SAMPLE))
 logger = logging.getLogger(__name__)
 
-# PostgreSQL 연결 풀 설정
-def get_db_pool():
-    try:
-        return pool.SimpleConnectionPool(
-            minconn=1,
-            maxconn=10,
-            dsn=os.getenv('DATABASE_URL')
-        )
-    except Exception as e:
-        logger.error(f"PostgreSQL 연결 풀 생성 실패: {str(e)}")
-        return None
+# 채팅 로그 저장소 설정
+CHAT_LOG_BACKEND = os.environ.get('CHAT_LOG_BACKEND')  # postgres, sqlite, file (기본: DATABASE_URL이 있으면 postgres, 없으면 sqlite)
+CHAT_LOG_RETENTION_DAYS = int(os.environ.get('CHAT_LOG_RETENTION_DAYS', '90'))  # 로그 보관 기간 (일, 0이면 삭제 안 함)
+CHAT_LOG_MAINTENANCE_INTERVAL = int(os.environ.get('CHAT_LOG_MAINTENANCE_INTERVAL', '3600'))  # 파티션/보관 기간 정리 주기 (초)
 
-# 데이터베이스 연결 풀 초기화
-db_pool = get_db_pool()
+# 채팅 로그 저장소 초기화
+chat_log_storage = create_chat_log_storage(CHAT_LOG_BACKEND, CHAT_LOG_RETENTION_DAYS)
 
 def init_db():
     """데이터베이스 테이블 초기화"""
     try:
-        conn = db_pool.getconn()
-        with conn.cursor() as cur:
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS chat_logs (
-                    id SERIAL PRIMARY KEY,
-                    timestamp TIMESTAMP WITH TIME ZONE,
-                    chat_id BIGINT,
-                    username TEXT,
-                    message TEXT
-                )
-            """)
-            conn.commit()
+        chat_log_storage.init()
     except Exception as e:
         logger.error(f"데이터베이스 초기화 실패: {str(e)}")
-    finally:
-        if conn:
-            db_pool.putconn(conn)
+
+def save_chat_logs(rows):
+    """채팅 로그 여러 건을 저장소에 한 번에 저장합니다. 실패 시 예외를 발생시킵니다."""
+    with stage_timer('db_insert'):
+        chat_log_storage.write(rows)
+
+# 가격 알림 설정
+ALERT_POLL_INTERVAL = int(os.environ.get('ALERT_POLL_INTERVAL', '60'))  # 알림 시세 확인 주기 (초)
+MAX_ALERTS_PER_CHAT = int(os.environ.get('MAX_ALERTS_PER_CHAT', '20'))  # 채팅방당 최대 활성 알림 수
+
+# 가격 알림 저장소와 발동 인덱스 (채팅 로그와 같은 DB에 저장)
+alert_store = create_alert_store(chat_log_storage)
+alert_index = AlertIndex()
+
+def init_alerts(chat_filter=None):
+    """가격 알림 테이블을 준비하고 활성 알림을 불러옵니다. chat_filter가 있으면 해당 채팅의 알림만 불러옵니다."""
+    try:
+        alert_store.init()
+        for alert in alert_store.load_active():
+            if chat_filter is None or chat_filter(alert['chat_id']):
+                alert_index.add(alert)
+        logger.info(f"활성 가격 알림 {len(alert_index)}개 로드")
+    except Exception as e:
+        logger.error(f"가격 알림 초기화 실패: {str(e)}")
+
+def maintain_chat_logs():
+    """주기적으로 채팅 로그 파티션을 준비하고 보관 기간이 지난 로그를 정리합니다."""
+    while True:
+        time.sleep(CHAT_LOG_MAINTENANCE_INTERVAL)
+        try:
+            chat_log_storage.maintain()
+        except Exception as e:
+            logger.error(f"채팅 로그 정리 실패: {str(e)}")
 
 def save_chat_log(chat_data):
-    """채팅 로그를 PostgreSQL에 저장합니다."""
+    """채팅 로그를 저장소에 저장합니다."""
     try:
-#         logger.info(f"""
-# === 채팅 로그 데이터 ===
-# 시간: {chat_data['timestamp']}
-# 채팅 ID: {chat_data['chat_id']}
-# 사용자: {chat_data['user']}
-# 메시지: {chat_data['message']}
-# ======================""")
-        
-        conn = db_pool.getconn()
-        if conn is None:
-            logger.error("데이터베이스 연결 실패")
-            return
-            
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO chat_logs (timestamp, chat_id, username, message)
-                VALUES (%s, %s, %s, %s)
-            """, (
-                chat_data['timestamp'],
-                chat_data['chat_id'],
-                chat_data['user'],
-                chat_data['message']
-            ))
-            conn.commit()
+        save_chat_logs([chat_data])
     except Exception as e:
-        logger.error(f"""
-=== 채팅 로그 저장 실패 ===
-에러: {str(e)}
-시간: {chat_data['timestamp']}
-채팅 ID: {chat_data['chat_id']}
-사용자: {chat_data['user']}
-메시지: {chat_data['message']}
-========================""")
-    finally:
-        if conn:
-            db_pool.putconn(conn)
+        log_event(
+            logger, logging.ERROR, 'chat_log_save_failed',
+            "채팅 로그 저장 실패: %s (채팅 ID %s, 사용자 %s)", str(e), chat_data['chat_id'], chat_data['user'],
+            chat_id=chat_data['chat_id'], user=chat_data['user'], message=chat_data['message'], error=str(e),
+        )
+
+# 채팅 로그 백그라운드 기록 설정
+CHAT_LOG_QUEUE_SIZE = int(os.environ.get('CHAT_LOG_QUEUE_SIZE', '10000'))  # 기록 대기 큐 최대 크기
+CHAT_LOG_BATCH_SIZE = int(os.environ.get('CHAT_LOG_BATCH_SIZE', '200'))  # 한 번에 기록할 최대 로그 수
+CHAT_LOG_FLUSH_INTERVAL = float(os.environ.get('CHAT_LOG_FLUSH_INTERVAL', '2'))  # 최대 기록 주기 (초)
+CHAT_LOG_OVERFLOW = os.environ.get('CHAT_LOG_OVERFLOW', 'drop')  # 큐가 가득 찼을 때: drop, block, spill
+CHAT_LOG_SPILL_PATH = os.environ.get('CHAT_LOG_SPILL_PATH', 'chat_logs.spill.jsonl')  # spill 정책의 임시 파일
+
+# 채팅 로그 기록기 (main에서 시작)
+chat_log_writer = ChatLogWriter(
+    save_chat_logs,
+    max_queue=CHAT_LOG_QUEUE_SIZE,
+    batch_size=CHAT_LOG_BATCH_SIZE,
+    flush_interval=CHAT_LOG_FLUSH_INTERVAL,
+    overflow=CHAT_LOG_OVERFLOW,
+    spill_path=CHAT_LOG_SPILL_PATH,
+)
 
 async def log_interaction(update: Update):
     try:
@@ -116,49 +137,403 @@ async def log_interaction(update: Update):
             "message": message
         }
         
-        logger.info(f"""
-=== 새로운 메시지 수신 ===
-시간: {timestamp}
-채팅 ID: {chat_id}
-사용자: {user}
-메시지: {message}
-======================""")
+        log_event(
+            logger, logging.INFO, 'message_received',
+            "메시지 수신 (채팅 ID %s, 사용자 %s): %s", chat_id, user, message,
+            chat_id=chat_id, user=user, message=message,
+        )
         
-        save_chat_log(chat_data)
+        # DB 기록은 백그라운드 기록기에 맡기고 바로 반환
+        await chat_log_writer.submit(chat_data)
         
     except Exception as e:
-        logger.error(f"로그 기록 실패: {str(e)}")
+        logger.error("로그 기록 실패: %s", e)
 
-# 주기적으로 서버에 ping을 보내는 함수
-def ping_server():
-    while True:
-        try:
-            requests.get("https://telebot-finance-info.onrender.com")
-        except Exception as e:
-            logger.error(f"서버 핑 전송 실패: {str(e)}")
-        time.sleep(300)
-
-# 환경 변수 로드
-load_dotenv()
+# 환경 변수
 BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 CHANNEL_ID = os.getenv('TELEGRAM_CHANNEL_ID')
 PORT = int(os.environ.get('PORT', '8080'))
 
+# 지표 수집 설정
+METRICS_PORT = int(os.environ.get('METRICS_PORT', str(PORT + 1)))  # /metrics 포트 (0이면 사용 안 함)
+PROFILER_INTERVAL_MS = int(os.environ.get('PROFILER_INTERVAL_MS', '0'))  # 샘플링 프로파일러 간격 (0이면 사용 안 함)
+SLOW_HANDLER_SECONDS = float(os.environ.get('SLOW_HANDLER_SECONDS', '5'))  # 느린 메시지 처리 경고 기준 (초)
+
+# 여러 워커 프로세스 설정
+WORKERS = int(os.environ.get('WORKERS', '1'))  # 업데이트를 채팅 ID별로 나눠 처리할 워커 프로세스 수 (1이면 단일 프로세스)
+SHARED_CACHE_PATH = os.environ.get(
+    'SHARED_CACHE_PATH', os.path.join(tempfile.gettempdir(), f'telebot-cache-{os.getpid()}.sock')
+)  # 워커가 함께 쓰는 시세 캐시 소켓 경로
+WORKER_HEALTH_INTERVAL = int(os.environ.get('WORKER_HEALTH_INTERVAL', '10'))  # 워커 상태 보고/확인 주기 (초)
+KEEPALIVE_URL = os.environ.get('KEEPALIVE_URL', os.environ.get('RENDER_EXTERNAL_URL'))  # 슬립 방지용 요청 주소 (없으면 사용 안 함)
+KEEPALIVE_INTERVAL = int(os.environ.get('KEEPALIVE_INTERVAL', '300'))  # 슬립 방지 요청 주기 (초)
+
 # 허용된 채팅방 ID 리스트
 # 7195671182 : 봇
 # -4733288399 : 테스트 채널
 # -1002154254868 : 광진오빠 채널
-AUTHORIZED_CHAT_IDS = [7195671182, -4733288399, -1002154254868] 
+AUTHORIZED_CHAT_IDS = frozenset({7195671182, -4733288399, -1002154254868})
+
+# 허용 목록/미승인 채팅 설정
+ALLOWLIST_RELOAD_INTERVAL = int(os.environ.get('ALLOWLIST_RELOAD_INTERVAL', '0'))  # DB 허용 목록(authorized_chats)을 다시 읽는 주기 (초, 0이면 고정 목록만 사용)
+UNAUTHORIZED_COOLDOWN = int(os.environ.get('UNAUTHORIZED_COOLDOWN', '3600'))  # 미승인 채팅에 다시 응답하기까지의 시간 (초)
+
+# 고정 목록 + DB 허용 목록 (같은 DB의 authorized_chats 테이블)
+chat_allowlist = ChatAllowlist(
+    AUTHORIZED_CHAT_IDS,
+    create_allowlist_store(chat_log_storage) if ALLOWLIST_RELOAD_INTERVAL > 0 else None,
+)
+# 미승인 채팅은 첫 메시지에만 응답/기록하고 이후 반복 메시지는 거름
+unauthorized_limiter = UnauthorizedLimiter(UNAUTHORIZED_COOLDOWN)
+
+# 처리할 업데이트: 텍스트가 있는 새 메시지와 채널 게시물만 (스티커, 입장/퇴장, 수정 등은 필터 단계에서 버림)
+ROUTED_UPDATES = (filters.UpdateType.MESSAGE | filters.UpdateType.CHANNEL_POST) & filters.TEXT
+# 텔레그램에서 받을 업데이트 종류 (나머지는 아예 보내지 않도록 요청)
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CHANNEL_POST]
+
+def init_allowlist():
+    """DB 허용 목록 테이블을 준비하고 불러옵니다."""
+    if chat_allowlist.store is None:
+        return
+    try:
+        chat_allowlist.store.init()
+        chat_allowlist.reload()
+        logger.info(f"허용 채팅 {len(chat_allowlist)}개 로드")
+    except Exception as e:
+        logger.error(f"허용 채팅 목록 초기화 실패: {str(e)}")
+
+async def reload_allowlist():
+    """DB 허용 목록을 주기적으로 다시 읽어 재시작 없이 반영합니다."""
+    while True:
+        await asyncio.sleep(ALLOWLIST_RELOAD_INTERVAL)
+        await asyncio.to_thread(chat_allowlist.reload)
+
+
+
+# Yahoo Finance API 요청 제한 설정 (토큰 버킷)
+YF_RATE = float(os.environ.get('YF_RATE', '1'))  # 초당 허용 요청 수
+YF_BURST = int(os.environ.get('YF_BURST', '5'))  # 한 번에 몰아서 허용할 최대 요청 수
+YF_MAX_TRIES = int(os.environ.get('YF_MAX_TRIES', '4'))  # 429 응답 시 최대 시도 횟수
+QUOTE_BATCH_SIZE = int(os.environ.get('QUOTE_BATCH_SIZE', '50'))  # 묶음 조회 1회당 최대 티커 수
+MAX_TICKERS_PER_MESSAGE = int(os.environ.get('MAX_TICKERS_PER_MESSAGE', '20'))  # 메시지 1개당 최대 티커 수
+
+class TokenBucket:
+    """토큰 버킷 방식의 전역 요청 속도 제한기입니다."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = None
+
+    def _refill(self, now):
+        """경과 시간만큼 토큰을 채웁니다."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """토큰이 있으면 바로 반환하고, 없을 때만 필요한 만큼 기다립니다."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # 락을 잡은 채로 기다려서 대기 순서(FIFO)를 보장
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                await asyncio.sleep(wait)
+
+    def penalize(self, seconds):
+        """429 응답을 받으면 모든 요청을 일정 시간 멈춥니다."""
+        self.tokens = 0
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def available(self):
+        """지금 바로 쓸 수 있는 토큰 수를 반환합니다.
+
+        지표 수집 스레드에서도 호출되므로 버킷 상태를 바꾸지 않고 계산만 합니다.
+        (여기서 채워 넣으면 이벤트 루프의 acquire가 뺀 토큰을 덮어쓸 수 있음)
+        """
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return 0.0
+        tokens, updated = self.tokens, self.updated
+        return min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+
+# Yahoo Finance 전역 요청 제한기
+yahoo_limiter = TokenBucket(YF_RATE, YF_BURST)
+
+def is_rate_limit_error(e):
+    """Yahoo의 요청 제한(429) 에러인지 확인합니다."""
+    if type(e).__name__ == 'YFRateLimitError':
+        return True
+    response = getattr(e, 'response', None)
+    if getattr(response, 'status_code', None) == 429:
+        return True
+    return 'Too Many Requests' in str(e)
+
+def record_upstream_error(e):
+    """Yahoo 요청 실패를 종류별로 집계합니다."""
+    if is_rate_limit_error(e):
+        kind = 'rate_limit'
+    elif isinstance(e, asyncio.TimeoutError):
+        kind = 'timeout'
+    else:
+        kind = 'error'
+    UPSTREAM_ERRORS.inc(kind=kind)
+
+def on_rate_limited(details):
+    """429 응답 시 재시도 대기 시간만큼 전역 제한기도 멈춥니다."""
+    yahoo_limiter.penalize(details['wait'])
+    logger.warning("Yahoo 요청 제한 감지, %.1f초 후 재시도 (%s회째)", details['wait'], details['tries'])
+
+# yfinance 조회용 스레드 풀 설정 (이벤트 루프 블로킹 방지)
+FETCH_WORKERS = int(os.environ.get('FETCH_WORKERS', '4'))  # 동시 조회 스레드 수
+FETCH_TIMEOUT = float(os.environ.get('FETCH_TIMEOUT', '15'))  # 조회 1건당 제한 시간 (초)
+fetch_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix='yf-fetch')
+
+# 스레드 풀에 제출되었지만 아직 끝나지 않은 작업 수
+_fetch_queue_depth = 0
+_fetch_queue_lock = threading.Lock()
+
+def get_fetch_queue_depth():
+    """조회 스레드 풀의 대기 및 실행 중인 작업 수를 반환합니다."""
+    return _fetch_queue_depth
+
+def _track_fetch(func, *args):
+    """작업 종료 시 대기열 깊이를 줄이도록 감싸서 실행합니다."""
+    global _fetch_queue_depth
+    try:
+        return func(*args)
+    finally:
+        with _fetch_queue_lock:
+            _fetch_queue_depth -= 1
+
+async def run_fetch(func, *args, timeout=None):
+    """블로킹 조회 함수를 스레드 풀에서 실행하고 제한 시간을 적용합니다."""
+    global _fetch_queue_depth
+    with _fetch_queue_lock:
+        _fetch_queue_depth += 1
+    depth = _fetch_queue_depth
+    if depth > FETCH_WORKERS:
+        logger.warning("조회 대기열 적체: %s건 (워커 %s개)", depth, FETCH_WORKERS)
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(fetch_executor, _track_fetch, func, *args)
+    # 제한 시간이 지나도 스레드 작업 자체는 끝날 때까지 대기열 깊이에 남습니다
+    return await asyncio.wait_for(future, timeout or FETCH_TIMEOUT)
+
+# 캐시 설정
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '500'))  # 최대 캐시 티커 수
+CACHE_TTL_OPEN = int(os.environ.get('CACHE_TTL_OPEN', '300'))  # 장중 캐시 유지 시간 (초)
+CACHE_TTL_CLOSED = int(os.environ.get('CACHE_TTL_CLOSED', '21600'))  # 장 마감 후 최대 캐시 유지 시간 (초)
+CACHE_STALE_SECONDS = int(os.environ.get('CACHE_STALE_SECONDS', '1800'))  # 만료 후 이전 값으로 응답할 수 있는 시간 (초)
+CACHE_NEGATIVE_TTL = int(os.environ.get('CACHE_NEGATIVE_TTL', '600'))  # 잘못된 티커 결과 유지 시간 (초)
+COMPANY_NAME_TTL = int(os.environ.get('COMPANY_NAME_TTL', '604800'))  # 회사명 캐시 유지 시간 (초)
+
+# 거래소별 정규장 시간 (티커 접미사 기준, 기본은 미국장)
+MARKET_SESSIONS = {
+    '.KS': ('Asia/Seoul', dtime(9, 0), dtime(15, 30)),
+    '.KQ': ('Asia/Seoul', dtime(9, 0), dtime(15, 30)),
+    '.T': ('Asia/Tokyo', dtime(9, 0), dtime(15, 0)),
+    '.HK': ('Asia/Hong_Kong', dtime(9, 30), dtime(16, 0)),
+    '.L': ('Europe/London', dtime(8, 0), dtime(16, 30)),
+}
+DEFAULT_MARKET_SESSION = ('America/New_York', dtime(9, 30), dtime(16, 0))
+# 24시간 거래되는 종목 (암호화폐, 환율, 선물)
+ALWAYS_OPEN_SUFFIXES = ('-USD', '-KRW', '=X', '=F')
+
+class StockDataError(Exception):
+    """티커가 잘못되었거나 가격 정보가 없는 경우의 에러입니다."""
+
+def get_market_session(ticker):
+    """티커의 거래소 정규장 시간을 반환합니다. 24시간 거래 종목은 None을 반환합니다."""
+    if ticker.endswith(ALWAYS_OPEN_SUFFIXES):
+        return None
+    for suffix, session in MARKET_SESSIONS.items():
+        if ticker.endswith(suffix):
+            return session
+    return DEFAULT_MARKET_SESSION
+
+def is_market_open(ticker, now=None):
+    """티커의 거래소가 현재 정규장 시간인지 확인합니다. (공휴일은 고려하지 않음)"""
+    session = get_market_session(ticker)
+    if session is None:
+        return True
+    tz, open_time, close_time = session
+    now = (now or datetime.now(ZoneInfo(tz))).astimezone(ZoneInfo(tz))
+    return now.weekday() < 5 and open_time <= now.time() < close_time
+
+def get_cache_ttl(ticker, now=None):
+    """장중에는 짧게, 장 마감 후에는 다음 개장까지 길게 캐시 유지 시간을 정합니다."""
+    if is_market_open(ticker, now):
+        return CACHE_TTL_OPEN
+    tz, open_time, _ = get_market_session(ticker)
+    now = (now or datetime.now(ZoneInfo(tz))).astimezone(ZoneInfo(tz))
+    next_open = now.replace(hour=open_time.hour, minute=open_time.minute, second=0, microsecond=0)
+    if next_open <= now:
+        next_open += timedelta(days=1)
+    while next_open.weekday() >= 5:
+        next_open += timedelta(days=1)
+    until_open = (next_open - now).total_seconds()
+    return max(CACHE_TTL_OPEN, min(until_open, CACHE_TTL_CLOSED))
+
+class QuoteCache:
+    """최대 개수 제한(LRU), 만료 후 이전 값 응답, 실패 결과 캐싱을 지원하는 시세 캐시입니다."""
+
+    FRESH = 'fresh'
+    STALE = 'stale'
+    MISS = 'miss'
+
+    def __init__(self, max_entries, stale_seconds, negative_ttl):
+        self.max_entries = max_entries
+        self.stale_seconds = stale_seconds
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.stale_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def lookup(self, key):
+        """캐시 항목과 상태(fresh/stale/miss)를 반환합니다."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None, self.MISS
+        age = time.monotonic() - entry['expires']
+        if age < 0:
+            self._entries.move_to_end(key)
+            if entry['error']:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return entry, self.FRESH
+        # 실패 결과는 만료 즉시 다시 조회
+        if not entry['error'] and age < self.stale_seconds:
+            self._entries.move_to_end(key)
+            self.stale_hits += 1
+            return entry, self.STALE
+        del self._entries[key]
+        self.misses += 1
+        return None, self.MISS
+
+    def set(self, key, data, ttl):
+        """조회 결과를 저장합니다."""
+        self._store(key, {'data': data, 'error': None}, ttl)
+
+    def set_error(self, key, error, ttl=None):
+        """잘못된 티커 등 실패 결과를 저장합니다."""
+        self._store(key, {'data': None, 'error': error}, ttl or self.negative_ttl)
+
+    def _store(self, key, entry, ttl):
+        entry['timestamp'] = datetime.now()
+        entry['expires'] = time.monotonic() + ttl
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
 
+    def expires_in(self, key):
+        """항목이 만료되기까지 남은 시간(초)을 반환합니다. 없으면 None을 반환합니다. (통계에 포함 안 됨)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return entry['expires'] - time.monotonic()
 
+    def clear(self):
+        self._entries.clear()
 
-# Yahoo Finance API 요청 제한 처리를 위한 지연 시간 (초)
-MIN_DELAY = 2  # 최소 2초 대기
-MAX_DELAY = 5  # 최대 5초 대기
+    def stats(self):
+        """캐시 통계를 반환합니다."""
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+class TickerPopularity:
+    """시간이 지날수록 감쇠하는 티커별 요청 빈도를 기록합니다."""
+
+    def __init__(self, half_life, max_tracked):
+        self.half_life = half_life
+        self.max_tracked = max_tracked
+        self._scores = {}
+
+    def _decayed(self, score, updated, now):
+        return score * 0.5 ** ((now - updated) / self.half_life)
+
+    def record(self, ticker):
+        """티커 요청을 1회 기록합니다."""
+        now = time.monotonic()
+        score, updated = self._scores.get(ticker, (0.0, now))
+        self._scores[ticker] = (self._decayed(score, updated, now) + 1, now)
+        if len(self._scores) > self.max_tracked:
+            # 점수가 낮은 절반을 정리해서 추적 개수를 제한
+            keep = self.top(self.max_tracked // 2)
+            self._scores = {ticker: self._scores[ticker] for ticker in keep}
+
+    def top(self, n):
+        """현재 점수가 높은 순서로 티커 n개를 반환합니다."""
+        now = time.monotonic()
+        ranked = sorted(
+            self._scores,
+            key=lambda t: self._decayed(*self._scores[t], now),
+            reverse=True
+        )
+        return ranked[:n]
+
+# 인기 티커 미리 갱신 설정
+PREFETCH_TOP_N = int(os.environ.get('PREFETCH_TOP_N', '20'))  # 미리 갱신할 인기 티커 수 (0이면 사용 안 함)
+PREFETCH_INTERVAL = int(os.environ.get('PREFETCH_INTERVAL', '30'))  # 갱신 대상 확인 주기 (초)
+PREFETCH_LEAD = int(os.environ.get('PREFETCH_LEAD', '60'))  # 캐시 만료 몇 초 전부터 갱신할지
+PREFETCH_MIN_TOKENS = float(os.environ.get('PREFETCH_MIN_TOKENS', '2'))  # 사용자 요청용으로 남겨둘 최소 토큰 수
+HOT_TICKER_HALF_LIFE = int(os.environ.get('HOT_TICKER_HALF_LIFE', '3600'))  # 요청 빈도 감쇠 반감기 (초)
+
+# 티커별 요청 빈도
+ticker_popularity = TickerPopularity(HOT_TICKER_HALF_LIFE, max_tracked=1000)
 
 # 캐시 저장소
-stock_cache = {}
-CACHE_DURATION = timedelta(minutes=5)  # 5분간 캐시 유지
+stock_cache = QuoteCache(CACHE_MAX_ENTRIES, CACHE_STALE_SECONDS, CACHE_NEGATIVE_TTL)
+# 회사명 캐시 (시세와 별도로 오래 유지)
+company_names = QuoteCache(CACHE_MAX_ENTRIES, 0, CACHE_NEGATIVE_TTL)
+
+# 티커별 진행 중인 조회 작업 (동시 요청 병합용)
+inflight_fetches = {}
+# 결과를 기다리는 요청이 있는 조회 작업 (실패는 기다린 요청이 처리하므로 다시 로그를 남기지 않음)
+awaited_fetches = set()
+
+# 워커 모드에서 다른 워커와 함께 쓰는 시세 캐시 (run_worker에서 설정)
+shared_cache = None
+
+# 차트/통계용 일봉 저장 설정
+HISTORY_DIR = os.environ.get('HISTORY_DIR', 'price_history')  # 티커별 일봉 저장 디렉터리
+HISTORY_REFRESH = int(os.environ.get('HISTORY_REFRESH', '3600'))  # 마지막 일봉을 다시 조회하는 주기 (초)
+CHART_DEFAULT_PERIOD = os.environ.get('CHART_DEFAULT_PERIOD', '6mo')  # /chart 기간 생략 시 기본값
+STATS_DEFAULT_PERIOD = os.environ.get('STATS_DEFAULT_PERIOD', '1y')  # /stats 기간 생략 시 기본값
+
+# 일봉 저장소 (워커 프로세스끼리도 같은 디렉터리를 공유)
+history_store = PriceHistoryStore(HISTORY_DIR, HISTORY_REFRESH)
+
+# 티커별 진행 중인 일봉 조회 작업 (동시 요청 병합용)
+inflight_history = {}
 
 def format_large_number(number):
     """큰 숫자를 읽기 쉽게 포맷팅합니다."""
@@ -179,15 +554,8 @@ def format_large_number(number):
 #     arrow = "🔺" if ratio > 0 else "🔻" if ratio < 0 else "➡️"
 #     return arrow, ratio
 
-def is_cache_valid(ticker):
-    """캐시가 유효한지 확인합니다."""
-    if ticker not in stock_cache:
-        return False
-    cache_time = stock_cache[ticker]['timestamp']
-    return datetime.now() - cache_time < CACHE_DURATION
-
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """봇 시작 시 환영 메시지를 보냅니다."""
+async def start(context, chat_id, text):
+    """/start 명령어에 환영 메시지를 보냅니다."""
     welcome_message = """
 🚀 똑똑이봇
 주식의 티커 심볼을 '/p $티커' 형식으로 입력
@@ -196,96 +564,819 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 /p $AAPL
 /p $MSFT
 /p $GOOGL
+/p $AAPL $MSFT $NVDA (여러 종목 한 번에)
+/price, /q 도 같은 명령어입니다.
+
+가격 알림:
+/alert $AAPL > 200
+/alert $TSLA -5%
+/alerts (목록), /unalert 번호 (삭제)
+
+차트와 통계 (기간: 1mo 3mo 6mo 1y 2y 5y 10y ytd max):
+/chart $AAPL 6mo
+/stats $AAPL 1y
     """ 
     try:
-        chat_id = update.effective_chat.id
         await context.bot.send_message(chat_id=chat_id, text=welcome_message)
     except Exception as e:
-        print(f"start 명령어 처리 중 에러: {str(e)}")
-        logging.error(f"Error in start command: {str(e)}")
+        logger.error("start 명령어 처리 중 에러: %s", e)
+
+# 차트 API 전용 세션 (차트 API는 쿠키/crumb 없이 응답하므로 yfinance 세션을 거치지 않음)
+chart_session = requests.Session()
+chart_session.headers.update(YfData.user_agent_headers)
+
+def fetch_stock_info(ticker, with_name=True):
+    """차트 API 한 번으로 필요한 시세 필드만 가져오고, 빠진 필드만 .info로 보충합니다. (블로킹 호출)"""
+    # yf.Ticker.history()는 시간대 캐시에 없는 티커면 시간대 조회용 차트 요청을 따로 보내고,
+    # YfData는 세션 첫 요청에 쿠키/crumb를 받으며 400 이상 응답(없는 티커의 404 포함)을 한 번 더 요청하므로 직접 호출
+    response = chart_session.get(
+        f"{_QUERY1_URL_}/v8/finance/chart/{ticker}",
+        params={'range': '1d', 'interval': '1d'},
+        timeout=FETCH_TIMEOUT,
+    )
+    if response.status_code == 404:
+        # 존재하지 않는 티커는 무거운 .info 조회 없이 바로 실패 처리
+        return {}
+    response.raise_for_status()
+    result = response.json()
+    charts = (result.get('chart') or {}).get('result') or [{}]
+    meta = charts[0].get('meta') or {}
+    if not meta.get('regularMarketPrice'):
+        return {}
+
+    # .info와 같은 키로 맞춰서 반환
+    info = {
+        'regularMarketPrice': meta.get('regularMarketPrice'),
+        'previousClose': meta.get('previousClose') or meta.get('chartPreviousClose'),
+        'dayHigh': meta.get('regularMarketDayHigh'),
+        'dayLow': meta.get('regularMarketDayLow'),
+        'currency': meta.get('currency'),
+    }
+    if with_name:
+        info['longName'] = meta.get('longName') or meta.get('shortName')
+
+    missing = [key for key, value in info.items() if value is None]
+    if missing:
+        # .info는 쿠키/crumb와 quoteSummary, quote, timeseries 요청이 따로 들어가는 느린 경로이므로 빠진 필드가 있을 때만 사용
+        full_info = yf.Ticker(ticker).info
+        for key in missing:
+            info[key] = full_info.get(key)
+    return {key: value for key, value in info.items() if value is not None}
+
+@backoff.on_exception(
+    backoff.expo,
+    Exception,
+    max_tries=YF_MAX_TRIES,
+    giveup=lambda e: not is_rate_limit_error(e),
+    on_backoff=on_rate_limited,
+)
+async def request_yahoo(stage, func, *args):
+    """요청 한도를 지키면서 Yahoo 조회 함수 func(*args)를 실행합니다. 429 응답 시 지수 백오프로 재시도합니다.
+
+    stage는 조회 시간을 기록할 단계 이름입니다. (fetch, fetch_batch, fetch_history)
+    """
+    with stage_timer('rate_limit_wait'):
+        await yahoo_limiter.acquire()
+    with stage_timer(stage):
+        try:
+            return await run_fetch(func, *args)
+        except Exception as e:
+            record_upstream_error(e)
+            raise
+
+def fetch_quote_batch(tickers):
+    """quote API 한 번으로 여러 티커의 시세를 가져옵니다. (블로킹 호출)
+
+    티커별로 .info와 같은 키를 가진 딕셔너리를 반환하며, 없는 티커는 빠집니다.
+    """
+    result = YfData().get_raw_json(
+        f"{_QUERY1_URL_}/v7/finance/quote",
+        params={'symbols': ','.join(tickers), 'formatted': 'false'},
+    )
+    quotes = {}
+    for quote in result.get('quoteResponse', {}).get('result') or []:
+        info = {
+            'regularMarketPrice': quote.get('regularMarketPrice'),
+            'previousClose': quote.get('regularMarketPreviousClose'),
+            'dayHigh': quote.get('regularMarketDayHigh'),
+            'dayLow': quote.get('regularMarketDayLow'),
+            'currency': quote.get('currency'),
+            'longName': quote.get('longName') or quote.get('shortName'),
+        }
+        quotes[quote['symbol'].upper()] = {key: value for key, value in info.items() if value is not None}
+    return quotes
+
+def fetch_history(ticker, start, end):
+    """[start, end) 구간의 일봉과 마지막 주식 분할 날짜, 통화를 가져옵니다. (블로킹 호출)"""
+    stock = yf.Ticker(ticker)
+    # 분할 여부 확인을 위해 actions 포함, 배당 조정 없는 종가 사용
+    frame = stock.history(start=start, end=end, interval='1d', auto_adjust=False, actions=True)
+    currency = stock.get_history_metadata().get('currency') if not frame.empty else None
+    return frame_to_columns(frame), last_split_day(frame), currency
+
+def start_fetch(ticker):
+    """티커 조회 작업을 시작하거나, 이미 조회 중이면 그 작업을 반환합니다."""
+    # 같은 티커를 이미 조회 중이면 그 결과를 함께 기다림 (중복 조회 방지)
+    task = inflight_fetches.get(ticker)
+    if task is None:
+        task = asyncio.ensure_future(fetch_stock_data(ticker))
+        inflight_fetches[ticker] = task
+        task.add_done_callback(lambda t: on_fetch_done(ticker, t))
+    else:
+        log_event(logger, logging.INFO, 'fetch_coalesced', "%s 조회 진행 중, 결과 공유 대기", ticker, ticker=ticker)
+    return task
+
+def await_fetch(future):
+    """조회 작업의 결과를 기다립니다.
+
+    한 요청이 취소되어도 다른 대기자의 조회는 계속되도록 shield를 씌우고,
+    실패는 기다린 쪽이 받으므로 on_fetch_done에서 다시 남기지 않도록 표시합니다.
+    """
+    if not future.done():
+        awaited_fetches.add(future)
+    return asyncio.shield(future)
+
+def on_fetch_done(ticker, task):
+    """조회 작업이 끝나면 진행 목록에서 제거합니다."""
+    inflight_fetches.pop(ticker, None)
+    awaited = task in awaited_fetches
+    awaited_fetches.discard(task)
+    if shared_cache is not None:
+        # 결과를 저장하지 못하고 끝났으면 기다리는 다른 워커에게 조회 권한을 넘김
+        shared_cache.release(ticker)
+    if awaited or task.cancelled():
+        return
+    # 아무도 기다리지 않은 백그라운드 갱신의 에러를 회수 (잘못된 티커는 cache_stock_info에서 이미 기록)
+    error = task.exception()
+    if error is not None and not isinstance(error, StockDataError):
+        log_event(
+            logger, logging.WARNING, 'fetch_failed',
+            "%s 백그라운드 조회 실패: %s", ticker, error, ticker=ticker,
+        )
 
 async def get_stock_data(ticker):
     """주식 정보를 안정적으로 가져옵니다."""
-    if is_cache_valid(ticker):
-        return stock_cache[ticker]['data']
+    ticker_popularity.record(ticker)
+    with stage_timer('cache'):
+        entry, state = stock_cache.lookup(ticker)
+    if entry is not None:
+        if entry['error']:
+            raise StockDataError(entry['error'])
+        if state == QuoteCache.STALE:
+            # 만료된 값으로 바로 응답하고 갱신은 백그라운드에서 한 번만 수행
+            start_fetch(ticker)
+        return entry['data']
+
+    return await await_fetch(start_fetch(ticker))
+
+def parse_stock_info(ticker, info, company_name=None):
+    """조회 결과(.info 형식)를 봇에서 쓰는 시세 데이터로 변환합니다."""
+    if not info:
+        raise StockDataError("주식 정보를 가져올 수 없습니다.")
     
-    try:
-        # API 요청 제한을 피하기 위한 랜덤 지연
-        delay = random.uniform(MIN_DELAY, MAX_DELAY)
-        await asyncio.sleep(delay)
-        
-        stock = yf.Ticker(ticker)
-        # 기본 정보 확인
-        info = stock.info
-        if not info:
-            raise Exception("주식 정보를 가져올 수 없습니다.")
-        
-        # 현재 가격과 기본 정보
-        current_price = info.get('regularMarketPrice', 0)
-        previous_close = info.get('previousClose', 0)
-        day_high = info.get('dayHigh', 0)
-        day_low = info.get('dayLow', 0)
-        # market_cap = info.get('marketCap', 0)
-        currency = info.get('currency', 'USD')
-        
-        # 회사 정보
+    # 현재 가격과 기본 정보
+    current_price = info.get('regularMarketPrice', 0)
+    previous_close = info.get('previousClose', 0)
+    day_high = info.get('dayHigh', 0)
+    day_low = info.get('dayLow', 0)
+    # market_cap = info.get('marketCap', 0)
+    currency = info.get('currency', 'USD')
+    
+    # 회사 정보
+    if company_name is None:
         company_name = info.get('longName', ticker)
+    
+    if not current_price or not previous_close:
+        raise StockDataError("가격 정보를 가져올 수 없습니다.")
+    
+    return {
+        'company_name': company_name,
+        'current_price': current_price,
+        'previous_close': previous_close,
+        'day_high': day_high,
+        'day_low': day_low,
+        # 'market_cap': market_cap,
+        'currency': currency,
+        # 'volume': volume,
+        # 'avg_volume': avg_volume
+    }
+
+def cache_stock_info(ticker, info, name_entry=None):
+    """조회 결과를 변환해서 캐시에 저장합니다. 잘못된 티커는 실패 결과를 캐시합니다."""
+    try:
+        stock_data = parse_stock_info(ticker, info, name_entry['data'] if name_entry else None)
+    except StockDataError as e:
+        # 잘못된 티커는 한동안 다시 조회하지 않도록 실패 결과도 캐시
+        stock_cache.set_error(ticker, str(e))
+        if shared_cache is not None:
+            shared_cache.set_error(ticker, str(e))
+        log_event(
+            logger, logging.WARNING, 'invalid_ticker',
+            "주식 데이터 가져오기 실패: %s (%s)", ticker, str(e), ticker=ticker, error=str(e),
+        )
+        raise
+    
+    ttl = get_cache_ttl(ticker)
+    stock_cache.set(ticker, stock_data, ttl)
+    if shared_cache is not None:
+        shared_cache.set(ticker, stock_data, ttl)
+    if name_entry is None and 'longName' in info:
+        company_names.set(ticker, stock_data['company_name'], COMPANY_NAME_TTL)
+    return stock_data
+
+async def acquire_shared(ticker, min_ttl=0):
+    """다른 워커가 조회한 결과를 공유 캐시에서 가져와 로컬 캐시에도 저장합니다.
+
+    직접 조회해야 하면(조회 권한을 얻었거나 공유 캐시를 쓸 수 없으면) None을,
+    잘못된 티커로 캐시된 경우 StockDataError를 반환합니다.
+    """
+    try:
+        reply = await shared_cache.acquire(ticker, min_ttl)
+    except Exception as e:
+        logger.warning("공유 캐시 사용 불가, 직접 조회: %s (%s)", ticker, e)
+        return None
+    if reply is None:
+        return None
+    return apply_shared(ticker, reply)
+
+async def wait_shared(ticker, min_ttl=0):
+    """다른 워커가 조회 중인 티커의 결과를 조회 권한 없이 기다립니다. 결과가 없으면 None을 반환합니다."""
+    try:
+        reply = await shared_cache.wait(ticker, min_ttl)
+    except Exception as e:
+        logger.warning("공유 캐시 대기 실패, 직접 조회: %s (%s)", ticker, e)
+        return None
+    if reply is None:
+        return None
+    return apply_shared(ticker, reply)
+
+def apply_shared(ticker, reply):
+    """공유 캐시 결과를 로컬 캐시에 저장하고 시세 데이터 또는 StockDataError를 반환합니다."""
+    if reply['error']:
+        stock_cache.set_error(ticker, reply['error'], reply['ttl'])
+        return StockDataError(reply['error'])
+    stock_cache.set(ticker, reply['data'], reply['ttl'])
+    return reply['data']
+
+def resolve_future(future, result):
+    if isinstance(result, Exception):
+        future.set_exception(result)
+    else:
+        future.set_result(result)
+
+async def fetch_stock_data(ticker):
+    """yfinance에서 주식 정보를 조회하고 캐시를 갱신합니다."""
+    if shared_cache is not None:
+        # 다른 워커가 이미 조회했거나 조회 중이면 그 결과를 사용
+        shared = await acquire_shared(ticker)
+        if isinstance(shared, Exception):
+            raise shared
+        if shared is not None:
+            return shared
+    try:
+        # 회사명은 거의 바뀌지 않으므로 따로 오래 캐시
+        name_entry, _ = company_names.lookup(ticker)
+
+        # 기본 정보 확인 (요청 한도 내에서 스레드 풀로 실행)
+        info = await request_yahoo('fetch', fetch_stock_info, ticker, name_entry is None)
+        return cache_stock_info(ticker, info, name_entry)
         
-        if not current_price or not previous_close:
-            raise Exception("가격 정보를 가져올 수 없습니다.")
-        
-        # 캐시 업데이트
-        stock_data = {
-            'company_name': company_name,
-            'current_price': current_price,
-            'previous_close': previous_close,
-            'day_high': day_high,
-            'day_low': day_low,
-            # 'market_cap': market_cap,
-            'currency': currency,
-            # 'volume': volume,
-            # 'avg_volume': avg_volume
-        }
+    except StockDataError:
+        raise
+    except asyncio.TimeoutError:
+        log_event(
+            logger, logging.WARNING, 'fetch_timeout',
+            "주식 데이터 조회 시간 초과: %s (%s초)", ticker, FETCH_TIMEOUT, ticker=ticker,
+        )
+        raise
+    except Exception:
+        logger.exception("주식 데이터 가져오기 실패: %s", ticker)
+        raise
+
+async def fetch_stock_data_batch(tickers, futures, min_ttl=0):
+    """여러 티커를 묶음 단위로 한 번에 조회하고 티커별 대기 작업에 결과를 전달합니다.
+
+    워커 모드에서는 공유 캐시에 남은 시간이 min_ttl 이상인 결과가 있으면 그것을 사용합니다.
+    """
+    try:
+        to_fetch, busy = tickers, []
+        if shared_cache is not None:
+            # 캐시 결과와 조회 권한을 기다리지 않고 한 번에 받음 (권한을 쥔 채로 다른 워커를 기다리지 않기 위함)
+            try:
+                hits, to_fetch, busy = await shared_cache.acquire_batch(tickers, min_ttl)
+            except Exception as e:
+                logger.warning("공유 캐시 사용 불가, 직접 조회: %s (%s)", tickers, e)
+                hits, to_fetch, busy = {}, tickers, []
+            for ticker, reply in hits.items():
+                resolve_future(futures[ticker], apply_shared(ticker, reply))
+
+        await fetch_quote_batches(to_fetch, futures)
+
+        if busy:
+            # 가진 조회 권한을 모두 처리한 뒤에 다른 워커가 조회 중인 티커를 기다리고, 결과가 없으면 직접 조회
+            shared = await asyncio.gather(*(wait_shared(ticker, min_ttl) for ticker in busy))
+            retry = []
+            for ticker, result in zip(busy, shared):
+                if result is None:
+                    retry.append(ticker)
+                else:
+                    resolve_future(futures[ticker], result)
+            await fetch_quote_batches(retry, futures)
+    finally:
+        # 취소 등으로 중단되어도 기다리는 요청이 멈추지 않도록 정리
+        for ticker in tickers:
+            if not futures[ticker].done():
+                futures[ticker].set_exception(StockDataError("묶음 조회가 중단되었습니다."))
+
+async def fetch_quote_batches(tickers, futures):
+    """티커를 QUOTE_BATCH_SIZE개씩 묶어 조회하고 티커별 대기 작업에 결과를 전달합니다."""
+    for i in range(0, len(tickers), QUOTE_BATCH_SIZE):
+        batch = tickers[i:i + QUOTE_BATCH_SIZE]
+        try:
+            quotes = await request_yahoo('fetch_batch', fetch_quote_batch, batch)
+        except Exception as e:
+            logger.error("묶음 조회 실패 (%s): %s", batch, e)
+            for ticker in batch:
+                futures[ticker].set_exception(e)
+            continue
         
-        stock_cache[ticker] = {
-            'data': stock_data,
-            'timestamp': datetime.now()
-        }
+        for ticker in batch:
+            try:
+                futures[ticker].set_result(cache_stock_info(ticker, quotes.get(ticker)))
+            except Exception as e:
+                futures[ticker].set_exception(e)
+
+def start_batch_fetch(tickers, min_ttl=0):
+    """조회 중이 아닌 티커들을 묶어서 조회를 시작하고, 티커별 대기 작업을 반환합니다."""
+    loop = asyncio.get_running_loop()
+    pending = {}
+    new_tickers = []
+    for ticker in tickers:
+        future = inflight_fetches.get(ticker)
+        if future is None:
+            future = loop.create_future()
+            inflight_fetches[ticker] = future
+            future.add_done_callback(lambda f, t=ticker: on_fetch_done(t, f))
+            new_tickers.append(ticker)
+        pending[ticker] = future
+    
+    if new_tickers:
+        asyncio.ensure_future(fetch_stock_data_batch(new_tickers, pending, min_ttl))
+    return pending
+
+async def get_stock_data_batch(tickers):
+    """여러 티커의 주식 정보를 가져옵니다. 캐시에 없는 티커만 묶어서 조회합니다.
+
+    티커별로 시세 데이터 또는 발생한 예외를 담은 딕셔너리를 반환합니다.
+    """
+    results = {}
+    to_fetch = []
+    missing = []
+    for ticker in tickers:
+        ticker_popularity.record(ticker)
+        with stage_timer('cache'):
+            entry, state = stock_cache.lookup(ticker)
+        if entry is None:
+            to_fetch.append(ticker)
+            missing.append(ticker)
+        elif entry['error']:
+            results[ticker] = StockDataError(entry['error'])
+        else:
+            results[ticker] = entry['data']
+            if state == QuoteCache.STALE:
+                # 만료된 값은 바로 응답하고 같은 묶음 요청으로 갱신
+                to_fetch.append(ticker)
+    
+    if not to_fetch:
+        return results
+    
+    pending = start_batch_fetch(to_fetch)
+    for ticker in missing:
+        try:
+            results[ticker] = await await_fetch(pending[ticker])
+        except Exception as e:
+            results[ticker] = e
+    return results
+
+def get_prefetch_targets():
+    """장중인 인기 티커 중 캐시가 곧 만료되는 티커를 반환합니다."""
+    targets = []
+    for ticker in ticker_popularity.top(PREFETCH_TOP_N):
+        if ticker in inflight_fetches or not is_market_open(ticker):
+            continue
+        remaining = stock_cache.expires_in(ticker)
+        # 캐시에서 밀려난 티커도 다시 채움
+        if remaining is None or remaining < PREFETCH_LEAD:
+            targets.append(ticker)
+    return targets
+
+async def prefetch_hot_tickers():
+    """인기 티커를 캐시 만료 전에 묶음으로 미리 갱신합니다."""
+    logger.info(f"인기 티커 미리 갱신 시작 (상위 {PREFETCH_TOP_N}개, {PREFETCH_INTERVAL}초 주기)")
+    while True:
+        await asyncio.sleep(PREFETCH_INTERVAL)
+        try:
+            targets = get_prefetch_targets()
+            if not targets:
+                continue
+            # 사용자 요청에 쓸 요청 한도는 남겨둠
+            if yahoo_limiter.available() < PREFETCH_MIN_TOKENS:
+                logger.info(f"요청 한도가 부족해 미리 갱신 건너뜀 ({len(targets)}개 대상)")
+                continue
+            # 다른 워커가 갱신한 값도 곧 만료되면 다시 조회
+            pending = start_batch_fetch(targets, min_ttl=PREFETCH_LEAD)
+            await asyncio.gather(*(await_fetch(future) for future in pending.values()), return_exceptions=True)
+            logger.info(f"인기 티커 {len(targets)}개 미리 갱신: {', '.join(targets)}")
+        except Exception as e:
+            logger.error(f"인기 티커 미리 갱신 실패: {str(e)}")
+
+async def check_price_alerts(bot):
+    """알림이 걸린 티커를 티커당 한 번씩 묶음 조회하고, 발동된 알림을 보냅니다."""
+    tickers = [ticker for ticker in alert_index.tickers() if is_market_open(ticker)]
+    if not tickers:
+        return
+    
+    # 캐시가 아직 유효한 티커는 그 값으로 확인하고, 만료되었거나 없는 티커만 묶음 조회
+    quotes = {}
+    to_fetch = []
+    for ticker in tickers:
+        entry, state = stock_cache.lookup(ticker)
+        if entry is None or state != QuoteCache.FRESH:
+            to_fetch.append(ticker)
+        elif not entry['error']:
+            quotes[ticker] = entry['data']
+    if to_fetch:
+        for ticker, future in start_batch_fetch(to_fetch).items():
+            try:
+                quotes[ticker] = await await_fetch(future)
+            except Exception:
+                continue
+    
+    fired = []
+    for ticker, stock_data in quotes.items():
+        _, change_percent, _, _ = get_price_change(stock_data)
+        for alert in alert_index.evaluate(ticker, stock_data['current_price'], change_percent):
+            fired.append((alert, stock_data))
+    if not fired:
+        return
+    
+    # 발동된 알림은 다시 울리지 않도록 먼저 비활성화
+    try:
+        await asyncio.to_thread(alert_store.mark_triggered, [alert['id'] for alert, _ in fired])
+    except Exception as e:
+        logger.error(f"발동된 알림 저장 실패: {str(e)}")
+    
+    for alert, stock_data in fired:
+        _, change_percent, price_arrow, currency_symbol = get_price_change(stock_data)
+        text = f"""🔔 가격 알림: {describe_alert(alert)}
+
+{price_arrow} {stock_data['company_name']} [${alert['ticker']}]
+💰 Price: {currency_symbol}{stock_data['current_price']:.2f} ({change_percent:+.2f}%)
+"""
+        try:
+            await bot.send_message(chat_id=alert['chat_id'], text=text)
+        except Exception as e:
+            logger.error(f"가격 알림 전송 실패 (채팅 ID {alert['chat_id']}): {str(e)}")
+    logger.info(f"가격 알림 {len(fired)}개 발동")
+
+async def watch_price_alerts(bot):
+    """주기적으로 가격 알림 발동 여부를 확인합니다."""
+    logger.info(f"가격 알림 확인 시작 ({ALERT_POLL_INTERVAL}초 주기)")
+    while True:
+        await asyncio.sleep(ALERT_POLL_INTERVAL)
+        try:
+            await check_price_alerts(bot)
+        except Exception as e:
+            logger.error(f"가격 알림 확인 실패: {str(e)}")
+
+async def handle_alert_command(context, chat_id, text):
+    """/alert, /alerts, /unalert 명령어를 처리합니다."""
+    command = text.split()[0].lower()
+    
+    # 알림 목록
+    if command == '/alerts':
+        alerts = sorted(alert_index.for_chat(chat_id), key=lambda alert: alert['id'])
+        if not alerts:
+            response = "등록된 알림이 없습니다."
+        else:
+            response = "🔔 등록된 알림\n\n" + "\n".join(f"#{alert['id']} {describe_alert(alert)}" for alert in alerts)
+        await context.bot.send_message(chat_id=chat_id, text=response)
+        return
+    
+    # 알림 삭제
+    if command == '/unalert':
+        args = text.split()[1:]
+        if len(args) != 1 or not args[0].lstrip('#').isdigit():
+            await context.bot.send_message(chat_id=chat_id, text="삭제할 알림 번호를 입력해주세요. 예: /unalert 3")
+            return
+        alert_id = int(args[0].lstrip('#'))
+        deleted = await asyncio.to_thread(alert_store.delete, alert_id, chat_id)
+        if deleted:
+            alert_index.remove(alert_id)
+        await context.bot.send_message(
+            chat_id=chat_id,
+            text=f"알림 #{alert_id} 삭제 완료" if deleted else f"알림 #{alert_id}을(를) 찾을 수 없습니다."
+        )
+        return
+    
+    # 알림 등록
+    parsed = parse_alert_command(text)
+    if parsed is None:
+        await context.bot.send_message(
+            chat_id=chat_id,
+            text="알림 형식: /alert $AAPL > 200, /alert $AAPL < 150, /alert $TSLA -5%"
+        )
+        return
+    if len(alert_index.for_chat(chat_id)) >= MAX_ALERTS_PER_CHAT:
+        await context.bot.send_message(chat_id=chat_id, text=f"알림은 채팅방당 최대 {MAX_ALERTS_PER_CHAT}개까지 등록할 수 있습니다.")
+        return
+    
+    # 없는 티커의 알림은 계속 조회만 하게 되므로 등록 전에 시세를 확인 (조회 실패는 오류 메시지로 처리)
+    ticker = parsed[0]
+    try:
+        await get_stock_data(ticker)
+    except StockDataError as e:
+        await context.bot.send_message(chat_id=chat_id, text=f"${ticker} 알림을 등록할 수 없습니다: {str(e)}")
+        return
+    
+    alert = await asyncio.to_thread(alert_store.add, chat_id, *parsed)
+    alert_index.add(alert)
+    await context.bot.send_message(chat_id=chat_id, text=f"🔔 알림 #{alert['id']} 등록: {describe_alert(alert)}")
+
+async def update_price_history(ticker, start):
+    """저장소에 없는 구간의 일봉만 조회해서 저장합니다."""
+    session = get_market_session(ticker)
+    today = datetime.now(ZoneInfo(session[0]) if session else ZoneInfo('UTC')).date()
+    end = today + timedelta(days=1)
+    _, meta = history_store.load(ticker)
+    stored_last_day = (meta or {}).get('last_day')
+    for range_start, range_end in history_store.missing_ranges(ticker, start, today):
+        rows, split_day, currency = await request_yahoo('fetch_history', fetch_history, ticker, range_start, range_end)
+        if split_day is not None and stored_last_day is not None and split_day > stored_last_day:
+            # 저장된 마지막 일봉 뒤에 분할이 있었으면 저장된 과거 가격은 분할 전 기준이므로 요청 구간 전체를 다시 받아 교체하고,
+            # 남은 구간 목록은 교체 전 저장 상태 기준이므로 더 조회하지 않음
+            # (저장 전이나 저장된 구간 안의 분할은 이미 반영된 값을 받았으므로 그대로 합침)
+            log_event(logger, logging.INFO, 'history_split', "%s 주식 분할 감지, 일봉 다시 조회", ticker, ticker=ticker)
+            rows, _, currency = await request_yahoo('fetch_history', fetch_history, ticker, start, end)
+            await asyncio.to_thread(history_store.merge, ticker, rows, start, end, replace=True, currency=currency)
+            return
+        await asyncio.to_thread(history_store.merge, ticker, rows, range_start, range_end, currency=currency)
+
+async def get_price_history(ticker, period):
+    """기간 내 일봉 배열과 통화를 반환합니다. 같은 티커/기간의 동시 요청은 조회를 한 번만 합니다."""
+    start = period_start(period, datetime.now().date())
+    key = (ticker, start)
+    task = inflight_history.get(key)
+    if task is None:
+        task = asyncio.ensure_future(update_price_history(ticker, start))
+        inflight_history[key] = task
+        task.add_done_callback(lambda t: inflight_history.pop(key, None))
+    await asyncio.shield(task)
+    with stage_timer('history_read'):
+        data, meta = await asyncio.to_thread(history_store.read, ticker, start)
+    return data, (meta or {}).get('currency')
+
+async def handle_history_command(context, chat_id, text):
+    """/chart, /stats 명령어를 처리합니다."""
+    command = text.split()[0].lower()
+    default_period = CHART_DEFAULT_PERIOD if command == '/chart' else STATS_DEFAULT_PERIOD
+    parsed = parse_history_command(text, default_period)
+    if parsed is None:
+        await context.bot.send_message(
+            chat_id=chat_id,
+            text="형식: /chart $AAPL 6mo, /stats $AAPL 1y (기간: 1mo 3mo 6mo 1y 2y 5y 10y ytd max)"
+        )
+        return
+    command, ticker, period = parsed
+
+    try:
+        data, currency = await get_price_history(ticker, period)
+    except Exception as e:
+        log_event(
+            logger, logging.ERROR, 'history_failed',
+            "가격 이력 가져오기 실패: %s (%s)", ticker, str(e), ticker=ticker, error=str(e),
+        )
+        await context.bot.send_message(chat_id=chat_id, text=f"{ticker} 가격 이력 가져오기 실패.")
+        return
+    if data.shape[1] < 2:
+        await context.bot.send_message(chat_id=chat_id, text=f"{ticker} 가격 이력이 없습니다.")
+        return
+
+    # 차트 그리기/통계 계산은 이벤트 루프를 막지 않도록 스레드에서 실행
+    if command == 'chart':
+        with stage_timer('render'):
+            png = await asyncio.to_thread(render_chart, ticker, period, data, get_currency_symbol(currency))
+        with stage_timer('send'):
+            await context.bot.send_photo(chat_id=chat_id, photo=png, caption=f"📈 ${ticker} ({period})")
+        return
+    with stage_timer('stats'):
+        stats = await asyncio.to_thread(compute_stats, data)
+    with stage_timer('send'):
+        await context.bot.send_message(chat_id=chat_id, text=format_history_stats(ticker, period, stats, currency))
+
+# 봇 종료 시 취소할 백그라운드 작업
+# (application.create_task로 만든 작업은 Application.stop이 끝날 때까지 기다리므로 무한 루프에 쓰지 않음)
+background_tasks = set()
+
+def start_background_task(coro):
+    task = asyncio.ensure_future(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def stop_background_tasks(application=None):
+    """백그라운드 작업을 모두 취소하고 끝날 때까지 기다립니다."""
+    for task in list(background_tasks):
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+
+async def post_init(application):
+    """봇 시작 후 이벤트 루프에서 돌아갈 백그라운드 작업을 시작합니다."""
+    start_background_task(monitor_loop_lag())
+    if PREFETCH_TOP_N > 0:
+        start_background_task(prefetch_hot_tickers())
+    start_background_task(watch_price_alerts(application.bot))
+    if chat_allowlist.store is not None:
+        start_background_task(reload_allowlist())
+    # "/p@봇이름" 형식은 이 봇을 부른 경우만 처리
+    command_router.username = application.bot.username
+    # 워커는 감독 프로세스가 상태를 확인하므로 단일 프로세스 모드에서만 실행
+    if shared_cache is None:
+        start_background_task(monitor_health())
+
+def parse_tickers(text):
+    """'$AAPL $MSFT ...' 형식의 문자열에서 티커 목록을 추출합니다. (입력 순서 유지, 중복 제거)"""
+    tickers = []
+    for token in text.split():
+        ticker = token.lstrip('$').upper()
+        if ticker and ticker not in tickers:
+            tickers.append(ticker)
+    return tickers
+
+def get_price_change(stock_data):
+    """전일 종가 대비 변동폭, 등락률, 화살표 이모지, 통화 기호를 계산합니다."""
+    current_price = stock_data['current_price']
+    previous_close = stock_data['previous_close']
+    currency = stock_data['currency']
+
+    # 등락률 계산
+    if previous_close > 0:
+        change_percent = ((current_price - previous_close) / previous_close) * 100
+        price_change = current_price - previous_close
+    else:
+        change_percent = 0
+        price_change = 0
         
-        return stock_data
+    # 화살표 이모지 선택 (색상 변경)
+    price_arrow = "🟩" if change_percent > 0 else "🟥" if change_percent < 0 else "➡️"
+    
+    return price_change, change_percent, price_arrow, get_currency_symbol(currency)
+
+def get_currency_symbol(currency):
+    """통화 코드를 표시용 기호로 바꿉니다."""
+    return "$" if currency == "USD" else "₩" if currency == "KRW" else currency or ""
+
+def format_stock_message(ticker, stock_data):
+    """티커 하나의 상세 시세 메시지를 만듭니다."""
+    current_price = stock_data['current_price']
+    day_high = stock_data['day_high']
+    day_low = stock_data['day_low']
+    # market_cap = stock_data['market_cap']
+    currency = stock_data['currency']
+    company_name = stock_data['company_name']
+    # volume = stock_data['volume']
+    # avg_volume = stock_data['avg_volume']
+    price_change, change_percent, price_arrow, currency_symbol = get_price_change(stock_data)
+    
+    # # 거래량 비교
+    # volume_arrow, volume_ratio = calculate_volume_ratio(volume, avg_volume)
+    
+    # 응답 메시지 구성
+    return f"""📊 {company_name} [${ticker}]
+
+{price_arrow} Change: {currency_symbol}{abs(price_change):.2f} ({change_percent:+.2f}%)
+💰 Price [{currency}]: {currency_symbol}{current_price:.2f}
+📈 High: {currency_symbol}{day_high:.2f}
+📉 Low: {currency_symbol}{day_low:.2f}
+"""
+
+def format_stock_table(tickers, results):
+    """여러 티커의 시세를 한 메시지의 표로 만듭니다."""
+    width = max(len(ticker) for ticker in tickers) + 1
+    lines = [f"📊 관심 종목 ({len(tickers)})", ""]
+    for ticker in tickers:
+        stock_data = results.get(ticker)
+        label = f"${ticker}".ljust(width)
+        if not isinstance(stock_data, dict):
+            lines.append(f"⚠️ {label}  정보 가져오기 실패")
+            continue
+        _, change_percent, price_arrow, currency_symbol = get_price_change(stock_data)
+        lines.append(f"{price_arrow} {label}  {currency_symbol}{stock_data['current_price']:.2f} ({change_percent:+.2f}%)")
+    return "\n".join(lines)
+
+def format_history_stats(ticker, period, stats, currency):
+    """일봉 요약 통계 메시지를 만듭니다."""
+    currency_symbol = get_currency_symbol(currency)
+    sharpe = f"{stats['sharpe']:.2f}" if stats['sharpe'] is not None else "-"
+    moving_averages = "\n".join(
+        f"   MA{window}: {currency_symbol}{value:.2f} ({stats['last_close'] / value - 1:+.2%})"
+        for window, value in stats['moving_averages'].items()
+    )
+    return f"""📊 ${ticker} 통계 ({period}, {stats['start_day']} ~ {stats['end_day']}, {stats['days']}거래일)
+
+💰 종가: {currency_symbol}{stats['first_close']:.2f} → {currency_symbol}{stats['last_close']:.2f}
+📈 수익률: {stats['total_return']:+.2%} (연율 {stats['annual_return']:+.2%})
+🌊 변동성(연율): {stats['volatility']:.2%}, 샤프 지수: {sharpe}
+📉 최대 낙폭: {stats['max_drawdown']:.2%} ({stats['drawdown_peak']} → {stats['drawdown_trough']})
+🔝 최고/최저: {currency_symbol}{stats['high']:.2f} / {currency_symbol}{stats['low']:.2f}
+📦 평균 거래량: {format_large_number(stats['avg_volume'])}
+〰️ 이동평균 (현재가 대비)
+{moving_averages or "   (기간이 짧아 계산 안 됨)"}
+"""
+
+async def handle_price_command(context, chat_id, text):
+    """/p $티커 [$티커 ...] 명령어를 처리합니다."""
+    # 티커 추출 (여러 개 입력 가능, 중복 제거)
+    tickers = parse_tickers(text[3:])
+    if not tickers:
+        await context.bot.send_message(chat_id=chat_id, text="티커를 입력해주세요. 예: /p $AAPL")
+        return
+    if len(tickers) > MAX_TICKERS_PER_MESSAGE:
+        await context.bot.send_message(
+            chat_id=chat_id,
+            text=f"한 번에 최대 {MAX_TICKERS_PER_MESSAGE}개 티커까지 조회할 수 있습니다."
+        )
+        return
+    
+    # 여러 티커는 묶음 조회 후 한 메시지로 응답
+    if len(tickers) > 1:
+        log_event(logger, logging.DEBUG, 'quote_batch', "%s 정보 가져오는 중", tickers, tickers=tickers)
+        results = await get_stock_data_batch(tickers)
+        with stage_timer('send'):
+            await context.bot.send_message(chat_id=chat_id, text=format_stock_table(tickers, results))
+        return
+    
+    ticker = tickers[0]
+    try:
+        # 주식 정보 가져오기
+        stock_data = await get_stock_data(ticker)
+        response = format_stock_message(ticker, stock_data)
+        with stage_timer('send'):
+            await context.bot.send_message(chat_id=chat_id, text=response)
+        log_event(logger, logging.DEBUG, 'quote_sent', "%s 응답 전송 완료", ticker, ticker=ticker, chat_id=chat_id)
         
     except Exception as e:
-        print(f"주식 데이터 가져오기 실패: {str(e)}")
-        print(traceback.format_exc())
-        raise
+        # 잘못된 티커/시간 초과는 조회 단계에서 이미 기록했으므로 추적 정보 없이 남김
+        log_event(
+            logger, logging.ERROR, 'quote_failed',
+            "주식 정보 가져오기 실패: %s (%s)", ticker, str(e), ticker=ticker, error=str(e),
+        )
+        error_message = f"{ticker} 정보 가져오기 실패."
+        await context.bot.send_message(chat_id=chat_id, text=error_message)
+
+# 명령어 표 (별칭은 정식 이름으로 바뀌어 처리 함수에 전달됨)
+command_router = CommandRouter()
+command_router.add('start', start, aliases=('help',))
+command_router.add('p', handle_price_command, aliases=('price', 'q'))
+command_router.add('alert', handle_alert_command, error_message="알림 처리 중 오류가 발생했습니다.")
+command_router.add('alerts', handle_alert_command, error_message="알림 처리 중 오류가 발생했습니다.")
+command_router.add('unalert', handle_alert_command, error_message="알림 처리 중 오류가 발생했습니다.")
+command_router.add('chart', handle_history_command, error_message="차트/통계 처리 중 오류가 발생했습니다.")
+command_router.add('stats', handle_history_command, error_message="차트/통계 처리 중 오류가 발생했습니다.")
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """모든 메시지를 처리합니다."""
+    """텍스트 메시지를 권한 확인 후 명령어 표에 따라 처리합니다. (ROUTED_UPDATES 필터를 통과한 업데이트만 들어옴)"""
+    start_time = time.perf_counter()
+    text = None
     try:
         chat_id = update.effective_chat.id
         
-        # 로그 기록 (권한 체크 전에 수행)
-        await log_interaction(update)
+        # 채팅 ID 확인
+        with stage_timer('auth'):
+            authorized = chat_id in chat_allowlist
+        # 미승인 채팅의 반복 메시지는 응답, 로그, DB 기록 없이 버림
+        if not authorized:
+            notify, suppressed = unauthorized_limiter.check(chat_id)
+            if not notify:
+                return
+        
+        # 로그 기록
+        with stage_timer('log'):
+            await log_interaction(update)
         
         # 텍스트 메시지 확인
-        text = None
-        if update.message and update.message.text:
-            text = update.message.text
-        elif update.channel_post and update.channel_post.text:
-            text = update.channel_post.text
+        message = update.message or update.channel_post
+        text = message.text if message else None
             
         # 사용자 정보 가져오기
         user = update.effective_user.username or update.effective_user.full_name if update.effective_user else "알 수 없는 사용자"
         
-        # 채팅 ID 확인
-        if chat_id not in AUTHORIZED_CHAT_IDS:
-            logger.warning(f"""
-=== 미승인 접근 감지 ===
-시간: {datetime.now()}
-채팅 ID: {chat_id}
-사용자: {user}
-메시지: {text if text else "텍스트 없음"}
-======================""")
+        if not authorized:
+            log_event(
+                logger, logging.WARNING, 'unauthorized',
+                "미승인 접근 감지 (채팅 ID %s, 사용자 %s): %s", chat_id, user, text,
+                chat_id=chat_id, user=user, message=text, suppressed=suppressed,
+            )
             
             # 미승인 사용자에게 메시지 전송
             try:
@@ -294,97 +1385,295 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     text="미승인 채팅ID"
                 )
             except Exception as e:
-                logger.error(f"미승인 사용자에게 메시지 전송 실패: {str(e)}")
+                logger.error("미승인 사용자에게 메시지 전송 실패: %s", e)
             return
         
         # 텍스트가 없는 경우 처리 종료
         if not text:
-            logger.info(f"""
-=== 텍스트 없는 메시지 ===
-시간: {datetime.now()}
-채팅 ID: {chat_id}
-사용자: {user}
-======================""")
-            return
-            
-        logger.info(f"""
-=== 메시지 수신 ===
-시간: {datetime.now()}
-채팅 ID: {chat_id}
-사용자: {user}
-메시지: {text}
-======================""")
-            
-        # /start 명령어 처리
-        if text.lower() == '/start':
-            await start(update, context)
             return
             
-        # 주식 티커 명령어가 아닌 경우 무시
-        if not text.startswith('/p $'):
+        # 등록된 명령어가 아니면 무시
+        resolved = command_router.resolve(text)
+        if resolved is None:
             return
-            
-        # 티커 추출
-        ticker = text[4:].strip().upper()
-        if not ticker:
-            await context.bot.send_message(chat_id=chat_id, text="티커를 입력해주세요. 예: /p $AAPL")
-            return
-            
+        route, text = resolved
         try:
-            # 주식 정보 가져오기
-            print(f"{ticker} 정보 가져오는 중...")
-            stock_data = await get_stock_data(ticker)
-            
-            current_price = stock_data['current_price']
-            previous_close = stock_data['previous_close']
-            day_high = stock_data['day_high']
-            day_low = stock_data['day_low']
-            # market_cap = stock_data['market_cap']
-            currency = stock_data['currency']
-            company_name = stock_data['company_name']
-            # volume = stock_data['volume']
-            # avg_volume = stock_data['avg_volume']
-
-            # 등락률 계산
-            if previous_close > 0:
-                change_percent = ((current_price - previous_close) / previous_close) * 100
-                price_change = current_price - previous_close
-            else:
-                change_percent = 0
-                price_change = 0
-                
-            # 화살표 이모지 선택 (색상 변경)
-            price_arrow = "🟩" if change_percent > 0 else "🟥" if change_percent < 0 else "➡️"
-            
-            # # 거래량 비교
-            # volume_arrow, volume_ratio = calculate_volume_ratio(volume, avg_volume)
-            
-            # 통화 기호 설정
-            currency_symbol = "$" if currency == "USD" else "₩" if currency == "KRW" else currency
-            
-            # 응답 메시지 구성
-            response = f"""📊 {company_name} [${ticker}]
-
-{price_arrow} Change: {currency_symbol}{abs(price_change):.2f} ({change_percent:+.2f}%)
-💰 Price [{currency}]: {currency_symbol}{current_price:.2f}
-📈 High: {currency_symbol}{day_high:.2f}
-📉 Low: {currency_symbol}{day_low:.2f}
-"""
-            print("응답 메시지 전송 중...")
-            await context.bot.send_message(chat_id=chat_id, text=response)
-            print("응답 전송 완료")
-            
+            await route.handler(context, chat_id, text)
         except Exception as e:
-            print(f"주식 정보 가져오기 실패: {str(e)}")
-            print(traceback.format_exc())
-            error_message = f"{ticker} 정보 가져오기 실패."
-            await context.bot.send_message(chat_id=chat_id, text=error_message)
-            logging.error(f"Error fetching stock info for {ticker}: {str(e)}")
+            if route.error_message is None:
+                raise
+            logger.exception("/%s 명령어 처리 실패: %s", route.name, e)
+            await context.bot.send_message(chat_id=chat_id, text=route.error_message)
             
+    except Exception:
+        logger.exception("메시지 처리 중 에러 발생")
+    finally:
+        elapsed = time.perf_counter() - start_time
+        STAGE_DURATION.observe(elapsed, stage='handle')
+        if elapsed > SLOW_HANDLER_SECONDS:
+            log_event(
+                logger, logging.WARNING, 'slow_handler',
+                "느린 메시지 처리: %.2f초 (%s)", elapsed, text, elapsed=elapsed, message=text,
+            )
+
+def cache_request_counts():
+    """캐시 조회 결과별 누적 횟수를 반환합니다."""
+    stats = stock_cache.stats()
+    return {
+        (('result', 'hit'),): stats['hits'],
+        (('result', 'stale'),): stats['stale_hits'],
+        (('result', 'negative'),): stats['negative_hits'],
+        (('result', 'miss'),): stats['misses'],
+    }
+
+def cache_hit_ratio():
+    """캐시 적중률(이전 값 응답 포함)을 반환합니다."""
+    stats = stock_cache.stats()
+    hits = stats['hits'] + stats['stale_hits'] + stats['negative_hits']
+    total = hits + stats['misses']
+    return hits / total if total else 0
+
+registry.register(Gauge('bot_cache_requests_total', '시세 캐시 조회 결과별 횟수', cache_request_counts, 'counter'))
+registry.register(Gauge('bot_cache_hit_ratio', '시세 캐시 적중률', cache_hit_ratio))
+registry.register(Gauge('bot_cache_entries', '시세 캐시 항목 수', lambda: len(stock_cache)))
+registry.register(Gauge('bot_cache_evictions_total', '시세 캐시 LRU 제거 횟수', lambda: stock_cache.evictions, 'counter'))
+registry.register(Gauge('bot_fetch_queue_depth', '조회 스레드 풀 대기 및 실행 중인 작업 수', get_fetch_queue_depth))
+registry.register(Gauge('bot_inflight_fetches', '진행 중인 티커 조회 수', lambda: len(inflight_fetches)))
+registry.register(Gauge('bot_rate_limit_tokens', 'Yahoo 요청 제한기 남은 토큰 수', yahoo_limiter.available))
+registry.register(Gauge('bot_chat_log_queue_depth', '기록 대기 중인 채팅 로그 수', chat_log_writer.queue_depth))
+registry.register(Gauge(
+    'bot_chat_log_rows_total', '채팅 로그 처리 결과별 건수',
+    lambda: {(('result', key),): value for key, value in chat_log_writer.stats().items() if key != 'queued'},
+    'counter'
+))
+registry.register(Gauge('bot_active_alerts', '활성 가격 알림 수', lambda: len(alert_index)))
+registry.register(Gauge('bot_authorized_chats', '허용된 채팅 수', lambda: len(chat_allowlist)))
+registry.register(Gauge(
+    'bot_unauthorized_suppressed_total', '응답/기록 없이 버린 미승인 채팅 메시지 수',
+    lambda: unauthorized_limiter.suppressed, 'counter'
+))
+
+# 워커 모드의 감독 프로세스 상태 (run_supervisor에서 설정)
+worker_pool = None
+cache_server = None
+
+async def monitor_health():
+    """워커 상태를 확인해 멈춘 워커를 다시 시작하고, 설정된 경우 슬립 방지 요청을 보냅니다."""
+    loop = asyncio.get_running_loop()
+    next_keepalive = 0
+    while True:
+        await asyncio.sleep(WORKER_HEALTH_INTERVAL)
+        if worker_pool is not None:
+            worker_pool.check()
+            for index, status in get_health()[1]['workers'].items():
+                if status['alive'] and not status['healthy']:
+                    logger.warning("워커 %s 상태 보고 지연 (%s초)", index, status['heartbeat_age'])
+        if KEEPALIVE_URL and time.monotonic() >= next_keepalive:
+            next_keepalive = time.monotonic() + KEEPALIVE_INTERVAL
+            try:
+                await loop.run_in_executor(None, lambda: requests.get(KEEPALIVE_URL, timeout=10))
+            except Exception as e:
+                logger.error(f"서버 핑 전송 실패: {str(e)}")
+
+def get_health():
+    """(정상 여부, 상태)를 반환합니다. 워커 모드에서는 워커별 마지막 상태 보고를 포함합니다."""
+    if worker_pool is None:
+        return True, {'workers': 1, 'pid': os.getpid()}
+    now = time.monotonic()
+    workers = {}
+    for index, alive in enumerate(worker_pool.alive()):
+        report = cache_server.health.get(index, {})
+        age = round(now - report['received'], 1) if report else None
+        workers[index] = {
+            'alive': alive,
+            # 상태 보고가 세 번 연속 없으면 멈춘 것으로 판단
+            'healthy': alive and age is not None and age < WORKER_HEALTH_INTERVAL * 3,
+            'heartbeat_age': age,
+            **{key: value for key, value in report.items() if key not in ('op', 'worker', 'received')},
+        }
+    ok = all(status['healthy'] for status in workers.values())
+    return ok, {'workers': workers, 'restarts': worker_pool.restarts, 'cache': stock_cache.stats()}
+
+def worker_metric(key):
+    """워커별 상태 보고 값을 지표용 딕셔너리로 바꾸는 함수를 만듭니다."""
+    def collect():
+        return {
+            (('worker', str(index)),): status[key]
+            for index, status in get_health()[1]['workers'].items() if status.get(key) is not None
+        }
+    return collect
+
+def register_worker_metrics():
+    registry.register(Gauge('bot_worker_up', '워커 정상 여부 (1/0)', lambda: {
+        (('worker', str(index)),): int(status['healthy']) for index, status in get_health()[1]['workers'].items()
+    }))
+    registry.register(Gauge('bot_worker_heartbeat_age_seconds', '워커 마지막 상태 보고 이후 시간', worker_metric('heartbeat_age')))
+    registry.register(Gauge('bot_worker_pending_updates', '워커에서 처리 중인 업데이트 수', worker_metric('pending')))
+    registry.register(Gauge('bot_worker_updates_total', '워커가 처리한 업데이트 수', worker_metric('handled'), 'counter'))
+    registry.register(Gauge('bot_worker_restarts_total', '비정상 종료 후 다시 시작한 워커 수', lambda: worker_pool.restarts, 'counter'))
+
+def start_monitoring(port):
+    """지표 수집 서버를 시작합니다. (프로파일러는 설정 시에만 사용)"""
+    if not port:
+        return
+    profiler = None
+    if PROFILER_INTERVAL_MS > 0:
+        profiler = SamplingProfiler(threading.main_thread().ident, PROFILER_INTERVAL_MS / 1000)
+        profiler.start()
+        logger.info(f"샘플링 프로파일러 시작됨 ({PROFILER_INTERVAL_MS}ms 간격)")
+    start_metrics_server(port, profiler, get_health)
+    logger.info(f"지표 수집 서버 시작됨 (포트 {port})")
+
+def run_application(application):
+    """웹훅(Render) 또는 폴링으로 업데이트를 받기 시작합니다. 종료될 때까지 반환하지 않습니다."""
+    logger.info("봇이 메시지 대기 중...")
+    
+    # Render.com을 위한 웹훅 설정
+    if os.environ.get('RENDER'):
+        application.run_webhook(
+            listen="0.0.0.0",
+            port=PORT,
+            webhook_url=os.environ.get('RENDER_EXTERNAL_URL'),
+            allowed_updates=ALLOWED_UPDATES,
+        )
+    else:
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
+
+async def report_worker_health(index, runner):
+    """감독 프로세스에 워커 상태를 주기적으로 보고합니다."""
+    while True:
+        reported = await shared_cache.report_health(
+            index,
+            pid=os.getpid(),
+            pending=runner.pending,
+            handled=runner.handled,
+            inflight_fetches=len(inflight_fetches),
+            fetch_queue_depth=get_fetch_queue_depth(),
+            cache_entries=len(stock_cache),
+            chat_log_queue_depth=chat_log_writer.queue_depth(),
+            alerts=len(alert_index),
+        )
+        if not reported:
+            logger.warning("공유 캐시에 접속할 수 없어 워커 %s 상태 보고 실패", index)
+        await asyncio.sleep(WORKER_HEALTH_INTERVAL)
+
+async def serve_worker(index, update_queue):
+    """감독 프로세스가 넘겨준 업데이트를 받아 채팅별 순서를 지키며 처리합니다."""
+    application = Application.builder().token(BOT_TOKEN).updater(None).build()
+    application.add_handler(MessageHandler(ROUTED_UPDATES, handle_message))
+    runner = ChatOrderedRunner()
+    loop = asyncio.get_running_loop()
+    
+    async with application:
+        await application.start()
+        await shared_cache.connect()
+        await post_init(application)
+        start_background_task(report_worker_health(index, runner))
+        
+        while True:
+            payload = await loop.run_in_executor(None, update_queue.get)
+            if payload is None:
+                break
+            update = Update.de_json(json.loads(payload), application.bot)
+            chat_id = update.effective_chat.id if update.effective_chat else 0
+            runner.submit(chat_id, application.process_update, update)
+        
+        # 이미 받은 업데이트는 처리하고 종료
+        while runner.pending:
+            await asyncio.sleep(0.1)
+        await stop_background_tasks()
+        await application.stop()
+
+def run_worker(index, update_queue):
+    """워커 프로세스의 진입점입니다. 감독 프로세스에서 fork된 뒤 실행됩니다."""
+    global log_listener, shared_cache
+    ignore_interrupt()
+    # fork 후에는 부모의 로그 출력 스레드가 없으므로 다시 설정
+    log_listener = setup_logging(LOG_FORMAT, LOG_LEVEL, parse_sample_rates(LOG_SAMPLE))
+    shared_cache = SharedCacheClient(SHARED_CACHE_PATH, timeout=FETCH_TIMEOUT * 2)
+    
+    # 감독 프로세스에서 물려받은 DB 연결(재시작 시에는 유지보수 스레드가 쓰던 연결)은 버리고 새로 연결
+    chat_log_storage.after_fork()
+    alert_store.after_fork()
+    if chat_allowlist.store is not None:
+        chat_allowlist.store.after_fork()
+    
+    # 전체 Yahoo 요청 한도를 워커 수로 나눔
+    yahoo_limiter.rate = YF_RATE / WORKERS
+    yahoo_limiter.capacity = yahoo_limiter.tokens = max(1, YF_BURST // WORKERS)
+    
+    # 이 워커가 맡은 채팅의 알림만 감시
+    init_db()
+    init_alerts(lambda chat_id: shard_for(chat_id, WORKERS) == index)
+    init_allowlist()
+    # 워커마다 임시 파일을 따로 써서 재기록 중인 파일을 다른 워커가 가져가거나 지우지 않도록 함
+    chat_log_writer.spill_path = f"{CHAT_LOG_SPILL_PATH}.worker{index}"
+    chat_log_writer.start()
+    start_monitoring(METRICS_PORT and METRICS_PORT + 1 + index)
+    logger.info(f"워커 {index} 준비 완료 (PID {os.getpid()})")
+    
+    try:
+        asyncio.run(serve_worker(index, update_queue))
+    finally:
+        fetch_executor.shutdown(wait=False, cancel_futures=True)
+        chat_log_writer.close()
+        chat_log_storage.close()
+        logger.info(f"워커 {index} 종료, 채팅 로그 기록: {chat_log_writer.stats()}")
+        stop_listener(log_listener)
+
+async def dispatch_update(update, context):
+    """업데이트를 채팅 ID 기준으로 담당 워커에 넘깁니다. 미승인 채팅의 반복 메시지는 넘기기 전에 버립니다."""
+    chat_id = update.effective_chat.id
+    if chat_id not in chat_allowlist and not unauthorized_limiter.check(chat_id)[0]:
+        return
+    worker_pool.dispatch(chat_id, update.to_json())
+
+async def supervisor_post_init(application):
+    """감독 프로세스의 공유 캐시 서버와 워커 상태 확인을 시작합니다."""
+    await cache_server.start()
+    start_background_task(monitor_health())
+    if chat_allowlist.store is not None:
+        start_background_task(reload_allowlist())
+
+def run_supervisor():
+    """웹훅/폴링으로 받은 업데이트를 워커 프로세스에 나눠주고, 공유 캐시와 워커 상태를 관리합니다."""
+    global worker_pool, cache_server
+    if isinstance(chat_log_storage, FileChatLogStorage):
+        raise ValueError("file 채팅 로그 저장소는 WORKERS=1에서만 사용할 수 있습니다.")
+    
+    # 테이블 준비는 한 번만 하고, 워커가 각자 연결하도록 fork 전에 연결을 닫음
+    try:
+        alert_store.init()
     except Exception as e:
-        print(f"메시지 처리 중 에러 발생: {str(e)}")
-        print(traceback.format_exc())
-        logging.error(f"Error in handle_message: {str(e)}")
+        logger.error(f"가격 알림 초기화 실패: {str(e)}")
+    chat_log_storage.close()
+    
+    worker_pool = WorkerPool(WORKERS, run_worker)
+    worker_pool.start()
+    cache_server = CacheServer(stock_cache, SHARED_CACHE_PATH, lease_timeout=FETCH_TIMEOUT * 2)
+    logger.info(f"워커 {WORKERS}개 시작됨, 공유 캐시: {SHARED_CACHE_PATH}")
+    
+    # 파티션/보관 기간 정리는 감독 프로세스에서만 수행
+    init_db()
+    # 미승인 채팅의 반복 메시지를 워커에 넘기기 전에 거르기 위해 감독 프로세스도 허용 목록을 유지
+    init_allowlist()
+    maintenance_thread = threading.Thread(target=maintain_chat_logs, daemon=True)
+    maintenance_thread.start()
+    register_worker_metrics()
+    start_monitoring(METRICS_PORT)
+    
+    application = (
+        Application.builder().token(BOT_TOKEN)
+        .post_init(supervisor_post_init).post_stop(stop_background_tasks).build()
+    )
+    application.add_handler(MessageHandler(ROUTED_UPDATES, dispatch_update))
+    run_application(application)
+    
+    # 워커가 남은 업데이트를 처리하고 종료할 때까지 대기
+    worker_pool.stop()
+    cache_server.close()
+    chat_log_storage.close()
+    stop_listener(log_listener)
 
 def main():
     """봇을 실행합니다."""
@@ -392,29 +1681,43 @@ def main():
     
     # 데이터베이스 초기화
     init_db()
+    history_store.init()
+    
+    if WORKERS > 1:
+        run_supervisor()
+        return
+    
+    init_alerts()
+    init_allowlist()
+    chat_log_writer.start()
+    logger.info("채팅 로그 기록 스레드 시작됨")
+    maintenance_thread = threading.Thread(target=maintain_chat_logs, daemon=True)
+    maintenance_thread.start()
     
-    # 핑 스레드 시작
-    ping_thread = threading.Thread(target=ping_server, daemon=True)
-    ping_thread.start()
-    logger.info("핑 스레드 시작됨")
+    # 지표 수집 서버 시작
+    start_monitoring(METRICS_PORT)
     
-    application = Application.builder().token(BOT_TOKEN).build()
+    application = (
+        Application.builder().token(BOT_TOKEN)
+        .post_init(post_init).post_stop(stop_background_tasks).build()
+    )
     
     # 모든 메시지를 하나의 핸들러로 처리
-    application.add_handler(MessageHandler(filters.ALL, handle_message))
+    application.add_handler(MessageHandler(ROUTED_UPDATES, handle_message))
     
     # 봇 실행
-    logger.info("봇이 메시지 대기 중...")
-    
-    # Render.com을 위한 웹훅 설정
-    if os.environ.get('RENDER'):
-        application.run_webhook(
-            listen="0.0.0.0",
-            port=PORT,
-            webhook_url=os.environ.get('RENDER_EXTERNAL_URL')
-        )
-    else:
-        application.run_polling(allowed_updates=Update.ALL_TYPES)
+    run_application(application)
+
+    # 조회 스레드 풀 종료
+    fetch_executor.shutdown(wait=False, cancel_futures=True)
+
+    # 남은 채팅 로그 기록 후 종료
+    chat_log_writer.close()
+    chat_log_storage.close()
+    logger.info(f"채팅 로그 기록 종료: {chat_log_writer.stats()}")
+
+    # 남은 로그 출력
+    stop_listener(log_listener)
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main() 
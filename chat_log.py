@@ -0,0 +1,284 @@
+import os
+import json
+import queue
+import asyncio
+import logging
+import shutil
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# 큐가 가득 찼을 때의 처리 방식
+OVERFLOW_DROP = 'drop'    # 새 로그를 버림
+OVERFLOW_BLOCK = 'block'  # 자리가 날 때까지 잠시 기다린 뒤, 그래도 없으면 버림 (대기는 스레드에서)
+OVERFLOW_SPILL = 'spill'  # 로컬 파일에 임시 저장했다가 나중에 다시 기록 (파일 쓰기는 스레드에서)
+OVERFLOW_POLICIES = (OVERFLOW_DROP, OVERFLOW_BLOCK, OVERFLOW_SPILL)
+
+
+class ChatLogWriter:
+    """채팅 로그를 메모리 큐에 모았다가 백그라운드 스레드에서 묶음으로 기록합니다.
+
+    sink는 로그 딕셔너리 목록을 받아 한 번에 저장하는 함수이며, 실패 시 예외를 발생시켜야 합니다.
+    spill 정책에서는 임시 파일에 남은 로그를 새 로그 묶음 사이사이에 한 묶음씩 다시 기록합니다.
+    """
+
+    def __init__(self, sink, max_queue=10000, batch_size=200, flush_interval=2.0,
+                 overflow=OVERFLOW_DROP, block_timeout=0.05, spill_path='chat_logs.spill.jsonl',
+                 replay_interval=30.0):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"지원하지 않는 overflow 정책: {overflow}")
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.spill_path = spill_path
+        self.replay_interval = replay_interval
+        self._next_replay = 0.0
+        self._replay_file = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._spill_lock = threading.Lock()
+        # 큐가 가득 차서 임시 파일로 보낼 로그 (이벤트 루프 대신 spill 스레드가 파일에 씀)
+        self._spill_pending = []
+        self._spill_pending_lock = threading.Lock()
+        self._spill_wakeup = threading.Event()
+        self._thread = None
+        self._spill_thread = None
+        self.written = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.failed = 0
+
+    def start(self):
+        """기록 스레드를 시작합니다."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='chat-log-writer', daemon=True)
+        self._thread.start()
+        if self.overflow == OVERFLOW_SPILL:
+            self._spill_thread = threading.Thread(target=self._run_spill, name='chat-log-spill', daemon=True)
+            self._spill_thread.start()
+
+    async def submit(self, chat_data):
+        """로그를 큐에 넣습니다. 큐가 가득 차도 이벤트 루프를 막지 않습니다.
+
+        block 정책은 스레드에서 자리가 나기를 기다리는 동안 이 요청만 대기하고,
+        spill 정책은 로그를 spill 스레드에 넘기고 바로 반환합니다.
+        """
+        try:
+            self._queue.put_nowait(chat_data)
+            return True
+        except queue.Full:
+            pass
+
+        if self.overflow == OVERFLOW_BLOCK:
+            try:
+                await asyncio.to_thread(self._queue.put, chat_data, True, self.block_timeout)
+                return True
+            except queue.Full:
+                pass
+        elif self.overflow == OVERFLOW_SPILL:
+            with self._spill_pending_lock:
+                self._spill_pending.append(chat_data)
+            self._spill_wakeup.set()
+            return True
+        self.dropped += 1
+        if self.dropped % 1000 == 1:
+            logger.warning("채팅 로그 큐가 가득 차서 로그를 버림 (누적 %s건)", self.dropped)
+        return False
+
+    def queue_depth(self):
+        """기록 대기 중인 로그 수를 반환합니다."""
+        return self._queue.qsize()
+
+    def stats(self):
+        """기록 통계를 반환합니다."""
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'spilled': self.spilled,
+            'failed': self.failed,
+        }
+
+    def close(self, timeout=10):
+        """남은 로그를 모두 기록한 뒤 스레드를 종료합니다."""
+        self._stop.set()
+        if self._spill_thread is not None:
+            # 넘겨받은 로그를 파일에 다 쓴 뒤에 기록 스레드가 마지막 재기록을 하도록 먼저 종료
+            self._spill_wakeup.set()
+            self._spill_thread.join(timeout)
+            self._spill_thread = None
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.warning("채팅 로그 기록 종료 시간 초과, 남은 로그 %s건", self._queue.qsize())
+            self._thread = None
+        else:
+            # 스레드 없이 쌓인 로그도 마지막으로 기록
+            self._drain()
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+            if self.overflow == OVERFLOW_SPILL:
+                # 새 로그가 기다리고 있으면 한 묶음만, 한가하면 남은 만큼 다시 기록
+                while self._replay_spill() and self._queue.empty() and not self._stop.is_set():
+                    pass
+        self._drain()
+
+    def _run_spill(self):
+        while True:
+            self._spill_wakeup.wait()
+            self._spill_wakeup.clear()
+            self._spill_pending_rows()
+            if self._stop.is_set():
+                return
+
+    def _spill_pending_rows(self):
+        with self._spill_pending_lock:
+            rows, self._spill_pending = self._spill_pending, []
+        if rows:
+            self._spill(rows)
+
+    def _collect(self):
+        """배치 크기가 차거나 기록 주기가 지날 때까지 로그를 모읍니다."""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self):
+        """큐와 임시 파일에 남은 로그를 모두 기록합니다."""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                break
+            self._flush(batch)
+        if self.overflow == OVERFLOW_SPILL:
+            self._spill_pending_rows()
+            while self._replay_spill(force=True):
+                pass
+
+    def _flush(self, batch):
+        try:
+            self.sink(batch)
+            self.written += len(batch)
+        except Exception as e:
+            logger.error("채팅 로그 %s건 저장 실패: %s", len(batch), e)
+            if self.overflow == OVERFLOW_SPILL:
+                self._spill(batch)
+            else:
+                self.failed += len(batch)
+            return False
+        return True
+
+    def _spill(self, rows):
+        """로그를 JSON 줄 형식으로 임시 파일에 추가합니다."""
+        try:
+            with self._spill_lock:
+                with open(self.spill_path, 'a', encoding='utf-8') as f:
+                    for row in rows:
+                        f.write(json.dumps(row, default=str, ensure_ascii=False) + '\n')
+                self.spilled += len(rows)
+        except OSError as e:
+            logger.error("채팅 로그 임시 파일 저장 실패: %s", e)
+            self.dropped += len(rows)
+
+    def _replay_spill(self, force=False):
+        """임시 파일의 로그를 한 묶음 다시 기록하고, 더 남아 있으면 True를 반환합니다.
+
+        재기록은 replay_interval마다 시작하며(force면 바로), 실패하면 남은 로그를 임시 파일로
+        되돌립니다. 어떤 예외가 나도 기록 스레드는 계속 동작합니다.
+        """
+        try:
+            return self._replay_spill_batch(force)
+        except Exception as e:
+            logger.error("임시 파일 로그 재기록 실패: %s", e)
+            self._close_replay()
+            return False
+
+    def _replay_spill_batch(self, force):
+        replay_path = self.spill_path + '.replay'
+        if self._replay_file is None:
+            if not force and time.monotonic() < self._next_replay:
+                return False
+            # DB 장애 중 반복 시도 방지
+            self._next_replay = time.monotonic() + self.replay_interval
+            with self._spill_lock:
+                # 이전 실행에서 재기록 중 종료된 파일이 있으면 그것부터 처리
+                if not os.path.exists(replay_path):
+                    if not os.path.exists(self.spill_path):
+                        return False
+                    os.replace(self.spill_path, replay_path)
+            self._replay_file = open(replay_path, encoding='utf-8')
+
+        rows, lines = self._read_replay_batch()
+        if not rows:
+            self._close_replay()
+            os.remove(replay_path)
+            return False
+        try:
+            self.sink(rows)
+        except Exception as e:
+            logger.error("임시 파일 로그 재기록 실패: %s", e)
+            # 이번 묶음과 파일의 나머지를 임시 파일로 되돌림 (아직 임시 파일에 있는 로그이므로 spilled는 그대로)
+            with self._spill_lock, open(self.spill_path, 'a', encoding='utf-8') as f:
+                f.writelines(lines)
+                shutil.copyfileobj(self._replay_file, f)
+            self._close_replay()
+            os.remove(replay_path)
+            return False
+        self.written += len(rows)
+        # 이전 실행에서 남은 파일의 로그는 이번 실행의 spilled에 포함되지 않았으므로 0 아래로 내려가지 않게 함
+        with self._spill_lock:
+            self.spilled = max(0, self.spilled - len(rows))
+        return True
+
+    def _read_replay_batch(self):
+        """재기록 파일에서 로그를 최대 batch_size건 읽어 (로그 목록, 원래 줄 목록)을 반환합니다."""
+        rows = []
+        lines = []
+        skipped = 0
+        while len(rows) < self.batch_size:
+            line = self._replay_file.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            # 임시 파일에 쓰는 도중 종료되면 마지막 줄이 잘려 있을 수 있음
+            try:
+                row = json.loads(line)
+                if isinstance(row.get('timestamp'), str):
+                    row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+            except (ValueError, AttributeError):
+                skipped += 1
+                continue
+            rows.append(row)
+            lines.append(line if line.endswith('\n') else line + '\n')
+        if skipped:
+            logger.warning("임시 파일의 손상된 로그 %s줄 건너뜀", skipped)
+            self.dropped += skipped
+        return rows, lines
+
+    def _close_replay(self):
+        if self._replay_file is not None:
+            self._replay_file.close()
+            self._replay_file = None
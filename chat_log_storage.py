@@ -0,0 +1,344 @@
+import os
+import re
+import glob
+import gzip
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+# fork 전에 부모 프로세스가 열어 둔 연결 (자식에서 닫으면 부모의 세션까지 끊기므로 닫지 않고 참조만 유지)
+_inherited_connections = []
+
+
+# Postgres timestamptz 문자열의 소수 초와 시간대 (예: '2026-10-01 00:00:00.5+00', '+05:30')
+TIMESTAMP_TAIL_PATTERN = re.compile(r"(?<=\d{2}:\d{2}:\d{2})(\.\d+)?(?:([+-]\d{2}):?(\d{2})?)?$")
+
+
+def parse_timestamp(value):
+    """Postgres가 출력한 timestamptz 문자열을 aware datetime으로 변환합니다.
+
+    Python 3.11 미만의 fromisoformat은 '+00'처럼 분이 빠진 시간대와 3/6자리가 아닌 소수 초를
+    읽지 못하므로 먼저 '+00:00', 6자리로 맞춥니다. 시간대가 없으면 UTC로 봅니다.
+    """
+    value = value.strip("'")
+    match = TIMESTAMP_TAIL_PATTERN.search(value)
+    if match:
+        fraction, hours, minutes = match.groups()
+        fraction = (fraction + '000000')[:7] if fraction else ''
+        offset = f"{hours}:{minutes or '00'}" if hours else ''
+        value = f"{value[:match.start()]}{fraction}{offset}"
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def keep_inherited(connection):
+    """fork된 자식 프로세스가 물려받은 연결을 쓰지도, 닫지도 않도록 보관합니다."""
+    if connection is not None:
+        _inherited_connections.append(connection)
+
+
+class ChatLogStorage:
+    """채팅 로그 저장소 인터페이스입니다.
+
+    write는 로그 딕셔너리(timestamp, chat_id, user, message) 목록을 한 번에 저장하며,
+    실패 시 예외를 발생시켜야 합니다.
+    """
+
+    def init(self):
+        """테이블/파일 등 저장소를 준비합니다."""
+        raise NotImplementedError
+
+    def write(self, rows):
+        """로그 여러 건을 저장합니다."""
+        raise NotImplementedError
+
+    def maintain(self):
+        """보관 기간이 지난 로그 삭제 등 주기적인 정리 작업을 수행합니다."""
+
+    def close(self):
+        """연결 등 자원을 정리합니다."""
+
+    def after_fork(self):
+        """fork된 자식 프로세스에서 부모의 연결과 락을 버리고 init()에서 새로 연결하도록 합니다."""
+
+
+def month_start(dt):
+    """해당 월 1일 0시(UTC)를 반환합니다."""
+    return datetime(dt.year, dt.month, 1, tzinfo=timezone.utc)
+
+def next_month(dt):
+    """다음 달 1일 0시(UTC)를 반환합니다."""
+    return month_start(dt.replace(day=28) + timedelta(days=4))
+
+
+class PostgresChatLogStorage(ChatLogStorage):
+    """월 단위 파티션과 (chat_id, timestamp) 인덱스를 사용하는 PostgreSQL 저장소입니다.
+
+    기존의 파티션 없는 chat_logs 테이블은 chat_logs_legacy 파티션으로 붙여서 그대로 유지합니다.
+    """
+
+    # 파티션 경계 표현식 예: FOR VALUES FROM ('2026-10-01 00:00:00+00') TO ('2026-11-01 00:00:00+00')
+    BOUND_PATTERN = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+    def __init__(self, dsn, retention_days=90, premake_months=2, minconn=1, maxconn=10):
+        self.dsn = dsn
+        self.retention_days = retention_days
+        self.premake_months = premake_months
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.pool = None
+
+    def _get_pool(self):
+        if self.pool is None:
+            from psycopg2 import pool
+            self.pool = pool.ThreadedConnectionPool(minconn=self.minconn, maxconn=self.maxconn, dsn=self.dsn)
+        return self.pool
+
+    def execute(self, func):
+        """연결을 빌려 func(cur)를 실행하고 커밋합니다."""
+        db_pool = self._get_pool()
+        conn = db_pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                result = func(cur)
+            conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            db_pool.putconn(conn)
+
+    def init(self):
+        self.execute(self._migrate)
+        self.maintain()
+
+    def _migrate(self, cur):
+        """chat_logs를 파티션 테이블로 만들고, 기존 테이블이 있으면 파티션으로 붙입니다."""
+        cur.execute("""
+            SELECT c.relkind FROM pg_class c
+            WHERE c.relname = 'chat_logs' AND c.relnamespace = current_schema()::regnamespace
+        """)
+        row = cur.fetchone()
+        relkind = row[0] if row else None
+        if relkind == 'p':
+            return
+
+        if relkind == 'r':
+            logger.info("기존 chat_logs 테이블을 파티션 테이블로 전환합니다.")
+            cur.execute("ALTER TABLE chat_logs RENAME TO chat_logs_legacy")
+
+        cur.execute("""
+            CREATE TABLE chat_logs (
+                id SERIAL,
+                timestamp TIMESTAMP WITH TIME ZONE,
+                chat_id BIGINT,
+                username TEXT,
+                message TEXT
+            ) PARTITION BY RANGE (timestamp)
+        """)
+
+        if relkind == 'r':
+            # 기존 로그는 이번 달까지 legacy 파티션에 남기고, 새 파티션은 다음 달부터 만듦
+            cur.execute("""
+                SELECT setval(pg_get_serial_sequence('chat_logs', 'id'),
+                              COALESCE((SELECT max(id) FROM chat_logs_legacy), 0) + 1, false)
+            """)
+            cur.execute(
+                "ALTER TABLE chat_logs ATTACH PARTITION chat_logs_legacy FOR VALUES FROM (MINVALUE) TO (%s)",
+                (next_month(datetime.now(timezone.utc)),)
+            )
+
+        cur.execute("CREATE INDEX IF NOT EXISTS chat_logs_chat_id_timestamp_idx ON chat_logs (chat_id, timestamp)")
+
+    def _partitions(self, cur):
+        """(파티션 이름, 시작, 끝) 목록을 반환합니다. MINVALUE/MAXVALUE는 None입니다."""
+        cur.execute("""
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'chat_logs'::regclass
+        """)
+        partitions = []
+        for name, bound in cur.fetchall():
+            match = self.BOUND_PATTERN.search(bound or '')
+            if not match:
+                continue
+            start, end = (
+                None if value.endswith('VALUE') else parse_timestamp(value)
+                for value in match.groups()
+            )
+            partitions.append((name, start, end))
+        return partitions
+
+    def _maintain(self, cur):
+        now = datetime.now(timezone.utc)
+        partitions = self._partitions(cur)
+
+        # 앞으로 쓸 월 파티션을 미리 생성 (이미 범위가 덮여 있는 달은 건너뜀)
+        start = month_start(now)
+        for _ in range(self.premake_months + 1):
+            end = next_month(start)
+            covered = any(
+                (p_start is None or p_start < end) and (p_end is None or start < p_end)
+                for _, p_start, p_end in partitions
+            )
+            if not covered:
+                name = f"chat_logs_p{start:%Y%m}"
+                cur.execute(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF chat_logs FOR VALUES FROM (%s) TO (%s)",
+                    (start, end)
+                )
+                logger.info(f"채팅 로그 파티션 생성: {name}")
+            start = end
+
+        # 보관 기간이 지난 파티션은 통째로 삭제
+        if self.retention_days > 0:
+            cutoff = now - timedelta(days=self.retention_days)
+            for name, _, p_end in partitions:
+                if p_end is not None and p_end <= cutoff:
+                    cur.execute(f"DROP TABLE IF EXISTS {name}")
+                    logger.info(f"보관 기간이 지난 채팅 로그 파티션 삭제: {name}")
+
+    def maintain(self):
+        self.execute(self._maintain)
+
+    def write(self, rows):
+        from psycopg2.extras import execute_values
+
+        def insert(cur):
+            execute_values(cur, """
+                INSERT INTO chat_logs (timestamp, chat_id, username, message)
+                VALUES %s
+            """, [
+                (row['timestamp'], row['chat_id'], row['user'], row['message'])
+                for row in rows
+            ], page_size=len(rows))
+
+        self.execute(insert)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.closeall()
+            self.pool = None
+
+    def after_fork(self):
+        keep_inherited(self.pool)
+        self.pool = None
+
+
+class SQLiteChatLogStorage(ChatLogStorage):
+    """WAL 모드의 내장 SQLite 저장소입니다. 별도의 DB 서버 없이 동작합니다."""
+
+    def __init__(self, path='chat_logs.db', retention_days=90):
+        self.path = path
+        self.retention_days = retention_days
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def init(self):
+        # 기록 스레드와 정리 스레드에서 함께 쓰므로 락으로 보호
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS chat_logs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT,
+                    chat_id INTEGER,
+                    username TEXT,
+                    message TEXT
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS chat_logs_chat_id_timestamp_idx ON chat_logs (chat_id, timestamp)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS chat_logs_timestamp_idx ON chat_logs (timestamp)")
+            self.conn.commit()
+
+    def write(self, rows):
+        with self.lock:
+            self.conn.executemany(
+                "INSERT INTO chat_logs (timestamp, chat_id, username, message) VALUES (?, ?, ?, ?)",
+                [(row['timestamp'].isoformat(), row['chat_id'], row['user'], row['message']) for row in rows]
+            )
+            self.conn.commit()
+
+    def maintain(self):
+        if self.retention_days <= 0:
+            return
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat()
+        with self.lock:
+            deleted = self.conn.execute("DELETE FROM chat_logs WHERE timestamp < ?", (cutoff,)).rowcount
+            self.conn.commit()
+        if deleted:
+            logger.info(f"보관 기간이 지난 채팅 로그 {deleted}건 삭제")
+
+    def close(self):
+        if self.conn is not None:
+            with self.lock:
+                self.conn.close()
+            self.conn = None
+
+    def after_fork(self):
+        keep_inherited(self.conn)
+        self.conn = None
+        # fork 순간 다른 스레드가 잡고 있던 락은 자식에서 영원히 풀리지 않으므로 새로 만듦
+        self.lock = threading.Lock()
+
+
+class FileChatLogStorage(ChatLogStorage):
+    """일 단위로 파일을 바꿔가며 gzip으로 압축한 JSON 줄을 추가만 하는 저장소입니다.
+
+    배치마다 gzip 멤버를 하나씩 이어붙이므로 `zcat`으로 그대로 읽을 수 있습니다.
+    """
+
+    FILE_PATTERN = re.compile(r"chat_logs-(\d{8})\.jsonl\.gz$")
+
+    def __init__(self, directory='chat_logs', retention_days=90):
+        self.directory = directory
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+
+    def init(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+    def write(self, rows):
+        # 날짜별 파일로 나눠서 기록
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(row['timestamp'].strftime('%Y%m%d'), []).append(row)
+        with self._lock:
+            for day, day_rows in by_day.items():
+                path = os.path.join(self.directory, f"chat_logs-{day}.jsonl.gz")
+                data = ''.join(json.dumps(row, default=str, ensure_ascii=False) + '\n' for row in day_rows)
+                with gzip.open(path, 'ab') as f:
+                    f.write(data.encode('utf-8'))
+
+    def maintain(self):
+        if self.retention_days <= 0:
+            return
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).strftime('%Y%m%d')
+        for path in glob.glob(os.path.join(self.directory, 'chat_logs-*.jsonl.gz')):
+            match = self.FILE_PATTERN.search(path)
+            if match and match.group(1) < cutoff:
+                os.remove(path)
+                logger.info(f"보관 기간이 지난 채팅 로그 파일 삭제: {path}")
+
+
+def create_chat_log_storage(backend=None, retention_days=90):
+    """환경 변수 설정에 맞는 채팅 로그 저장소를 만듭니다.
+
+    backend를 지정하지 않으면 DATABASE_URL이 있을 때 postgres, 없으면 sqlite를 사용합니다.
+    """
+    dsn = os.getenv('DATABASE_URL')
+    backend = backend or ('postgres' if dsn else 'sqlite')
+    if backend == 'postgres':
+        return PostgresChatLogStorage(dsn, retention_days=retention_days)
+    if backend == 'sqlite':
+        return SQLiteChatLogStorage(os.getenv('CHAT_LOG_SQLITE_PATH', 'chat_logs.db'), retention_days=retention_days)
+    if backend == 'file':
+        return FileChatLogStorage(os.getenv('CHAT_LOG_FILE_DIR', 'chat_logs'), retention_days=retention_days)
+    raise ValueError(f"지원하지 않는 채팅 로그 저장소: {backend}")
@@ -0,0 +1,374 @@
+import os
+import json
+import time
+import signal
+import asyncio
+import logging
+import multiprocessing
+
+logger = logging.getLogger(__name__)
+
+
+def shard_for(chat_id, workers):
+    """채팅 ID를 담당할 워커 번호를 반환합니다. 같은 채팅은 항상 같은 워커로 갑니다."""
+    return chat_id % workers
+
+
+class Lease:
+    """한 워커가 티커를 조회하는 동안 다른 워커를 기다리게 하는 조회 권한입니다."""
+
+    def __init__(self, owner, timeout):
+        self.owner = owner
+        self.deadline = time.monotonic() + timeout
+        self.event = asyncio.Event()
+
+
+class CacheServer:
+    """유닉스 소켓으로 여러 워커가 함께 쓰는 시세 캐시 데몬입니다.
+
+    캐시에 없거나 곧 만료되는 티커는 처음 요청한 워커에게만 조회 권한(lease)을 주고,
+    나머지 워커는 그 결과가 저장될 때까지 기다리므로 티커당 Yahoo 조회는 한 번만 일어납니다.
+    조회한 워커가 실패하거나 연결이 끊기면 기다리던 워커 중 하나가 권한을 넘겨받습니다.
+
+    여러 티커를 한 번에 조회할 때는 acquire_batch로 캐시 결과와 조회 권한을 기다리지 않고 한 번에 받고,
+    다른 워커가 조회 중인 티커는 자기 권한을 모두 처리한 뒤 wait로 기다립니다.
+    권한을 가진 채로 다른 권한을 기다리지 않으므로 워커끼리 서로의 권한을 기다리며 멈추지 않습니다.
+
+    프로토콜은 JSON 한 줄 요청/응답입니다.
+    - acquire {key, min_ttl} -> {hit, data, error, ttl} 또는 {hit: false} (조회 권한 획득)
+    - acquire_batch {keys, min_ttl} -> {results: {key: {hit, ...} | {lease: true} | {busy: true}}} (기다리지 않음)
+    - wait {key, min_ttl} -> {hit, data, error, ttl} 또는 {hit: false} (조회 권한 없이 결과만 기다림)
+    - set {key, data, ttl}, set_error {key, error}, release {key}, health {worker, ...}: 응답 없음
+    """
+
+    def __init__(self, cache, path, lease_timeout=30):
+        self.cache = cache
+        self.path = path
+        self.lease_timeout = lease_timeout
+        self.leases = {}
+        self.health = {}  # 워커 번호 -> 마지막 상태 보고
+        self._server = None
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    async def _handle(self, reader, writer):
+        owner = object()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = json.loads(line)
+                op = request['op']
+                if op in ('acquire', 'wait'):
+                    # 결과를 기다리는 동안에도 같은 연결의 다른 요청을 처리하도록 별도 작업으로 실행
+                    asyncio.ensure_future(self._acquire(request, owner, writer, grant=op == 'acquire'))
+                elif op == 'acquire_batch':
+                    self._reply(writer, self._acquire_batch(request, owner))
+                elif op == 'set':
+                    self.cache.set(request['key'], request['data'], request['ttl'])
+                    self._release(request['key'])
+                elif op == 'set_error':
+                    self.cache.set_error(request['key'], request['error'])
+                    self._release(request['key'])
+                elif op == 'release':
+                    self._release(request['key'])
+                elif op == 'health':
+                    request['received'] = time.monotonic()
+                    self.health[request['worker']] = request
+        except (ConnectionError, json.JSONDecodeError) as e:
+            logger.warning("공유 캐시 연결 오류: %s", e)
+        finally:
+            # 연결이 끊긴 워커가 가진 조회 권한은 바로 풀어줌
+            for key in [key for key, lease in self.leases.items() if lease.owner is owner]:
+                self._release(key)
+            writer.close()
+
+    def _lookup(self, key, min_ttl):
+        """남은 시간이 min_ttl 이상인 캐시 결과를 응답 형식으로 반환합니다. 없으면 None입니다."""
+        entry, state = self.cache.lookup(key)
+        if state == self.cache.FRESH and (entry['error'] or self.cache.expires_in(key) >= min_ttl):
+            return {'hit': True, 'data': entry['data'], 'error': entry['error'], 'ttl': self.cache.expires_in(key)}
+        return None
+
+    def _live_lease(self, key):
+        lease = self.leases.get(key)
+        if lease is not None and lease.deadline > time.monotonic():
+            return lease
+        return None
+
+    async def _acquire(self, request, owner, writer, grant=True):
+        key = request['key']
+        min_ttl = request.get('min_ttl', 0)
+        while True:
+            reply = self._lookup(key, min_ttl)
+            if reply is not None:
+                break
+            lease = self._live_lease(key)
+            if lease is None:
+                if grant:
+                    self.leases[key] = Lease(owner, self.lease_timeout)
+                reply = {'hit': False}
+                break
+            try:
+                await asyncio.wait_for(lease.event.wait(), lease.deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                pass
+        reply['id'] = request['id']
+        if not self._reply(writer, reply) and grant and not reply['hit']:
+            self._release(key)
+
+    def _acquire_batch(self, request, owner):
+        """티커별로 캐시 결과, 조회 권한, 다른 워커가 조회 중(busy) 중 하나를 바로 돌려줍니다."""
+        min_ttl = request.get('min_ttl', 0)
+        results = {}
+        for key in request['keys']:
+            reply = self._lookup(key, min_ttl)
+            if reply is None:
+                if self._live_lease(key) is None:
+                    self.leases[key] = Lease(owner, self.lease_timeout)
+                    reply = {'lease': True}
+                else:
+                    reply = {'busy': True}
+            results[key] = reply
+        return {'id': request['id'], 'results': results}
+
+    def _reply(self, writer, reply):
+        try:
+            writer.write((json.dumps(reply) + '\n').encode('utf-8'))
+            return True
+        except Exception as e:
+            logger.warning("공유 캐시 응답 실패: %s", e)
+            return False
+
+    def _release(self, key):
+        lease = self.leases.pop(key, None)
+        if lease is not None:
+            lease.event.set()
+
+
+class SharedCacheClient:
+    """워커에서 CacheServer에 접속하는 클라이언트입니다. 연결이 끊기면 다음 요청 때 다시 접속합니다."""
+
+    def __init__(self, path, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._pending = {}
+        self._next_id = 0
+        self._connect_lock = None
+        self.leases = set()  # 이 워커가 조회 권한을 가진 키
+
+    async def connect(self, retries=50, delay=0.2):
+        """공유 캐시에 접속합니다. 감독 프로세스의 서버가 아직 준비되지 않았으면 잠시 기다렸다 다시 시도합니다."""
+        if self._writer is not None:
+            return
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            for attempt in range(retries):
+                if self._writer is not None:
+                    return
+                try:
+                    self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+                    self._reader_task = asyncio.ensure_future(self._read_replies())
+                    return
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if attempt == retries - 1:
+                        raise
+                    await asyncio.sleep(delay)
+
+    async def _read_replies(self):
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                reply = json.loads(line)
+                future = self._pending.pop(reply.pop('id'), None)
+                if future is not None and not future.done():
+                    future.set_result(reply)
+        finally:
+            writer, self._writer = self._writer, None
+            if writer is not None:
+                writer.close()
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("공유 캐시 연결이 끊겼습니다."))
+            self._pending.clear()
+
+    def _send(self, request):
+        if self._writer is None:
+            return False
+        self._writer.write((json.dumps(request, default=str) + '\n').encode('utf-8'))
+        return True
+
+    async def _request(self, request):
+        await self.connect(retries=1)
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._send({**request, 'id': request_id})
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def acquire(self, key, min_ttl=0):
+        """캐시된 결과를 반환하거나, 조회 권한을 얻으면 None을 반환합니다."""
+        reply = await self._request({'op': 'acquire', 'key': key, 'min_ttl': min_ttl})
+        if reply['hit']:
+            return reply
+        self.leases.add(key)
+        return None
+
+    async def acquire_batch(self, keys, min_ttl=0):
+        """(캐시 결과 딕셔너리, 조회 권한을 얻은 키 목록, 다른 워커가 조회 중인 키 목록)을 반환합니다.
+
+        기다리지 않고 바로 응답하므로, busy인 키는 권한을 얻은 키를 모두 처리한 뒤 wait로 기다려야 합니다.
+        """
+        reply = await self._request({'op': 'acquire_batch', 'keys': list(keys), 'min_ttl': min_ttl})
+        hits, leased, busy = {}, [], []
+        for key, result in reply['results'].items():
+            if result.get('hit'):
+                hits[key] = result
+            elif result.get('lease'):
+                self.leases.add(key)
+                leased.append(key)
+            else:
+                busy.append(key)
+        return hits, leased, busy
+
+    async def wait(self, key, min_ttl=0):
+        """다른 워커의 조회가 끝날 때까지 기다려 결과를 반환합니다. 조회 권한은 얻지 않으며, 결과가 없으면 None입니다."""
+        reply = await self._request({'op': 'wait', 'key': key, 'min_ttl': min_ttl})
+        return reply if reply['hit'] else None
+
+    def set(self, key, data, ttl):
+        self.leases.discard(key)
+        self._send({'op': 'set', 'key': key, 'data': data, 'ttl': ttl})
+
+    def set_error(self, key, error):
+        self.leases.discard(key)
+        self._send({'op': 'set_error', 'key': key, 'error': error})
+
+    def release(self, key):
+        """조회에 실패했을 때 가진 조회 권한을 돌려줍니다. 권한이 없으면 아무것도 하지 않습니다."""
+        if key in self.leases:
+            self.leases.discard(key)
+            self._send({'op': 'release', 'key': key})
+
+    async def report_health(self, worker, **status):
+        """워커 상태를 보고합니다. 연결이 끊겼으면 다시 접속한 뒤 보내며, 접속하지 못하면 False를 반환합니다.
+
+        상태 보고는 한가한 워커가 보내는 유일한 메시지이므로, 다른 요청을 기다리지 않고 여기서 다시 접속합니다.
+        """
+        try:
+            await self.connect(retries=1)
+        except OSError:
+            return False
+        return self._send({'op': 'health', 'worker': worker, **status})
+
+
+class ChatOrderedRunner:
+    """업데이트를 동시에 처리하되, 같은 채팅의 업데이트는 들어온 순서대로 하나씩 처리합니다."""
+
+    def __init__(self):
+        self._tails = {}  # 채팅 ID -> 마지막으로 예약된 작업
+        self.pending = 0
+        self.handled = 0
+
+    def submit(self, chat_id, coro_func, *args):
+        previous = self._tails.get(chat_id)
+        task = asyncio.ensure_future(self._run(previous, coro_func, *args))
+        self._tails[chat_id] = task
+        self.pending += 1
+        task.add_done_callback(lambda t: self._done(chat_id, t))
+        return task
+
+    async def _run(self, previous, coro_func, *args):
+        if previous is not None:
+            # 앞 작업의 성공 여부와 관계없이 끝날 때까지만 기다림
+            await asyncio.wait([previous])
+        await coro_func(*args)
+
+    def _done(self, chat_id, task):
+        self.pending -= 1
+        self.handled += 1
+        if self._tails.get(chat_id) is task:
+            del self._tails[chat_id]
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("업데이트 처리 실패 (채팅 ID %s): %s", chat_id, task.exception())
+
+
+class WorkerPool:
+    """업데이트를 채팅 ID로 나눠 받는 워커 프로세스 묶음입니다.
+
+    워커는 fork로 시작되며 target(번호, 업데이트 큐)을 실행합니다. 업데이트 큐에 None을 넣으면 종료합니다.
+    """
+
+    def __init__(self, count, target):
+        self.count = count
+        self.target = target
+        self.context = multiprocessing.get_context('fork')
+        self.queues = [self.context.Queue() for _ in range(count)]
+        self.processes = [None] * count
+        self.restarts = 0
+
+    def _spawn(self, index):
+        process = self.context.Process(
+            target=self.target, args=(index, self.queues[index]), name=f'bot-worker-{index}', daemon=True
+        )
+        process.start()
+        self.processes[index] = process
+        logger.info(f"워커 {index} 시작 (PID {process.pid})")
+
+    def start(self):
+        for index in range(self.count):
+            self._spawn(index)
+
+    def dispatch(self, chat_id, payload):
+        self.queues[shard_for(chat_id, self.count)].put(payload)
+
+    def check(self):
+        """종료된 워커를 다시 시작합니다. 큐에 남은 업데이트는 새 워커가 이어서 처리합니다."""
+        for index, process in enumerate(self.processes):
+            if process is not None and not process.is_alive():
+                logger.error(f"워커 {index} 비정상 종료 (종료 코드 {process.exitcode}), 다시 시작합니다.")
+                self.restarts += 1
+                self._spawn(index)
+
+    def alive(self):
+        return [process is not None and process.is_alive() for process in self.processes]
+
+    def stop(self, timeout=10):
+        """워커에 종료를 알리고 남은 업데이트 처리를 기다립니다."""
+        for q in self.queues:
+            q.put(None)
+        deadline = time.monotonic() + timeout
+        for index, process in enumerate(self.processes):
+            if process is None:
+                continue
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"워커 {index} 종료 시간 초과, 강제 종료합니다.")
+                process.terminate()
+                process.join(1)
+
+
+def ignore_interrupt():
+    """워커는 Ctrl+C를 무시하고 감독 프로세스의 종료 신호(None)로만 종료합니다."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
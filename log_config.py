@@ -0,0 +1,123 @@
+import sys
+import json
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+# 로그 출력 형식
+LOG_FORMAT_TEXT = 'text'  # 사람이 읽는 한 줄 형식
+LOG_FORMAT_JSON = 'json'  # 이벤트당 JSON 한 줄
+LOG_FORMATS = (LOG_FORMAT_TEXT, LOG_FORMAT_JSON)
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def parse_sample_rates(value):
+    """"이벤트=N,이벤트=N" 형식의 설정을 {이벤트: N} 딕셔너리로 변환합니다."""
+    rates = {}
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        event, _, every = item.partition('=')
+        rates[event.strip()] = max(1, int(every))
+    return rates
+
+
+class LogSampler:
+    """자주 발생하는 이벤트를 N건 중 1건만 남기도록 거릅니다.
+
+    설정되지 않은 이벤트는 모두 남깁니다. 카운터 기반이라 결과가 재현 가능합니다.
+    """
+
+    def __init__(self, rates=None):
+        self.rates = dict(rates or {})
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def keep(self, event):
+        every = self.rates.get(event)
+        if every is None or every <= 1:
+            return True
+        with self._lock:
+            count = self._counts.get(event, 0)
+            self._counts[event] = count + 1
+        return count % every == 0
+
+
+sampler = LogSampler()
+
+
+def log_event(logger, level, event, msg, *args, **fields):
+    """구조화된 이벤트 로그를 남깁니다.
+
+    레벨이 꺼져 있거나 샘플링에서 제외되면 LogRecord를 만들지 않고 바로 반환합니다.
+    msg는 %-형식이며 실제 문자열 변환은 로그 출력 스레드에서 이뤄집니다.
+    """
+    if not logger.isEnabledFor(level) or not sampler.keep(event):
+        return
+    logger.log(level, msg, *args, extra={'event': event, 'fields': fields}, stacklevel=2)
+
+
+class JsonFormatter(logging.Formatter):
+    """로그 레코드를 JSON 한 줄로 변환합니다. log_event의 필드는 최상위 키로 들어갑니다."""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': getattr(record, 'event', None),
+            'msg': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            data.update(fields)
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class LazyQueueHandler(QueueHandler):
+    """레코드를 문자열로 바꾸지 않고 그대로 큐에 넣는 QueueHandler입니다.
+
+    기본 QueueHandler.prepare는 호출한 스레드에서 메시지와 예외 추적을 미리 포맷하므로,
+    같은 프로세스 안의 큐에서는 이를 건너뛰어 포맷 비용을 출력 스레드로 넘깁니다.
+    인자로는 이후에 바뀌지 않는 값(문자열, 숫자 등)만 넘겨야 합니다.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(log_format=LOG_FORMAT_TEXT, level=logging.INFO, sample_rates=None, stream=None):
+    """루트 로거가 큐에만 넣고, 별도 스레드가 stream에 출력하도록 설정합니다.
+
+    시작된 QueueListener를 반환합니다. 종료 시 stop()을 호출하면 남은 로그를 모두 출력합니다.
+    """
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"지원하지 않는 로그 형식: {log_format}")
+    sampler.rates = dict(sample_rates or {})
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if log_format == LOG_FORMAT_JSON else logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(LazyQueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener = QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_listener, listener)
+    return listener
+
+
+def stop_listener(listener):
+    """남은 로그를 출력하고 출력 스레드를 종료합니다. 여러 번 호출해도 됩니다."""
+    if listener._thread is not None:
+        listener.stop()
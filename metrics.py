@@ -0,0 +1,235 @@
+import sys
+import json
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# 기본 지연 시간 구간 (초)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+class Counter:
+    """라벨별로 누적되는 카운터입니다."""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{format_labels(key)} {value}")
+        return lines
+
+
+class Gauge:
+    """수집 시점에 함수를 호출해서 값을 읽는 게이지입니다.
+
+    func는 숫자 또는 {라벨 딕셔너리의 튜플: 값} 형태를 반환할 수 있습니다.
+    """
+
+    def __init__(self, name, help_text, func, metric_type='gauge'):
+        self.name = name
+        self.help_text = help_text
+        self.func = func
+        self.metric_type = metric_type
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        try:
+            value = self.func()
+        except Exception as e:
+            logger.error(f"지표 {self.name} 수집 실패: {str(e)}")
+            return lines
+        if isinstance(value, dict):
+            for key, item in value.items():
+                lines.append(f"{self.name}{format_labels(key)} {item}")
+        else:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+
+class Histogram:
+    """라벨별 누적 구간 히스토그램입니다."""
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}  # 라벨 -> [구간별 개수, 합계, 개수]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if i < len(self.buckets):
+                series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in self._series.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{format_labels(key + (('le', f'{bound:g}'),))} {cumulative}")
+                lines.append(f"{self.name}_bucket{format_labels(key + (('le', '+Inf'),))} {count}")
+                lines.append(f"{self.name}_sum{format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{format_labels(key)} {count}")
+        return lines
+
+
+class Registry:
+    """지표 목록을 모아 Prometheus 텍스트 형식으로 출력합니다."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# 메시지 처리 단계별 소요 시간
+STAGE_DURATION = registry.register(Histogram(
+    'bot_stage_duration_seconds', '메시지 처리 단계별 소요 시간'))
+# Yahoo 요청 실패 (종류: rate_limit, timeout, error)
+UPSTREAM_ERRORS = registry.register(Counter(
+    'bot_upstream_errors_total', 'Yahoo 요청 실패 횟수'))
+# 이벤트 루프 지연
+LOOP_LAG = registry.register(Histogram(
+    'bot_event_loop_lag_seconds', '이벤트 루프 예약 지연 시간'))
+
+
+@contextmanager
+def stage_timer(stage):
+    """with 블록의 소요 시간을 단계별 히스토그램에 기록합니다."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, stage=stage)
+
+
+async def monitor_loop_lag(interval=0.5):
+    """예약한 시각보다 얼마나 늦게 깨어나는지로 이벤트 루프 지연을 측정합니다."""
+    import asyncio
+
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, time.perf_counter() - start - interval))
+
+
+class SamplingProfiler:
+    """지정한 스레드의 호출 스택을 주기적으로 샘플링해서 느린 코드 경로를 찾습니다.
+
+    결과는 flamegraph 도구에서 쓰는 folded stack 형식(호출;...;함수 개수)입니다.
+    """
+
+    def __init__(self, thread_id, interval=0.01, max_depth=30):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = {}
+        self.total = 0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            key = ';'.join(reversed(stack))
+            self.samples[key] = self.samples.get(key, 0) + 1
+            self.total += 1
+
+    def report(self, top=50):
+        """샘플 수가 많은 스택 순서로 반환합니다."""
+        ranked = sorted(self.samples.items(), key=lambda item: item[1], reverse=True)[:top]
+        lines = [f"# samples={self.total} interval={self.interval}s"]
+        lines.extend(f"{stack} {count}" for stack, count in ranked)
+        return '\n'.join(lines) + '\n'
+
+
+def start_metrics_server(port, profiler=None, health=None, host='0.0.0.0'):
+    """/metrics (및 프로파일러 사용 시 /debug/profile) HTTP 서버를 백그라운드 스레드로 시작합니다.
+
+    health는 (정상 여부, 상태 딕셔너리)를 반환하는 함수이며, 지정하면 /healthz에서 JSON으로 제공합니다.
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            code = 200
+            if self.path == '/metrics':
+                body = registry.render()
+                content_type = 'text/plain; version=0.0.4; charset=utf-8'
+            elif self.path == '/debug/profile' and profiler is not None:
+                body = profiler.report()
+                content_type = 'text/plain; charset=utf-8'
+            elif self.path == '/healthz' and health is not None:
+                ok, status = health()
+                body = json.dumps(status, default=str, ensure_ascii=False)
+                content_type = 'application/json; charset=utf-8'
+                code = 200 if ok else 503
+            else:
+                self.send_error(404)
+                return
+            data = body.encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            # 수집 요청마다 로그를 남기지 않음
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+    thread.start()
+    return server
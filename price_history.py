@@ -0,0 +1,278 @@
+import io
+import os
+import re
+import json
+import time
+import fcntl
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+# 저장 열 순서 (날짜는 1970-01-01부터의 일 수)
+COLUMNS = ('date', 'open', 'high', 'low', 'close', 'volume')
+DATE, OPEN, HIGH, LOW, CLOSE, VOLUME = range(len(COLUMNS))
+
+# 조회 기간 -> 일 수 (ytd/max는 따로 계산)
+PERIODS = {
+    '1mo': 31,
+    '3mo': 92,
+    '6mo': 183,
+    '1y': 366,
+    '2y': 731,
+    '5y': 1827,
+    '10y': 3653,
+}
+PERIOD_YTD = 'ytd'
+PERIOD_MAX = 'max'
+MAX_START = date(1970, 1, 1)
+
+# 1년 거래일 수 (연율화 기준)
+TRADING_DAYS = 252
+
+# 예: "/chart $AAPL 6mo", "/stats AAPL 1y", "/chart $005930.KS"
+HISTORY_COMMAND_PATTERN = re.compile(
+    r"^/(?P<command>chart|stats)\s+\$?(?P<ticker>[A-Za-z0-9.\-=^]+)(?:\s+(?P<period>\w+))?\s*$",
+    re.IGNORECASE,
+)
+
+
+def parse_history_command(text, default_period):
+    """차트/통계 명령어를 (명령어, 티커, 기간)으로 변환합니다. 형식이 틀리면 None을 반환합니다."""
+    match = HISTORY_COMMAND_PATTERN.match(text.strip())
+    if not match:
+        return None
+    period = (match.group('period') or default_period).lower()
+    if period not in PERIODS and period not in (PERIOD_YTD, PERIOD_MAX):
+        return None
+    return match.group('command').lower(), match.group('ticker').upper(), period
+
+
+def period_start(period, today):
+    """기간의 시작 날짜를 반환합니다."""
+    if period == PERIOD_MAX:
+        return MAX_START
+    if period == PERIOD_YTD:
+        return date(today.year, 1, 1)
+    return today - timedelta(days=PERIODS[period])
+
+
+def to_day(value):
+    return (value - MAX_START).days
+
+
+def from_day(day):
+    return MAX_START + timedelta(days=int(day))
+
+
+def frame_to_columns(frame):
+    """yfinance history 결과(DataFrame)를 (열 수, 행 수) 배열로 변환합니다."""
+    if frame is None or frame.empty:
+        return np.empty((len(COLUMNS), 0))
+    index = frame.index
+    if getattr(index, 'tz', None) is not None:
+        # 거래소 현지 날짜 기준으로 저장
+        index = index.tz_localize(None)
+    days = index.values.astype('datetime64[D]').astype(np.int64)
+    data = np.empty((len(COLUMNS), len(frame)))
+    data[DATE] = days
+    for row, name in ((OPEN, 'Open'), (HIGH, 'High'), (LOW, 'Low'), (CLOSE, 'Close'), (VOLUME, 'Volume')):
+        data[row] = frame[name].to_numpy(dtype=float) if name in frame else np.nan
+    # 거래가 없던 행(종가 없음)은 제외
+    return data[:, ~np.isnan(data[CLOSE])]
+
+
+def last_split_day(frame):
+    """조회 구간의 마지막 주식 분할 날짜(1970-01-01부터의 일 수)를 반환합니다. 분할이 없으면 None입니다."""
+    if frame is None or frame.empty or 'Stock Splits' not in frame:
+        return None
+    splits = frame.index[frame['Stock Splits'].to_numpy(dtype=float) > 0]
+    if not len(splits):
+        return None
+    if getattr(splits, 'tz', None) is not None:
+        splits = splits.tz_localize(None)
+    return int(splits.values.astype('datetime64[D]').astype(np.int64).max())
+
+
+class PriceHistoryStore:
+    """티커별 일봉(OHLCV)을 열 단위로 저장하는 디스크 저장소입니다.
+
+    티커마다 (열 수, 행 수) float64 배열 하나를 .npy로 저장하므로 각 열이 파일 안에서 연속되어 있고,
+    읽을 때는 메모리 맵으로 필요한 열만 읽습니다. 갱신은 임시 파일에 쓴 뒤 교체해서 읽는 쪽이 깨진 파일을 보지 않습니다.
+    옆의 .json에는 조회를 마친 구간(start, end)과 마지막 조회 시각을 기록해서, 없는 구간만 다시 조회합니다.
+    """
+
+    def __init__(self, directory, refresh_after=3600):
+        self.directory = directory
+        self.refresh_after = refresh_after
+        self._lock = threading.Lock()
+
+    def init(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _paths(self, ticker):
+        # 티커에 '^' 등이 들어가도 파일 이름으로 쓸 수 있게 변환
+        name = re.sub(r'[^A-Za-z0-9.\-=]', '_', ticker)
+        base = os.path.join(self.directory, name)
+        return base + '.npy', base + '.json'
+
+    def load(self, ticker):
+        """(배열, 메타데이터)를 반환합니다. 배열은 읽기 전용 메모리 맵이며 없으면 (None, None)입니다."""
+        data_path, meta_path = self._paths(ticker)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            return np.load(data_path, mmap_mode='r'), meta
+        except (FileNotFoundError, ValueError):
+            return None, None
+
+    def missing_ranges(self, ticker, start, today):
+        """조회해야 할 [시작, 끝) 날짜 구간 목록을 반환합니다."""
+        _, meta = self.load(ticker)
+        end = today + timedelta(days=1)
+        if meta is None:
+            return [(start, end)]
+        ranges = []
+        covered_start = date.fromisoformat(meta['start'])
+        covered_end = date.fromisoformat(meta['end'])
+        if start < covered_start:
+            ranges.append((start, covered_start))
+        # 마지막 일봉은 장중에 바뀌므로 날짜가 지났거나 갱신 주기가 지나면 마지막 저장일부터 다시 조회
+        if covered_end < end or time.time() - meta['fetched_at'] > self.refresh_after:
+            last_day = meta.get('last_day')
+            ranges.append((from_day(last_day) if last_day is not None else covered_start, end))
+        return ranges
+
+    def merge(self, ticker, rows, start, end, replace=False, currency=None):
+        """새로 조회한 일봉을 기존 데이터와 합쳐 저장합니다. 같은 날짜는 새 값을 사용합니다.
+
+        replace가 True면(주식 분할 등으로 과거 가격이 바뀐 경우) 기존 데이터를 버립니다.
+        저장된 데이터가 없는 티커의 빈 결과(잘못된 티커 등)는 저장하지 않고 False를 반환합니다.
+        """
+        data_path, meta_path = self._paths(ticker)
+        if not rows.shape[1] and (replace or self.load(ticker)[1] is None):
+            return False
+        # 여러 워커 프로세스가 같은 티커를 동시에 갱신해도 배열과 메타데이터가 어긋나지 않도록 파일 잠금
+        with self._lock, open(data_path + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            existing, meta = (None, None) if replace else self.load(ticker)
+            if existing is not None and existing.shape[1]:
+                combined = np.concatenate([np.asarray(existing), rows], axis=1)
+            else:
+                combined = rows
+            # 뒤에 붙은 새 값을 우선하도록 뒤집어서 날짜별 첫 항목을 고름
+            _, first = np.unique(combined[DATE][::-1], return_index=True)
+            merged = combined[:, combined.shape[1] - 1 - first]
+
+            covered_start, covered_end = start, end
+            if meta is not None:
+                covered_start = min(covered_start, date.fromisoformat(meta['start']))
+                covered_end = max(covered_end, date.fromisoformat(meta['end']))
+            new_meta = {
+                'start': covered_start.isoformat(),
+                'end': covered_end.isoformat(),
+                'last_day': int(merged[DATE][-1]) if merged.shape[1] else None,
+                'fetched_at': time.time(),
+                'currency': currency or (meta or {}).get('currency'),
+            }
+            self._write(data_path, meta_path, merged, new_meta)
+            return True
+
+    def _write(self, data_path, meta_path, data, meta):
+        tmp_data = f"{data_path}.{os.getpid()}.tmp"
+        with open(tmp_data, 'wb') as f:
+            np.save(f, np.ascontiguousarray(data))
+        os.replace(tmp_data, data_path)
+        tmp_meta = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, meta_path)
+
+    def read(self, ticker, start):
+        """start 이후 일봉 배열과 메타데이터를 반환합니다. 메모리 맵에서 필요한 구간만 복사합니다."""
+        data, meta = self.load(ticker)
+        if data is None or not data.shape[1]:
+            return np.empty((len(COLUMNS), 0)), meta
+        first = np.searchsorted(data[DATE], to_day(start))
+        return np.array(data[:, first:]), meta
+
+
+def moving_average(values, window):
+    """단순 이동평균을 반환합니다. 길이는 len(values) - window + 1입니다."""
+    if len(values) < window:
+        return np.empty(0)
+    cumsum = np.cumsum(np.insert(values, 0, 0.0))
+    return (cumsum[window:] - cumsum[:-window]) / window
+
+
+def compute_stats(data):
+    """일봉 배열로 수익률, 변동성, 이동평균, 최대 낙폭 등 요약 통계를 계산합니다."""
+    close = data[CLOSE]
+    if len(close) < 2:
+        return None
+    log_returns = np.diff(np.log(close))
+    days = len(log_returns)
+    volatility = log_returns.std(ddof=1) * np.sqrt(TRADING_DAYS) if days > 1 else 0.0
+    mean_return = log_returns.mean()
+
+    # 최대 낙폭: 직전 고점 대비 가장 크게 떨어진 구간
+    running_max = np.maximum.accumulate(close)
+    drawdown = close / running_max - 1
+    trough = int(drawdown.argmin())
+    peak = int(close[:trough + 1].argmax())
+
+    stats = {
+        'start_day': from_day(data[DATE][0]),
+        'end_day': from_day(data[DATE][-1]),
+        'days': len(close),
+        'first_close': close[0],
+        'last_close': close[-1],
+        'total_return': close[-1] / close[0] - 1,
+        'annual_return': np.exp(mean_return * TRADING_DAYS) - 1,
+        'volatility': volatility,
+        'sharpe': mean_return / log_returns.std(ddof=1) * np.sqrt(TRADING_DAYS) if volatility else None,
+        'high': np.nanmax(data[HIGH]),
+        'low': np.nanmin(data[LOW]),
+        'max_drawdown': drawdown[trough],
+        'drawdown_peak': from_day(data[DATE][peak]),
+        'drawdown_trough': from_day(data[DATE][trough]),
+        'avg_volume': np.nanmean(data[VOLUME]),
+        'moving_averages': {},
+    }
+    for window in (20, 50, 200):
+        ma = moving_average(close, window)
+        if len(ma):
+            stats['moving_averages'][window] = ma[-1]
+    return stats
+
+
+def render_chart(ticker, period, data, currency_symbol=''):
+    """종가, 이동평균, 거래량 차트를 PNG 바이트로 그립니다. (matplotlib 필요, 블로킹 호출)"""
+    # pyplot의 전역 상태를 쓰지 않아 여러 스레드에서 동시에 그려도 안전
+    from matplotlib.figure import Figure
+    import matplotlib.dates as mdates
+
+    dates = data[DATE].astype('datetime64[D]')
+    close = data[CLOSE]
+    figure = Figure(figsize=(8, 4.5), dpi=100)
+    price_ax, volume_ax = figure.subplots(2, 1, sharex=True, gridspec_kw={'height_ratios': [3, 1]})
+
+    price_ax.plot(dates, close, color='#1f77b4', linewidth=1.4, label='Close')
+    for window, color in ((20, '#ff7f0e'), (50, '#2ca02c'), (200, '#d62728')):
+        # 기간의 절반 이상을 덮는 이동평균만 표시
+        if len(close) >= window * 2:
+            price_ax.plot(dates[window - 1:], moving_average(close, window), color=color, linewidth=0.9, label=f'MA{window}')
+    price_ax.set_title(f'{ticker} ({period})  {currency_symbol}{close[-1]:,.2f}  {close[-1] / close[0] - 1:+.2%}')
+    price_ax.grid(True, alpha=0.3)
+    price_ax.legend(loc='upper left', fontsize=8)
+
+    up = np.concatenate([[True], np.diff(close) >= 0])
+    volume_ax.bar(dates, data[VOLUME], color=np.where(up, '#2ca02c', '#d62728'), width=1.0)
+    volume_ax.set_ylabel('Volume', fontsize=8)
+    volume_ax.grid(True, alpha=0.3)
+    volume_ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(volume_ax.xaxis.get_major_locator()))
+
+    figure.tight_layout()
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png')
+    return buffer.getvalue()
@@ -0,0 +1,212 @@
+import os
+import re
+import time
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from chat_log_storage import PostgresChatLogStorage, SQLiteChatLogStorage, keep_inherited
+
+logger = logging.getLogger(__name__)
+
+# 예: "/p $AAPL", "/P@MyStockBot $AAPL $MSFT", "/alerts"
+COMMAND_PATTERN = re.compile(r"^/(?P<name>[A-Za-z0-9_]+)(?:@(?P<username>[A-Za-z0-9_]+))?(?:\s+(?P<args>.*))?$", re.DOTALL)
+
+
+class Route:
+    """명령어 하나의 처리 정보입니다. handler(context, chat_id, text)는 정식 이름으로 바뀐 text를 받습니다."""
+
+    def __init__(self, name, handler, error_message=None):
+        self.name = name
+        self.handler = handler
+        self.error_message = error_message  # 처리 중 예외가 나면 사용자에게 보낼 메시지 (없으면 보내지 않음)
+
+
+class CommandRouter:
+    """명령어 이름(별칭 포함)을 처리 함수로 바로 찾는 표입니다.
+
+    메시지마다 startswith를 차례로 비교하지 않고, 미리 컴파일한 정규식으로 명령어 이름을 한 번 뽑아
+    딕셔너리에서 찾습니다. 별칭으로 들어온 명령어는 정식 이름으로 바꿔서 넘기므로
+    처리 함수의 파서는 정식 이름만 알면 됩니다.
+    """
+
+    def __init__(self, username=None):
+        self.username = username  # 봇 사용자명 ("/p@다른봇"처럼 다른 봇을 부른 명령어는 무시)
+        self._routes = {}
+
+    def add(self, name, handler, aliases=(), error_message=None):
+        route = Route(name, handler, error_message)
+        for key in (name, *aliases):
+            key = key.lower()
+            if key in self._routes:
+                raise ValueError(f"이미 등록된 명령어: /{key}")
+            self._routes[key] = route
+        return route
+
+    def commands(self):
+        return sorted(self._routes)
+
+    def resolve(self, text):
+        """(Route, 정식 이름으로 바꾼 text)를 반환합니다. 등록되지 않은 명령어나 일반 메시지면 None을 반환합니다."""
+        match = COMMAND_PATTERN.match(text.strip())
+        if not match:
+            return None
+        route = self._routes.get(match.group('name').lower())
+        if route is None:
+            return None
+        username = match.group('username')
+        if username and self.username and username.lower() != self.username.lower():
+            return None
+        args = (match.group('args') or '').strip()
+        return route, f"/{route.name} {args}" if args else f"/{route.name}"
+
+
+class ChatAllowlist:
+    """허용된 채팅 ID 집합입니다.
+
+    고정 목록과 DB 허용 목록(store)을 합친 frozenset을 통째로 바꿔 끼우므로,
+    확인은 락 없이 집합 조회 한 번이고 다시 읽는 중에도 이전 목록으로 계속 확인할 수 있습니다.
+    """
+
+    def __init__(self, chat_ids, store=None):
+        self.static_ids = frozenset(chat_ids)
+        self.store = store
+        self.chat_ids = self.static_ids
+
+    def __contains__(self, chat_id):
+        return chat_id in self.chat_ids
+
+    def __len__(self):
+        return len(self.chat_ids)
+
+    def reload(self):
+        """DB 허용 목록을 다시 읽습니다. (블로킹 호출) 실패하면 이전 목록을 유지합니다."""
+        if self.store is None:
+            return
+        try:
+            self.chat_ids = self.static_ids | frozenset(self.store.load_ids())
+        except Exception as e:
+            logger.error(f"허용 채팅 목록 불러오기 실패: {str(e)}")
+
+
+class UnauthorizedLimiter:
+    """미승인 채팅에는 cooldown초에 한 번만 응답하도록 거릅니다.
+
+    거른 메시지는 응답, 로그, DB 기록을 모두 건너뛰고 개수만 셉니다.
+    추적하는 채팅 수는 max_tracked로 제한하며 오래된 채팅부터 잊습니다.
+    """
+
+    def __init__(self, cooldown=3600, max_tracked=10000):
+        self.cooldown = cooldown
+        self.max_tracked = max_tracked
+        self._chats = OrderedDict()  # 채팅 ID -> [마지막 응답 시각, 그 뒤로 거른 메시지 수]
+        self.suppressed = 0
+
+    def __len__(self):
+        return len(self._chats)
+
+    def check(self, chat_id, now=None):
+        """(응답할지 여부, 지난 응답 이후 거른 메시지 수)를 반환합니다."""
+        now = time.monotonic() if now is None else now
+        state = self._chats.get(chat_id)
+        if state is not None and now - state[0] < self.cooldown:
+            state[1] += 1
+            self.suppressed += 1
+            return False, state[1]
+        skipped = state[1] if state is not None else 0
+        self._chats[chat_id] = [now, 0]
+        self._chats.move_to_end(chat_id)
+        while len(self._chats) > self.max_tracked:
+            self._chats.popitem(last=False)
+        return True, skipped
+
+
+class AllowlistStore:
+    """DB 허용 목록(authorized_chats 테이블) 인터페이스입니다. 행 추가/삭제는 DB에서 직접 합니다."""
+
+    def init(self):
+        raise NotImplementedError
+
+    def load_ids(self):
+        """허용된 채팅 ID 목록을 반환합니다."""
+        raise NotImplementedError
+
+    def after_fork(self):
+        """fork된 자식 프로세스에서 부모의 연결을 버립니다. (채팅 로그 저장소의 after_fork 뒤에 호출)"""
+
+
+class PostgresAllowlistStore(AllowlistStore):
+    """채팅 로그와 같은 PostgreSQL DB의 authorized_chats 테이블을 사용합니다."""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def init(self):
+        def create(cur):
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS authorized_chats (
+                    chat_id BIGINT PRIMARY KEY,
+                    note TEXT,
+                    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+                )
+            """)
+        self.storage.execute(create)
+
+    def load_ids(self):
+        def select(cur):
+            cur.execute("SELECT chat_id FROM authorized_chats")
+            return [row[0] for row in cur.fetchall()]
+        return self.storage.execute(select)
+
+
+class SQLiteAllowlistStore(AllowlistStore):
+    """SQLite의 authorized_chats 테이블을 사용합니다. 채팅 로그 SQLite 연결이 있으면 함께 씁니다."""
+
+    def __init__(self, path=None, storage=None):
+        self.path = path
+        self.storage = storage
+        self._conn = None
+        self._lock = storage.lock if storage is not None else threading.Lock()
+
+    def after_fork(self):
+        keep_inherited(self._conn)
+        self._conn = None
+        self._lock = self.storage.lock if self.storage is not None else threading.Lock()
+
+    @property
+    def conn(self):
+        # 채팅 로그 저장소가 다시 연결될 수 있으므로 매번 현재 연결을 사용
+        if self.storage is not None:
+            return self.storage.conn
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        return self._conn
+
+    def init(self):
+        with self._lock:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS authorized_chats (
+                    chat_id INTEGER PRIMARY KEY,
+                    note TEXT,
+                    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            self.conn.commit()
+
+    def load_ids(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT chat_id FROM authorized_chats").fetchall()
+        return [row[0] for row in rows]
+
+
+def create_allowlist_store(storage):
+    """채팅 로그 저장소와 같은 곳의 허용 목록 저장소를 만듭니다.
+
+    파일 저장소는 테이블이 없으므로 가격 알림과 같은 SQLite 파일(ALERT_SQLITE_PATH)을 사용합니다.
+    """
+    if isinstance(storage, PostgresChatLogStorage):
+        return PostgresAllowlistStore(storage)
+    if isinstance(storage, SQLiteChatLogStorage):
+        return SQLiteAllowlistStore(storage=storage)
+    return SQLiteAllowlistStore(path=os.getenv('ALERT_SQLITE_PATH', 'alerts.db'))
@@ -0,0 +1,134 @@
+"""테스트 공통 설정입니다. 봇 모듈을 불러오기 전에 로그와 지표 서버를 끄고, Yahoo 대체물을 제공합니다."""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+import requests
+
+os.environ.setdefault('LOG_LEVEL', 'CRITICAL')
+os.environ['METRICS_PORT'] = '0'
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import bot  # noqa: E402
+
+# 다른 실행에서 저장한 yfinance 쿠키/시간대 캐시를 쓰지 않도록 임시 디렉터리 사용
+bot.yf.set_tz_cache_location(tempfile.mkdtemp(prefix='yf-cache-'))
+
+
+def quote(ticker):
+    """티커별 가짜 시세입니다. (.info와 같은 키)"""
+    return {
+        'regularMarketPrice': 101.0,
+        'previousClose': 100.0,
+        'dayHigh': 102.0,
+        'dayLow': 99.0,
+        'currency': 'USD',
+        'longName': f'{ticker} Inc.',
+    }
+
+
+class FakeYahoo:
+    """Yahoo 대체물입니다. 조회 함수(fetch_stock_info, fetch_quote_batch)나
+    HTTP 계층(requests.Session) 자리에 끼우고 호출을 기록합니다.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.status_code = 200  # 차트 API 응답 코드
+        self.invalid = set()    # 없는 티커 (조회 함수 대체 시)
+        self.missing = set()    # 차트 메타데이터에서 뺄 필드 (.info 키 기준)
+        self.info_calls = []    # fetch_stock_info 호출
+        self.batch_calls = []   # fetch_quote_batch 호출
+        self.urls = []          # HTTP 요청 주소
+        self.dotinfo_calls = 0  # .info의 quoteSummary 요청
+        self._lock = threading.Lock()
+
+    # 조회 함수 대체
+    def fetch_stock_info(self, ticker, with_name=True):
+        with self._lock:
+            self.info_calls.append(ticker)
+        time.sleep(self.latency)
+        return {} if ticker in self.invalid else quote(ticker)
+
+    def fetch_quote_batch(self, tickers):
+        with self._lock:
+            self.batch_calls.append(list(tickers))
+        time.sleep(self.latency)
+        return {ticker: quote(ticker) for ticker in tickers if ticker not in self.invalid}
+
+    # HTTP 계층 대체 (requests.Session.request 자리, yfinance의 쿠키/crumb 요청과 재시도까지 모두 기록)
+    def request(self, method, url, params=None, **kwargs):
+        with self._lock:
+            self.urls.append(url)
+        if 'fc.yahoo.com' in url:
+            response = self._response(200, b'')
+            response.cookies = requests.cookies.cookiejar_from_dict({'A3': 'cookie'})
+            return response
+        if '/getcrumb' in url:
+            return self._response(200, b'crumb')
+        if '/v8/finance/chart/' in url:
+            if self.status_code != 200:
+                return self._response(self.status_code, {'chart': {'result': None, 'error': {'code': 'Not Found'}}})
+            return self._response(200, {'chart': {'result': [{'meta': self._meta(url.rsplit('/', 1)[-1])}], 'error': None}})
+        if '/v10/finance/quoteSummary/' in url:
+            with self._lock:
+                self.dotinfo_calls += 1
+            return self._response(200, {'quoteSummary': {'result': [{'price': {'longName': 'X Incorporated'}}], 'error': None}})
+        if '/v7/finance/quote' in url:
+            return self._response(200, {'quoteResponse': {'result': [], 'error': None}})
+        if '/timeseries/' in url:
+            return self._response(200, {'timeseries': {'result': [{}], 'error': None}})
+        return self._response(404, {})
+
+    def _meta(self, ticker):
+        info = quote(ticker)
+        meta = {
+            'regularMarketPrice': info['regularMarketPrice'],
+            'chartPreviousClose': info['previousClose'],
+            'regularMarketDayHigh': info['dayHigh'],
+            'regularMarketDayLow': info['dayLow'],
+            'currency': info['currency'],
+            'longName': info['longName'],
+        }
+        names = {'previousClose': 'chartPreviousClose', 'dayHigh': 'regularMarketDayHigh', 'dayLow': 'regularMarketDayLow'}
+        for key in self.missing:
+            meta.pop(names.get(key, key), None)
+        return meta
+
+    @staticmethod
+    def _response(status_code, body):
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = body if isinstance(body, bytes) else json.dumps(body).encode()
+        return response
+
+
+@pytest.fixture(autouse=True)
+def bot_state(monkeypatch):
+    """테스트마다 캐시, 진행 중인 조회, 요청 한도(이벤트 루프에 묶인 락 포함)를 새로 시작합니다."""
+    monkeypatch.setattr(bot, 'stock_cache', bot.QuoteCache(100, 0, 60))
+    monkeypatch.setattr(bot, 'company_names', bot.QuoteCache(100, 0, 60))
+    monkeypatch.setattr(bot, 'inflight_fetches', {})
+    monkeypatch.setattr(bot, 'shared_cache', None)
+    monkeypatch.setattr(bot, 'yahoo_limiter', bot.TokenBucket(1000, 1000))
+
+
+@pytest.fixture
+def yahoo(monkeypatch):
+    """조회 함수를 대체한 Yahoo입니다. 동시 요청이 겹치도록 응답을 잠시 늦춥니다."""
+    fake = FakeYahoo(latency=0.05)
+    monkeypatch.setattr(bot, 'fetch_stock_info', fake.fetch_stock_info)
+    monkeypatch.setattr(bot, 'fetch_quote_batch', fake.fetch_quote_batch)
+    return fake
+
+
+@pytest.fixture
+def yahoo_http(monkeypatch):
+    """HTTP 계층을 대체한 Yahoo입니다. 실제 fetch_stock_info가 보내는 모든 요청을 기록합니다."""
+    fake = FakeYahoo()
+    monkeypatch.setattr(requests.Session, 'request', fake.request)
+    return fake
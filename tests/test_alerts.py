@@ -0,0 +1,78 @@
+"""가격 알림 등록 확인과 알림 확인 주기의 조회 범위를 확인합니다. (Yahoo, 텔레그램, 저장소는 스텁으로 대체)"""
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import bot
+from alerts import AlertIndex, AlertStore, make_alert
+
+
+class MemoryAlertStore(AlertStore):
+    def __init__(self):
+        self.alerts = []
+
+    def add(self, chat_id, ticker, metric, direction, threshold):
+        alert = make_alert(len(self.alerts) + 1, chat_id, ticker, metric, direction, threshold, datetime.now())
+        self.alerts.append(alert)
+        return alert
+
+    def mark_triggered(self, alert_ids):
+        pass
+
+
+class FakeTelegramBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+@pytest.fixture
+def alerts(monkeypatch):
+    store = MemoryAlertStore()
+    monkeypatch.setattr(bot, 'alert_store', store)
+    monkeypatch.setattr(bot, 'alert_index', AlertIndex())
+    monkeypatch.setattr(bot, 'is_market_open', lambda ticker, now=None: True)
+    return store
+
+
+def test_alert_for_unknown_ticker_is_rejected(yahoo, alerts):
+    yahoo.invalid = {'BADZ'}
+    telegram = FakeTelegramBot()
+    context = SimpleNamespace(bot=telegram)
+
+    asyncio.run(bot.handle_alert_command(context, 1, '/alert $BADZ > 1'))
+
+    assert alerts.alerts == []
+    assert not bot.alert_index.tickers()
+    assert 'BADZ' in telegram.sent[0][1]
+
+
+def test_alert_for_known_ticker_is_stored(yahoo, alerts):
+    context = SimpleNamespace(bot=FakeTelegramBot())
+
+    asyncio.run(bot.handle_alert_command(context, 1, '/alert $AAPL > 200'))
+
+    assert [alert['ticker'] for alert in alerts.alerts] == ['AAPL']
+    assert bot.alert_index.tickers() == ['AAPL']
+
+
+def test_poll_fetches_only_expired_tickers(yahoo, alerts):
+    for ticker in ('FRESH', 'MISSING'):
+        bot.alert_index.add(alerts.add(1, ticker, 'price', 'above', 100.5))
+    telegram = FakeTelegramBot()
+
+    async def main():
+        await bot.get_stock_data('FRESH')
+        await bot.check_price_alerts(telegram)
+
+    asyncio.run(main())
+
+    assert yahoo.info_calls == ['FRESH']
+    assert yahoo.batch_calls == [['MISSING']]
+    # 가짜 시세(101)가 기준값(100.5)을 넘으므로 두 알림 모두 발동
+    assert len(telegram.sent) == 2
+    assert not bot.alert_index.tickers()
@@ -0,0 +1,178 @@
+"""채팅 로그 기록기의 큐 넘침 정책과 임시 파일 재기록을 확인합니다. (저장소는 스텁으로 대체)"""
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from chat_log import ChatLogWriter, OVERFLOW_BLOCK, OVERFLOW_DROP, OVERFLOW_SPILL
+
+
+class StubSink:
+    """받은 로그 묶음을 기록합니다. down이면 저장 실패 예외를 발생시킵니다."""
+
+    def __init__(self):
+        self.batches = []
+        self.down = False
+        self._lock = threading.Lock()
+
+    def __call__(self, rows):
+        if self.down:
+            raise ConnectionError('db down')
+        with self._lock:
+            self.batches.append(list(rows))
+
+    @property
+    def rows(self):
+        return [row for batch in self.batches for row in batch]
+
+
+def chat(index, source='live'):
+    return {'timestamp': datetime(2026, 10, 1, 12, 0, index % 60), 'chat_id': 1, 'user': source, 'message': str(index)}
+
+
+def submit_all(writer, rows):
+    async def main():
+        return [await writer.submit(row) for row in rows]
+    return asyncio.run(main())
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, '제한 시간 안에 조건을 만족하지 못함'
+        time.sleep(0.01)
+
+
+def write_spill(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, default=str, ensure_ascii=False) + '\n')
+
+
+def test_drop_policy_drops_when_full():
+    sink = StubSink()
+    writer = ChatLogWriter(sink, max_queue=2, overflow=OVERFLOW_DROP)
+
+    accepted = submit_all(writer, [chat(i) for i in range(3)])
+    writer.close()
+
+    assert accepted == [True, True, False]
+    assert [row['message'] for row in sink.rows] == ['0', '1']
+    assert writer.stats()['dropped'] == 1
+
+
+def test_block_policy_waits_off_the_event_loop():
+    sink = StubSink()
+    writer = ChatLogWriter(sink, max_queue=1, overflow=OVERFLOW_BLOCK, block_timeout=0.3)
+    ticks = []
+
+    async def tick():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def main():
+        ticker = asyncio.ensure_future(tick())
+        await writer.submit(chat(0))
+        # 큐가 비지 않으므로 block_timeout 동안 기다린 뒤 버림
+        accepted = await writer.submit(chat(1))
+        ticker.cancel()
+        return accepted
+
+    began = time.monotonic()
+    accepted = asyncio.run(main())
+    writer.close()
+
+    assert accepted is False
+    assert time.monotonic() - began >= 0.3
+    # 기다리는 동안에도 다른 작업이 계속 실행됨
+    assert len(ticks) >= 10
+    assert [row['message'] for row in sink.rows] == ['0']
+
+
+def test_block_policy_accepts_when_room_frees():
+    sink = StubSink()
+    writer = ChatLogWriter(sink, max_queue=1, batch_size=1, flush_interval=0.01,
+                           overflow=OVERFLOW_BLOCK, block_timeout=2)
+    writer.start()
+
+    accepted = submit_all(writer, [chat(i) for i in range(5)])
+    writer.close()
+
+    assert accepted == [True] * 5
+    assert [row['message'] for row in sink.rows] == ['0', '1', '2', '3', '4']
+
+
+def test_close_drains_queue_and_spill(tmp_path):
+    sink = StubSink()
+    spill_path = str(tmp_path / 'spill.jsonl')
+    writer = ChatLogWriter(sink, max_queue=2, overflow=OVERFLOW_SPILL, spill_path=spill_path)
+
+    accepted = submit_all(writer, [chat(i) for i in range(5)])
+    writer.close()
+
+    assert accepted == [True] * 5
+    assert sorted(row['message'] for row in sink.rows) == ['0', '1', '2', '3', '4']
+    assert all(isinstance(row['timestamp'], datetime) for row in sink.rows)
+    assert writer.stats()['spilled'] == 0
+    assert not os.path.exists(spill_path) and not os.path.exists(spill_path + '.replay')
+
+
+def test_spill_replays_after_sink_recovers(tmp_path):
+    sink = StubSink()
+    sink.down = True
+    spill_path = str(tmp_path / 'spill.jsonl')
+    writer = ChatLogWriter(sink, batch_size=5, flush_interval=0.01, overflow=OVERFLOW_SPILL,
+                           spill_path=spill_path, replay_interval=0.05)
+    writer.start()
+
+    submit_all(writer, [chat(i) for i in range(10)])
+    wait_until(lambda: writer.spilled == 10)
+    # 재기록에 실패한 로그는 임시 파일로 돌아가고 개수도 그대로 유지
+    time.sleep(0.2)
+    assert writer.spilled == 10 and sink.rows == []
+
+    sink.down = False
+    wait_until(lambda: writer.written == 10)
+    writer.close()
+
+    assert sorted(int(row['message']) for row in sink.rows) == list(range(10))
+    assert writer.stats()['spilled'] == 0
+    assert not os.path.exists(spill_path) and not os.path.exists(spill_path + '.replay')
+
+
+def test_replay_skips_truncated_line_and_keeps_count_non_negative(tmp_path):
+    sink = StubSink()
+    spill_path = str(tmp_path / 'spill.jsonl')
+    # 이전 실행에서 남은 파일 (이번 실행의 spilled에는 포함되지 않음), 마지막 줄은 쓰는 도중 종료되어 잘림
+    write_spill(spill_path, [chat(i, 'old') for i in range(3)])
+    with open(spill_path, 'a', encoding='utf-8') as f:
+        f.write('{"timestamp": "2026-10-01 12:0')
+    writer = ChatLogWriter(sink, batch_size=2, overflow=OVERFLOW_SPILL, spill_path=spill_path)
+
+    writer.close()
+
+    assert [row['message'] for row in sink.rows] == ['0', '1', '2']
+    assert writer.stats()['spilled'] == 0
+    assert writer.stats()['dropped'] == 1
+
+
+def test_replay_interleaves_with_live_batches(tmp_path):
+    sink = StubSink()
+    spill_path = str(tmp_path / 'spill.jsonl')
+    write_spill(spill_path, [chat(i, 'old') for i in range(20)])
+    writer = ChatLogWriter(sink, batch_size=2, overflow=OVERFLOW_SPILL, spill_path=spill_path)
+    # 기록 스레드가 한가해지지 않도록 새 로그를 미리 쌓아 둠
+    submit_all(writer, [chat(i) for i in range(100)])
+
+    writer.start()
+    wait_until(lambda: writer.written == 120)
+    writer.close()
+
+    # 새 로그 묶음 하나마다 임시 파일 묶음 하나씩 재기록
+    sources = [batch[0]['user'] for batch in sink.batches]
+    assert sources[:20] == ['live', 'old'] * 10
+    assert writer.stats()['spilled'] == 0
+    assert not os.path.exists(spill_path) and not os.path.exists(spill_path + '.replay')
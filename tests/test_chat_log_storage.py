@@ -0,0 +1,25 @@
+"""Postgres 파티션 경계 문자열 변환을 확인합니다. (Python 3.9의 fromisoformat이 읽지 못하는 형식 포함)"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from chat_log_storage import parse_timestamp
+
+
+@pytest.mark.parametrize('value, expected', [
+    ("'2026-10-01 00:00:00+00'", datetime(2026, 10, 1, tzinfo=timezone.utc)),
+    ("'2026-10-01 00:00:00.5+00'", datetime(2026, 10, 1, 0, 0, 0, 500000, tzinfo=timezone.utc)),
+    ("'2026-10-01 09:00:00+09'", datetime(2026, 10, 1, tzinfo=timezone.utc)),
+    ("'2026-10-01 05:30:00+05:30'", datetime(2026, 10, 1, tzinfo=timezone.utc)),
+    ("'2026-09-30 21:00:00-03'", datetime(2026, 10, 1, tzinfo=timezone.utc)),
+    ("'2026-10-01 00:00:00'", datetime(2026, 10, 1, tzinfo=timezone.utc)),
+])
+def test_parse_timestamp(value, expected):
+    parsed = parse_timestamp(value)
+
+    assert parsed == expected
+    assert parsed.utcoffset() is not None
+
+
+def test_parse_timestamp_keeps_offset():
+    assert parse_timestamp("'2026-10-01 00:00:00-03'").utcoffset() == timedelta(hours=-3)
@@ -0,0 +1,40 @@
+"""워커 공유 캐시 클라이언트의 상태 보고와 재접속을 확인합니다."""
+import asyncio
+import os
+import tempfile
+
+import bot
+from cluster import CacheServer, SharedCacheClient
+
+
+def test_health_report_reconnects_after_disconnect():
+    async def main():
+        path = os.path.join(tempfile.mkdtemp(), 'cache.sock')
+        server = CacheServer(bot.QuoteCache(100, 0, 60), path)
+        await server.start()
+        client = SharedCacheClient(path, timeout=5)
+        try:
+            await client.connect()
+            assert await client.report_health(0, handled=1)
+            await asyncio.sleep(0.05)
+            assert server.health[0]['handled'] == 1
+
+            # 연결이 끊긴 뒤에도 다음 보고 때 다시 접속해서 보냄
+            client._writer.close()
+            await asyncio.sleep(0.05)
+            assert client._writer is None
+            assert await client.report_health(0, handled=2)
+            await asyncio.sleep(0.05)
+            assert server.health[0]['handled'] == 2
+
+            # 서버가 없으면 실패를 알림
+            client._writer.close()
+            server.close()
+            await asyncio.sleep(0.05)
+            assert not await client.report_health(0, handled=3)
+        finally:
+            if client._writer is not None:
+                client._writer.close()
+            server.close()
+
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+"""같은 티커의 동시 요청이 Yahoo 조회 한 번으로 합쳐지는지 확인합니다. (Yahoo는 스텁으로 대체)"""
+import asyncio
+import logging
+import time
+
+import bot
+
+CONCURRENT_REQUESTS = 20
+
+
+def test_concurrent_requests_share_one_fetch(yahoo):
+    async def main():
+        return await asyncio.gather(*(bot.get_stock_data('X') for _ in range(CONCURRENT_REQUESTS)))
+
+    results = asyncio.run(main())
+
+    assert yahoo.info_calls == ['X']
+    assert all(result == results[0] for result in results)
+    assert results[0]['current_price'] == 101.0
+    assert not bot.inflight_fetches
+
+
+def test_cached_result_skips_fetch(yahoo):
+    async def main():
+        await bot.get_stock_data('X')
+        return await bot.get_stock_data('X')
+
+    asyncio.run(main())
+
+    assert yahoo.info_calls == ['X']
+
+
+def test_failed_fetch_is_shared(yahoo, monkeypatch):
+    calls = []
+
+    def fail(ticker, with_name=True):
+        calls.append(ticker)
+        time.sleep(0.05)
+        raise RuntimeError('upstream down')
+
+    monkeypatch.setattr(bot, 'fetch_stock_info', fail)
+
+    async def main():
+        return await asyncio.gather(
+            *(bot.get_stock_data('X') for _ in range(CONCURRENT_REQUESTS)), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+
+    assert calls == ['X']
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert not bot.inflight_fetches
+
+
+def test_single_fetch_joins_batch_fetch(yahoo):
+    async def main():
+        pending = bot.start_batch_fetch(['X', 'Y'])
+        # 묶음 조회 중인 티커의 단일 요청은 같은 대기 작업을 받음
+        assert bot.start_fetch('X') is pending['X']
+        single = await asyncio.gather(*(bot.get_stock_data('X') for _ in range(CONCURRENT_REQUESTS)))
+        return single, await asyncio.gather(*pending.values())
+
+    single, batch = asyncio.run(main())
+
+    assert yahoo.batch_calls == [['X', 'Y']]
+    assert yahoo.info_calls == []
+    assert all(result == batch[0] for result in single)
+    assert not bot.inflight_fetches
+
+
+def test_batch_fetch_joins_single_fetch(yahoo):
+    async def main():
+        single = bot.start_fetch('X')
+        results = await bot.get_stock_data_batch(['X', 'Y', 'Z'])
+        return await single, results
+
+    single, results = asyncio.run(main())
+
+    # 이미 단일 조회 중인 X는 묶음에서 빠지고 그 결과를 함께 받음
+    assert yahoo.info_calls == ['X']
+    assert yahoo.batch_calls == [['Y', 'Z']]
+    assert results['X'] == single
+    assert set(results) == {'X', 'Y', 'Z'}
+    assert not bot.inflight_fetches
+
+
+def test_awaited_failure_is_not_logged_again(yahoo, monkeypatch, caplog):
+    def fail(ticker, with_name=True):
+        raise RuntimeError('upstream down')
+
+    monkeypatch.setattr(bot, 'fetch_stock_info', fail)
+    caplog.set_level(logging.WARNING, logger='bot')
+
+    async def main():
+        return await asyncio.gather(bot.get_stock_data('X'), return_exceptions=True)
+
+    asyncio.run(main())
+
+    # 조회 함수의 실패 로그 한 번만 남고, 기다린 요청이 에러를 받으므로 on_fetch_done은 남기지 않음
+    assert [record.getMessage() for record in caplog.records if record.name == 'bot'] == ['주식 데이터 가져오기 실패: X']
+    assert not bot.awaited_fetches
+
+
+def test_background_refresh_failure_is_logged(yahoo, monkeypatch, caplog):
+    monkeypatch.setattr(bot, 'fetch_stock_info', lambda ticker, with_name=True: 1 / 0)
+    caplog.set_level(logging.WARNING, logger='bot')
+
+    async def main():
+        task = bot.start_fetch('X')
+        await asyncio.wait([task])
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+
+    assert [record.getMessage() for record in caplog.records if record.name == 'bot'][-1] == 'X 백그라운드 조회 실패: division by zero'
+
+
+def test_background_invalid_ticker_is_logged_once(yahoo, caplog):
+    yahoo.invalid.add('NOPE')
+    caplog.set_level(logging.WARNING, logger='bot')
+
+    async def main():
+        task = bot.start_fetch('NOPE')
+        await asyncio.wait([task])
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+
+    # 잘못된 티커는 cache_stock_info의 로그만 남음
+    assert [record.getMessage() for record in caplog.records if record.name == 'bot'] == [
+        '주식 데이터 가져오기 실패: NOPE (주식 정보를 가져올 수 없습니다.)'
+    ]
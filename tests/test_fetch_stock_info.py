@@ -0,0 +1,49 @@
+"""fetch_stock_info가 Yahoo에 보내는 요청 수를 확인합니다. (Yahoo는 스텁으로 대체)"""
+import pytest
+import requests
+
+import bot
+
+
+def test_known_ticker_uses_one_chart_request(yahoo_http):
+    info = bot.fetch_stock_info('X')
+
+    assert len(yahoo_http.urls) == 1 and yahoo_http.urls[0].endswith('/v8/finance/chart/X')
+    assert yahoo_http.dotinfo_calls == 0
+    assert info['regularMarketPrice'] == 101.0
+    assert info['previousClose'] == 100.0
+    assert info['longName'] == 'X Inc.'
+
+
+def test_unknown_ticker_uses_one_request(yahoo_http):
+    yahoo_http.status_code = 404
+
+    # yfinance 세션을 거치면 쿠키/crumb 요청과 다른 쿠키 방식으로의 재시도가 더해짐
+    assert bot.fetch_stock_info('NOPE') == {}
+    assert len(yahoo_http.urls) == 1
+    assert yahoo_http.dotinfo_calls == 0
+
+
+def test_rate_limit_is_raised(yahoo_http):
+    yahoo_http.status_code = 429
+
+    with pytest.raises(requests.HTTPError) as error:
+        bot.fetch_stock_info('X')
+    assert bot.is_rate_limit_error(error.value)
+    assert len(yahoo_http.urls) == 1
+
+
+def test_missing_field_falls_back_to_info(yahoo_http):
+    yahoo_http.missing = {'longName'}
+
+    info = bot.fetch_stock_info('X')
+
+    assert yahoo_http.dotinfo_calls == 1
+    assert info['longName'] == 'X Incorporated'
+
+
+def test_server_error_is_raised(yahoo_http):
+    yahoo_http.status_code = 500
+
+    with pytest.raises(requests.HTTPError):
+        bot.fetch_stock_info('X')
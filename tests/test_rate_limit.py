@@ -0,0 +1,31 @@
+"""요청 제한기(TokenBucket)의 토큰 계산을 확인합니다."""
+import asyncio
+import time
+
+import bot
+
+
+def test_available_does_not_change_bucket():
+    limiter = bot.TokenBucket(rate=10, capacity=5)
+    limiter.tokens, limiter.updated = 1.0, time.monotonic() - 0.2
+
+    state = (limiter.tokens, limiter.updated)
+    available = limiter.available()
+
+    assert 2.9 < available <= 5
+    assert (limiter.tokens, limiter.updated) == state
+
+
+def test_available_after_acquire():
+    limiter = bot.TokenBucket(rate=0.001, capacity=3)
+
+    asyncio.run(limiter.acquire())
+
+    assert 1.99 < limiter.available() < 2.01
+
+
+def test_available_is_zero_while_penalized():
+    limiter = bot.TokenBucket(rate=10, capacity=5)
+    limiter.penalize(60)
+
+    assert limiter.available() == 0.0